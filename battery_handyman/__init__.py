@@ -11,10 +11,21 @@
 #    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
-"""The top-level members of the module"""
+"""The top-level members of the module
+
+`BatteryHandyman` is imported on the first access
+since its dependencies are slow to import and not needed for `--help`
+"""
 
 from . import constants
-from .battery_handyman_class import BatteryHandyman
 from .main import main
 
 __version__ = "1.0.0"
+
+
+def __getattr__(name: str):
+    if name == "BatteryHandyman":
+        # pylint: disable=import-outside-toplevel
+        from .battery_handyman_class import BatteryHandyman
+        return BatteryHandyman
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
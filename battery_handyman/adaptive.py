@@ -0,0 +1,84 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The prediction of the battery percentage used for the adaptive check interval"""
+import collections
+from typing import Deque, Optional, Tuple
+
+import battery_handyman.util
+
+
+class ChargeRateEstimator:
+    """Estimates the charge rate using the recent samples of the same charging state
+
+    Only the samples where the percentage has changed are kept
+    since the frequent samples of the integer percentage are mostly the same.
+    The rate is the slope of the least squares line through them and the latest sample
+    """
+    def __init__(self, history_size: int):
+        self._sample_deque: Deque[Tuple[float, float]] = collections.deque(maxlen=history_size)
+        self.last_timestamp: Optional[float] = None
+        self.last_battery_info: Optional[battery_handyman.util.BatteryInfo] = None
+
+    def add_sample(
+            self, timestamp: float, battery_info: battery_handyman.util.BatteryInfo
+    ) -> None:
+        """Saves the sample. The history is reset if the charging state has changed"""
+        if (
+                self.last_battery_info is not None
+                and self.last_battery_info.is_charging != battery_info.is_charging
+        ):
+            self._sample_deque.clear()
+        if not self._sample_deque or self._sample_deque[-1][1] != battery_info.left_in_percents:
+            self._sample_deque.append((timestamp, battery_info.left_in_percents))
+        self.last_timestamp = timestamp
+        self.last_battery_info = battery_info
+
+    def _fit_line(self) -> Optional[Tuple[float, float, float]]:
+        """Returns the slope and the point of the means of the least squares line"""
+        sample_list = list(self._sample_deque)
+        if sample_list and sample_list[-1][0] != self.last_timestamp:
+            sample_list.append((self.last_timestamp, self.last_battery_info.left_in_percents))
+        sample_count = len(sample_list)
+        if sample_count < 2:
+            return None
+        timestamp_mean = sum(timestamp for timestamp, _ in sample_list) / sample_count
+        percent_mean = sum(percent for _, percent in sample_list) / sample_count
+        covariance = sum(
+            (timestamp - timestamp_mean) * (percent - percent_mean)
+            for timestamp, percent in sample_list
+        )
+        variance = sum((timestamp - timestamp_mean) ** 2 for timestamp, _ in sample_list)
+        if not variance:
+            return None
+        return covariance / variance, timestamp_mean, percent_mean
+
+    def estimate_rate(self) -> Optional[float]:
+        """Returns the rate in percents per second or `None` if there are not enough samples"""
+        line = self._fit_line()
+        return None if line is None else line[0]
+
+    def estimate_time_to(self, threshold: float) -> Optional[float]:
+        """Returns the time in seconds from the last sample
+         until the percentage reaches `threshold`
+
+        Returns `None` if it is not expected to be reached
+        """
+        line = self._fit_line()
+        if line is None or not line[0]:
+            return None
+        rate, timestamp_mean, percent_mean = line
+        if (threshold - self.last_battery_info.left_in_percents) / rate < 0:
+            return None
+        threshold_timestamp = timestamp_mean + (threshold - percent_mean) / rate
+        return max(threshold_timestamp - self.last_timestamp, 0.0)
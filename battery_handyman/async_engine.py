@@ -0,0 +1,415 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The asyncio engine running the checks as coroutines
+
+A slow remote device delays only the checks of the instance sending the request to it
+so many instances can be run by the single thread
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import asyncio
+import logging
+import time
+import urllib.parse
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional, Tuple
+
+import battery_handyman.constants
+import battery_handyman.dispatch
+import battery_handyman.retry
+import battery_handyman.util
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.fleet import BatteryHandymanFleet
+
+if TYPE_CHECKING:
+    import concurrent.futures
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+async def send_http_request(
+        method: str, url: str,
+        connect_timeout: float = battery_handyman.constants.CONNECT_TIMEOUT_IN_SECONDS_DEFAULT,
+        read_timeout: float = battery_handyman.constants.READ_TIMEOUT_IN_SECONDS_DEFAULT,
+) -> battery_handyman.util.ResponseStatus:
+    """Sends the HTTP request without a body and returns the status of the response
+
+    Raises `OSError` (`ConnectionError` in case of the malformed response)
+    or `asyncio.TimeoutError`
+    """
+    url_parts = urllib.parse.urlsplit(url)
+    is_https = url_parts.scheme == "https"
+    port = url_parts.port or (443 if is_https else 80)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(url_parts.hostname, port, ssl=True if is_https else None),
+        connect_timeout
+    )
+    try:
+        return await asyncio.wait_for(
+            _exchange_http_request(reader, writer, method, url_parts), read_timeout
+        )
+    finally:
+        writer.close()
+
+
+async def _exchange_http_request(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+        method: str, url_parts: urllib.parse.SplitResult
+) -> battery_handyman.util.ResponseStatus:
+    path = url_parts.path or "/"
+    if url_parts.query:
+        path += "?" + url_parts.query
+    host = url_parts.netloc.rpartition("@")[2]
+
+    writer.write((
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        "Connection: close\r\n"
+        "Content-Length: 0\r\n"
+        "\r\n"
+    ).encode("latin-1"))
+    await writer.drain()
+    status_line = await reader.readline()
+    retry_after_value = None
+    while True:
+        header_line = await reader.readline()
+        if header_line in (b"\r\n", b"\n", b""):
+            break
+        header_name, _, header_value = header_line.decode("latin-1").partition(":")
+        if header_name.strip().lower() == "retry-after":
+            retry_after_value = header_value
+
+    status_line_parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    if len(status_line_parts) < 2 or not status_line_parts[0].startswith("HTTP/"):
+        raise ConnectionError(f"The response status line is malformed: {status_line!r}")
+    try:
+        status_code = int(status_line_parts[1])
+    except ValueError as exception_instance:
+        raise ConnectionError(
+            f"The response status code is malformed: {status_line!r}"
+        ) from exception_instance
+    reason = status_line_parts[2] if len(status_line_parts) == 3 else ""
+    retry_after = None
+    if battery_handyman.retry.is_status_code_retryable(status_code):
+        retry_after = battery_handyman.retry.parse_retry_after(retry_after_value)
+    return battery_handyman.util.ResponseStatus(status_code, reason, retry_after)
+
+
+class AsyncBatteryHandyman(BatteryHandyman):
+    """`BatteryHandyman` with the check cycle run by asyncio
+
+    The configuration format and the request data processing are the same.
+    The requests are sent by the event loop itself so `dispatch_mode: pool` is rejected,
+    each not batched request uses its own connection regardless of `connection_pool_size`
+    """
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _task: Optional[asyncio.Task] = None
+    _wake_event: Optional[asyncio.Event] = None
+    _retry_handle: Optional[asyncio.TimerHandle] = None
+
+    @BatteryHandyman.dispatch_mode.setter
+    def dispatch_mode(self, value: str) -> None:
+        if value == battery_handyman.constants.DISPATCH_MODE_POOL:
+            raise ValueError(f"The dispatch mode {value} is not supported by the asyncio engine")
+        BatteryHandyman.dispatch_mode.fset(self, value)
+
+    async def send_request_async(self, battery_info: battery_handyman.util.BatteryInfo) -> int:
+        """The coroutine version of `send_request`"""
+        if self._skip_send_request:
+            return battery_handyman.constants.DECISION_KEEP
+
+        self.forget_confirmed_command(battery_info)
+        try:
+            ready_request_line = self.prepare_request_line_timed(battery_info)
+        except battery_handyman.util.DoNotToogleChargingException:
+            self.cancel_retry()
+            raise
+        if self.is_command_duplicate(ready_request_line):
+            logger.debug("%s has been sent recently, it is not confirmed yet", ready_request_line)
+            return battery_handyman.constants.DECISION_DUPLICATE
+        if ready_request_line == self._retry_request_line:
+            logger.debug("%s is going to be retried", ready_request_line)
+            return battery_handyman.constants.DECISION_DUPLICATE
+        self.cancel_retry()
+        if self.batch_template is not None:
+            return self.batch_request(ready_request_line, battery_info)
+        return await self.deliver_and_handle_request_async(ready_request_line, battery_info)
+
+    async def react_async(
+            self, battery_info: battery_handyman.util.BatteryInfo
+    ) -> Tuple[int, float]:
+        """The coroutine version of `react`"""
+        react_start_time = time.perf_counter()
+        try:
+            decision = await self.send_request_async(battery_info)
+        except battery_handyman.util.DoNotToogleChargingException:
+            decision = battery_handyman.constants.DECISION_KEEP
+        except asyncio.CancelledError:
+            # It is an `Exception` in Python 3.7
+            raise
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("The reaction of %s has failed", self.remote_address)
+            decision = battery_handyman.constants.DECISION_FAILED
+        return decision, time.perf_counter() - react_start_time
+
+    async def deliver_and_handle_request_async(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int = 0
+    ) -> int:
+        """The coroutine version of `deliver_and_handle_request`"""
+        if not self.is_request_allowed(ready_request_line):
+            return battery_handyman.constants.DECISION_BLOCKED
+        self.log_request(ready_request_line, attempt)
+
+        request_start_time = time.perf_counter()
+        try:
+            response_status = await send_http_request(
+                self.request_method, ready_request_line, self.connect_timeout, self.read_timeout
+            )
+        except (OSError, asyncio.TimeoutError) as exception_instance:
+            logger.error(
+                "%s request to %s: %r",
+                self.request_method, ready_request_line, exception_instance
+            )
+            response_status = None
+        except asyncio.CancelledError:
+            # It is an `Exception` in Python 3.7
+            raise
+        except Exception:
+            self.record_unexpected_delivery_failure()
+            raise
+        self.record_response_metrics(time.perf_counter() - request_start_time, response_status)
+        return self.handle_delivery_result(
+            ready_request_line, battery_info, attempt, response_status
+        )
+
+    def enter_retry(
+            self, delay: float, ready_request_line: str,
+            battery_info: battery_handyman.util.BatteryInfo, attempt: int
+    ) -> None:
+        """Schedules the retry in the event loop replacing the pending one"""
+        self.cancel_retry()
+        if self._loop is None:
+            return
+        self._retry_request_line = ready_request_line
+        self._retry_handle = self._loop.call_later(
+            delay, self.retry_request, ready_request_line, battery_info, attempt
+        )
+
+    def retry_request(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int
+    ) -> None:
+        """Starts sending the request again"""
+        self._retry_request_line = None
+        self._retry_handle = None
+        if self.batch_template is not None:
+            self.batch_request(ready_request_line, battery_info, attempt)
+            return
+        self._loop.create_task(
+            self.deliver_and_handle_request_async(ready_request_line, battery_info, attempt)
+        )
+
+    def handle_batch_result(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int, response_status: Optional[battery_handyman.util.ResponseStatus]
+    ) -> None:
+        """Passes the status of the batch request to the event loop running the checks"""
+        loop = self._loop
+        if loop is None:
+            super().handle_batch_result(ready_request_line, battery_info, attempt, response_status)
+            return
+        try:
+            loop.call_soon_threadsafe(
+                super().handle_batch_result, ready_request_line, battery_info, attempt,
+                response_status
+            )
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+    def cancel_retry(self) -> None:
+        """Cancels the pending retry"""
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+        self._retry_request_line = None
+        self._retry_handle = None
+
+    async def perform_check_async(self, scheduler_lag: Optional[float] = None) -> None:
+        """Obtains `battery_info` and pass it to `send_request_async`
+
+        `scheduler_lag` is the delay of the check after its planned time, `None` if it is unknown
+        """
+        check_start_time = time.perf_counter()
+        self.record_check_start(scheduler_lag)
+        # The battery is read by the blocking calls, they do not delay the other instances
+        battery_info = await asyncio.get_running_loop().run_in_executor(
+            None, self.read_battery_info
+        )
+        reaction_task_list = [
+            (reaction, asyncio.ensure_future(reaction.react_async(battery_info)))
+            for reaction in self.reactions
+        ]
+        try:
+            decision = await self.send_request_async(battery_info)
+        except battery_handyman.util.DoNotToogleChargingException:
+            decision = battery_handyman.constants.DECISION_KEEP
+        finally:
+            for reaction, reaction_task in reaction_task_list:
+                self.record_reaction(battery_info, reaction, *await reaction_task)
+        self.record_decision_timed(battery_info, decision, check_start_time)
+
+    async def run(self) -> None:
+        """Runs the check cycle until it is cancelled
+
+        The checks are planned at the absolute deadlines of the event loop clock
+        (see `get_next_check_deadline`), the immediate check restarts them.
+        A failed check is logged
+        """
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._wake_event = asyncio.Event()
+        for reaction in self.reactions:
+            self.adopt_reaction(reaction)
+        self.subscribe_to_power_events()
+        self.subscribe_to_configuration_changes()
+        try:
+            check_deadline = self._loop.time()
+            scheduler_lag = None
+            while True:
+                try:
+                    await self.perform_check_async(scheduler_lag)
+                except asyncio.CancelledError:
+                    # It is an `Exception` in Python 3.7
+                    raise
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("The check has failed")
+                check_deadline = self.get_next_check_deadline(check_deadline, self._loop.time())
+                is_woken = await self.wait_for_next_check(
+                    max(check_deadline - self._loop.time(), 0)
+                )
+                if is_woken:
+                    check_deadline = self._loop.time()
+                scheduler_lag = self._loop.time() - check_deadline
+        finally:
+            self.unsubscribe_from_power_events()
+            self.unsubscribe_from_configuration_changes()
+            self.cancel_retry()
+            self._loop = None
+            self._task = None
+            self._wake_event = None
+            for reaction in self.reactions:
+                reaction.cancel_retry()
+                self.adopt_reaction(reaction)
+
+    async def wait_for_next_check(self, delay: float) -> bool:
+        """Sleeps for `delay` seconds unless the immediate check is requested.
+         Returns whether it has been requested"""
+        try:
+            await asyncio.wait_for(self._wake_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        is_woken = self._wake_event.is_set()
+        self._wake_event.clear()
+        return is_woken
+
+    def adopt_reaction(self, reaction: BatteryHandyman) -> None:
+        """Makes the reaction share the scheduler and the event loop of this instance"""
+        super().adopt_reaction(reaction)
+        reaction._loop = self._loop  # pylint: disable=protected-access
+
+    def request_immediate_check(self) -> None:
+        """Interrupts the waiting for the next check. It can be called from any thread"""
+        loop, wake_event = self._loop, self._wake_event
+        if loop is None or wake_event is None:
+            return
+        logger.debug("The immediate check is requested")
+        try:
+            loop.call_soon_threadsafe(wake_event.set)
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+    def call_between_checks(self, function: Callable[[], Any]) -> concurrent.futures.Future:
+        """Calls `function` by the event loop of the check cycle. It can be called from any thread.
+         Returns the future of the result. Without the running event loop it is called at once"""
+        loop = self._loop
+        if loop is not None:
+            future, call = battery_handyman.dispatch.make_future_call(function)
+            try:
+                loop.call_soon_threadsafe(call)
+                return future
+            except RuntimeError:
+                # The event loop is already closed
+                pass
+        return super().call_between_checks(function)
+
+    def request_configuration_reload(self) -> None:
+        """Reloads the configuration file between the checks. It can be called from any thread"""
+        loop = self._loop
+        if loop is None:
+            return
+        logger.debug("The reload of %s is requested", self.configuration_filepath)
+        try:
+            loop.call_soon_threadsafe(self.reload_configuration)
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+    def start(self, blocking: bool = True) -> None:
+        """Runs the check cycle
+
+        With `blocking == False` it performs only one check like `BatteryHandyman.start` does
+        """
+        if not blocking:
+            asyncio.run(self.perform_check_async())
+            return
+        try:
+            asyncio.run(self.run())
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self) -> None:
+        """Stops the check cycle. It can be called from any thread"""
+        super().stop()
+        # `run` may be finishing in the event loop thread now
+        loop, task = self._loop, self._task
+        if loop is None or task is None:
+            return
+        try:
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            # The event loop is already closed
+            pass
+
+
+async def run_concurrently(instances: Iterable[AsyncBatteryHandyman]) -> None:
+    """Runs the check cycles of all the instances in the current event loop"""
+    await asyncio.gather(*(instance.run() for instance in instances))
+
+
+class AsyncBatteryHandymanFleet(BatteryHandymanFleet):
+    """`BatteryHandymanFleet` with the check cycles run by the single asyncio event loop"""
+    HANDYMAN_CLASS = AsyncBatteryHandyman
+
+    def start(self, blocking: bool = True) -> None:
+        """Runs the check cycles of all the instances"""
+        if not blocking:
+            for instance in self.instances:
+                instance.start(blocking=False)
+            return
+        try:
+            asyncio.run(run_concurrently(self.instances))
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,159 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The batching of the commands to the aggregating controllers
+
+Many devices plugged into one managed power strip send their commands to the same controller.
+The commands collected during a short window are sent as one request,
+so the controller receives fewer requests and the bursts after the power events are smoothed
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import battery_handyman.dispatch
+import battery_handyman.util
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# Sends the batch request with the commands and returns its status, `None` on the connection error
+DeliverBatch = Callable[[List[str]], Optional[battery_handyman.util.ResponseStatus]]
+# Receives the status of the batch request the command has been sent by
+HandleBatchResult = Callable[[Optional[battery_handyman.util.ResponseStatus]], None]
+
+
+class CommandBatch:
+    """The not sent commands to the same controller"""
+    def __init__(self, deadline: float, deliver_batch: DeliverBatch):
+        self.deadline = deadline
+        self.deliver_batch = deliver_batch
+        # The submitter key, its command and the result handler in the order of the submission
+        self.entry_mapping: Dict[Hashable, Tuple[str, HandleBatchResult]] = {}
+
+    def send(self) -> None:
+        """Sends the commands as one request and passes its status to all the submitters
+
+        The same commands are sent once. A failed result handler does not affect the others
+        """
+        command_list = list(dict.fromkeys(command for command, _ in self.entry_mapping.values()))
+        try:
+            response_status = self.deliver_batch(command_list)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("The batch of %s commands has failed", len(command_list))
+            response_status = None
+        for _, handle_result in self.entry_mapping.values():
+            try:
+                handle_result(response_status)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("The handling of the batch result has failed")
+
+    def drop(self) -> None:
+        """Passes `None` to all the submitters as the batch has not been sent,
+         so they handle it as the connection error"""
+        logger.warning("The batch of %s commands is dropped", len(self.entry_mapping))
+        for _, handle_result in self.entry_mapping.values():
+            try:
+                handle_result(None)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("The handling of the dropped batch has failed")
+
+
+class CommandBatcher:
+    """Collects the commands by the batch key (e.g. the controller and the batch template)
+
+    The first command of a batch starts its window, the batch is sent after the window
+    by the worker threads of the request dispatcher. A newer command of the same submitter
+    replaces its not sent one. The deadlines are watched by a single thread started on demand
+    """
+    def __init__(
+            self,
+            request_dispatcher: Optional[battery_handyman.dispatch.RequestDispatcher] = None,
+    ):
+        self._request_dispatcher = request_dispatcher
+        self._condition = threading.Condition()
+        self._batch_mapping: Dict[Hashable, CommandBatch] = {}
+        self._sent_batch_count = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        """The number of the not sent batches"""
+        with self._condition:
+            return len(self._batch_mapping)
+
+    def add(
+            self, batch_key: Hashable, submitter_key: Hashable, command: str, window: float,
+            deliver_batch: DeliverBatch, handle_result: HandleBatchResult,
+    ) -> None:
+        """Adds the command to the batch. `deliver_batch` of the first command sends the batch"""
+        with self._condition:
+            batch = self._batch_mapping.get(batch_key)
+            if batch is None:
+                batch = self._batch_mapping[batch_key] = CommandBatch(
+                    time.monotonic() + window, deliver_batch
+                )
+                self._condition.notify()
+            elif submitter_key in batch.entry_mapping:
+                logger.debug("The not sent command of %s is replaced by the newer one", batch_key)
+            batch.entry_mapping[submitter_key] = (command, handle_result)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._send_due_batches, name="battery_handyman_batching", daemon=True,
+                )
+                self._thread.start()
+
+    def discard(self, submitter_key: Hashable) -> None:
+        """Removes the not sent commands of the submitter"""
+        with self._condition:
+            for batch_key, batch in list(self._batch_mapping.items()):
+                batch.entry_mapping.pop(submitter_key, None)
+                if not batch.entry_mapping:
+                    del self._batch_mapping[batch_key]
+
+    def flush(self) -> None:
+        """Sends all the not sent batches now"""
+        with self._condition:
+            for batch in self._batch_mapping.values():
+                batch.deadline = 0
+            self._condition.notify()
+
+    def _send_due_batches(self) -> None:
+        while True:
+            with self._condition:
+                while not self._batch_mapping:
+                    self._condition.wait()
+                now = time.monotonic()
+                deadline = min(batch.deadline for batch in self._batch_mapping.values())
+                if deadline > now:
+                    self._condition.wait(deadline - now)
+                    continue
+                due_batch_list = []
+                for batch_key, batch in list(self._batch_mapping.items()):
+                    if batch.deadline <= now:
+                        due_batch_list.append((batch_key, batch))
+                        del self._batch_mapping[batch_key]
+            # The empty dispatcher is falsy because of its `__len__`
+            request_dispatcher = self._request_dispatcher
+            if request_dispatcher is None:
+                request_dispatcher = battery_handyman.dispatch.REQUEST_DISPATCHER
+            for batch_key, batch in due_batch_list:
+                self._sent_batch_count += 1
+                # The unique key, the batches must not replace each other in the queue
+                request_dispatcher.submit(
+                    (batch_key, self._sent_batch_count), batch.send, batch.drop
+                )
+
+
+# The batcher shared by all the instances in the process
+COMMAND_BATCHER = CommandBatcher()
@@ -18,21 +18,44 @@ percentage reaches user-defined limits
 """
 from __future__ import annotations  # https://stackoverflow.com/a/49872353
 
+import functools
 import logging
 import sched
+import struct
+import threading
 import time
 from argparse import Namespace
-from typing import Any, Optional, Dict, Callable
+from typing import TYPE_CHECKING, Any, Optional, Dict, Callable, List, Tuple, Union
 
-import requests
 import yaml  # See the representer and constructor adding in the end of the file
 
+import battery_handyman.adaptive
+import battery_handyman.batching
+import battery_handyman.battery_source
+import battery_handyman.config_cache
+import battery_handyman.config_watcher
 import battery_handyman.constants
+import battery_handyman.deadlines
+import battery_handyman.dispatch
+import battery_handyman.filters
+import battery_handyman.history
+import battery_handyman.metrics
+import battery_handyman.power_events
+import battery_handyman.profiling
+import battery_handyman.retry
+import battery_handyman.session_pool
+import battery_handyman.template_fields
 import battery_handyman.util
 
+if TYPE_CHECKING:  # `concurrent.futures` is imported only by the reactions and the control
+    import concurrent.futures
+
 
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 
+# The libyaml based loader is several times faster if PyYAML is built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 class ConfigSectionNamespace(Namespace):  # pylint: disable=too-few-public-methods
     """A representation of a configuration section
@@ -50,6 +73,17 @@ def common_property_setter_routine(target_property: Callable) -> Callable:
     return wrapper
 
 
+def set_config_value_if_not_default(
+        config: Dict[str, Any], key: str, value: Any, default: Any
+) -> None:
+    """Puts the optional value into the configuration section only if it is not the default one
+
+    So the dumped configuration files do not contain the not used optional keys
+    """
+    if value != default:
+        config[key] = value
+
+
 def common_only_battery_limit_property_setter_routine(target_property: Callable) -> Callable:
     """Adds checking of the provided limit value"""
     def wrapper(self, value):
@@ -67,12 +101,57 @@ def common_only_battery_limit_property_setter_routine(target_property: Callable)
 
 class BatteryHandyman:
     """Central class"""
+    # Without `__slots__` the instance dictionary is several times larger than the attributes
+    # once their number is above the limit of the key-sharing dictionaries.
+    # `__dict__` is kept for the attributes of the subclasses and for the mocking
+    __slots__ = (
+        "_adaptive_check_interval", "_batch_separator", "_batch_template", "_batch_window",
+        "_battery_filter", "_battery_limit_charged", "_battery_limit_low", "_battery_source",
+        "_battery_source_name", "_charge_rate_estimator", "_check_deadline", "_check_interval",
+        "_check_interval_max", "_check_lock", "_check_slack", "_check_tick",
+        "_circuit_breaker_reset_timeout", "_circuit_breaker_threshold", "_command_confirm_timeout",
+        "_config_file_watcher", "_configuration_filepath", "_connect_timeout",
+        "_connection_idle_timeout", "_connection_pool_size", "_decision_table", "_dispatch_mode",
+        "_dispatched_request_line", "_filter_ewma_alpha", "_filter_median_size",
+        "_filter_min_dwell_time", "_history_path", "_history_recorder", "_history_size",
+        "_is_check_cycle_running", "_is_history_unavailable", "_is_immediate_check_requested",
+        "_is_request_data_cacheable", "_last_battery_info", "_last_check_time", "_last_decision",
+        "_last_delivered_command", "_last_raw_battery_info", "_needs_charge_rate",
+        "_next_check_event", "_power_event_source", "_power_events", "_reaction_list",
+        "_read_timeout", "_reload_on_change", "_remote_address", "_request_data_mapping",
+        "_request_field_list", "_request_method", "_request_template", "_retry_base_delay",
+        "_retry_event", "_retry_max_attempts", "_retry_max_delay", "_retry_request_line",
+        "_scheduler", "_skip_send_request", "_stage_hook_list", "_stage_profiler", "__dict__",
+    )
+    # The properties set by the configuration file, see `apply_configuration`
+    CONFIG_PROPERTY_NAME_LIST = [
+        "battery_limit_charged", "battery_limit_low",
+        "check_interval", "battery_source_name", "adaptive_check_interval", "check_interval_max",
+        "check_tick", "check_slack", "power_events", "reload_on_change", "profile_stages",
+        "history_size", "history_path",
+        "filter_median_size", "filter_ewma_alpha", "filter_min_dwell_time",
+        "remote_address", "request_template", "request_method", "request_data_mapping",
+        "connection_pool_size", "connection_idle_timeout", "command_confirm_timeout",
+        "connect_timeout", "read_timeout", "dispatch_mode",
+        "batch_template", "batch_separator", "batch_window",
+        "retry_max_attempts", "retry_base_delay", "retry_max_delay",
+        "circuit_breaker_threshold", "circuit_breaker_reset_timeout",
+    ]
+
     def __init__(
             self,
             battery_limit_config: Optional[ConfigSectionNamespace] = None,
             check_config: Optional[ConfigSectionNamespace] = None,
-            remote_request_config: Optional[ConfigSectionNamespace] = None,
+            remote_request_config: Optional[
+                Union[ConfigSectionNamespace, List[ConfigSectionNamespace]]
+            ] = None,
+            battery_filter_config: Optional[ConfigSectionNamespace] = None,
     ):
+        self._reaction_list: List[BatteryHandyman] = []
+        reaction_config_list = []
+        if isinstance(remote_request_config, list):
+            # The first reaction is performed by the instance itself, the others by its reactions
+            remote_request_config, *reaction_config_list = remote_request_config or [None]
         self._skip_send_request = True
         remote_address = None
         request_template = None
@@ -107,26 +186,169 @@ class BatteryHandyman:
             self.check_interval = check_config.check_interval
         except AttributeError:
             self.check_interval = battery_handyman.constants.CHECK_INTERVAL_IN_SECONDS_DEFAULT
+        self.battery_source_name = getattr(
+            check_config, "battery_source", battery_handyman.constants.BATTERY_SOURCE_DEFAULT
+        )
+        self.adaptive_check_interval = getattr(check_config, "adaptive_check_interval", False)
+        self.check_interval_max = getattr(
+            check_config, "check_interval_max",
+            battery_handyman.constants.CHECK_INTERVAL_MAX_IN_SECONDS_DEFAULT
+        )
+        self.check_tick = getattr(
+            check_config, "check_tick", battery_handyman.constants.CHECK_TICK_IN_SECONDS_DEFAULT
+        )
+        self.check_slack = getattr(check_config, "check_slack", None)
+        # It is created by the first check with the adaptive check interval
+        self._charge_rate_estimator: Optional[battery_handyman.adaptive.ChargeRateEstimator] = None
+        self.power_events = getattr(check_config, "power_events", False)
+        self._configuration_filepath: Optional[str] = None
+        self.reload_on_change = getattr(check_config, "reload_on_change", False)
+        self._stage_hook_list: List[Callable[[BatteryHandyman, str, float], None]] = []
+        self._stage_profiler: Optional[battery_handyman.profiling.StageProfiler] = None
+        self.profile_stages = getattr(check_config, "profile_stages", False)
+        self._history_recorder: Optional[battery_handyman.history.HistoryRecorder] = None
+        self.history_size = getattr(
+            check_config, "history_size", battery_handyman.constants.HISTORY_SIZE_DEFAULT
+        )
+        self.history_path = getattr(check_config, "history_path", None)
+        # Every filter property setter recreates the filter from all of them
+        self._filter_median_size = battery_handyman.constants.BATTERY_FILTER_MEDIAN_SIZE_DEFAULT
+        self._filter_ewma_alpha = battery_handyman.constants.BATTERY_FILTER_EWMA_ALPHA_DEFAULT
+        self._filter_min_dwell_time = (
+            battery_handyman.constants.BATTERY_FILTER_MIN_DWELL_TIME_IN_SECONDS_DEFAULT
+        )
+        self.filter_median_size = getattr(
+            battery_filter_config, "median_size",
+            battery_handyman.constants.BATTERY_FILTER_MEDIAN_SIZE_DEFAULT
+        )
+        self.filter_ewma_alpha = getattr(
+            battery_filter_config, "ewma_alpha",
+            battery_handyman.constants.BATTERY_FILTER_EWMA_ALPHA_DEFAULT
+        )
+        self.filter_min_dwell_time = getattr(
+            battery_filter_config, "min_dwell_time",
+            battery_handyman.constants.BATTERY_FILTER_MIN_DWELL_TIME_IN_SECONDS_DEFAULT
+        )
 
         self.remote_address = remote_address
         self.request_template = request_template
         self.request_method = remote_request_config.request_method
         self.request_data_mapping = request_data_mapping
+        self.connection_pool_size = getattr(
+            remote_request_config, "connection_pool_size",
+            battery_handyman.constants.CONNECTION_POOL_SIZE_DEFAULT
+        )
+        self.connection_idle_timeout = getattr(
+            remote_request_config, "connection_idle_timeout",
+            battery_handyman.constants.CONNECTION_IDLE_TIMEOUT_IN_SECONDS_DEFAULT
+        )
+        self.command_confirm_timeout = getattr(
+            remote_request_config, "command_confirm_timeout",
+            battery_handyman.constants.COMMAND_CONFIRM_TIMEOUT_IN_SECONDS_DEFAULT
+        )
+        self.connect_timeout = getattr(
+            remote_request_config, "connect_timeout",
+            battery_handyman.constants.CONNECT_TIMEOUT_IN_SECONDS_DEFAULT
+        )
+        self.read_timeout = getattr(
+            remote_request_config, "read_timeout",
+            battery_handyman.constants.READ_TIMEOUT_IN_SECONDS_DEFAULT
+        )
+        self.dispatch_mode = getattr(
+            remote_request_config, "dispatch_mode",
+            battery_handyman.constants.DISPATCH_MODE_DEFAULT
+        )
+        self.batch_template = getattr(remote_request_config, "batch_template", None)
+        self.batch_separator = getattr(
+            remote_request_config, "batch_separator",
+            battery_handyman.constants.BATCH_SEPARATOR_DEFAULT
+        )
+        self.batch_window = getattr(
+            remote_request_config, "batch_window",
+            battery_handyman.constants.BATCH_WINDOW_IN_SECONDS_DEFAULT
+        )
+        self.retry_max_attempts = getattr(
+            remote_request_config, "retry_max_attempts",
+            battery_handyman.constants.RETRY_MAX_ATTEMPTS_DEFAULT
+        )
+        self.retry_base_delay = getattr(
+            remote_request_config, "retry_base_delay",
+            battery_handyman.constants.RETRY_BASE_DELAY_IN_SECONDS_DEFAULT
+        )
+        self.retry_max_delay = getattr(
+            remote_request_config, "retry_max_delay",
+            battery_handyman.constants.RETRY_MAX_DELAY_IN_SECONDS_DEFAULT
+        )
+        self.circuit_breaker_threshold = getattr(
+            remote_request_config, "circuit_breaker_threshold",
+            battery_handyman.constants.CIRCUIT_BREAKER_THRESHOLD_DEFAULT
+        )
+        self.circuit_breaker_reset_timeout = getattr(
+            remote_request_config, "circuit_breaker_reset_timeout",
+            battery_handyman.constants.CIRCUIT_BREAKER_RESET_TIMEOUT_IN_SECONDS_DEFAULT
+        )
+        self._last_delivered_command: Optional[battery_handyman.util.DeliveredCommand] = None
+        self._last_battery_info: Optional[battery_handyman.util.BatteryInfo] = None
+        # The reading before the filters, it is recorded to the history
+        self._last_raw_battery_info: Optional[battery_handyman.util.BatteryInfo] = None
+        self._last_decision: Optional[int] = None
+        self._last_check_time: Optional[float] = None
+        self._dispatched_request_line: Optional[str] = None
+        self._retry_request_line: Optional[str] = None
+        self._retry_event: Optional[sched.Event] = None
 
-        self._scheduler = sched.scheduler(time.time, time.sleep)
+        self._check_lock = threading.Lock()
+        self._next_check_event: Optional[sched.Event] = None
+        # The scheduler time the current (or the last) check has been planned at
+        self._check_deadline: Optional[float] = None
+        self._is_immediate_check_requested = False
+        # Whether the scheduler is run by `start` (or by the fleet) until the stop
+        self._is_check_cycle_running = False
+        # The monotonic clock does not jump with the adjustments of the system time
+        self._scheduler = sched.scheduler(time.monotonic, battery_handyman.util.WakeableSleep())
+        self._reaction_list = [
+            self.create_reaction(battery_limit_config, reaction_config)
+            for reaction_config in reaction_config_list
+        ]
 
     # SECTION: IO
     @classmethod
-    def from_configuration_file(cls, configuration_filepath: str) -> BatteryHandyman:
-        """Creates an instance using the file path pointing at the configuration file"""
+    def from_configuration_file(
+            cls, configuration_filepath: str,
+            configuration_cache: Optional[battery_handyman.config_cache.ConfigurationCache] = None,
+    ) -> BatteryHandyman:
+        """Creates an instance using the file path pointing at the configuration file
+
+        The instance is of the class this method is called on
+        even if the configuration file has the `!BatteryHandyman` tag.
+        With `configuration_cache` the file is parsed only if it has been changed
+        since its configuration was cached. `configuration_cache.save` is up to the caller
+        """
+        signature = None
+        if configuration_cache is not None:
+            signature = battery_handyman.config_cache.get_file_signature(configuration_filepath)
+            config_dict_mapping = configuration_cache.get(signature)
+            if config_dict_mapping is not None:
+                instance = cls.__new__(cls)
+                instance.init_from_config_dict_mapping(config_dict_mapping)
+                instance.configuration_filepath = configuration_filepath
+                return instance
         with open(configuration_filepath, mode='r') as configuration_file:
-            load_result = yaml.safe_load(configuration_file)
+            load_result = yaml.load(configuration_file, Loader=YAML_LOADER)
         if load_result is None:
             raise ValueError("Most probably the configuration file is empty")
         if isinstance(load_result, BatteryHandyman):
-            return load_result
-        instance = BatteryHandyman.__new__(BatteryHandyman)
+            if type(load_result) is cls:  # pylint: disable=unidiomatic-typecheck
+                if configuration_cache is not None:
+                    configuration_cache.put(signature, load_result.to_config_dict_mapping())
+                load_result.configuration_filepath = configuration_filepath
+                return load_result
+            load_result = load_result.to_config_dict_mapping()
+        instance = cls.__new__(cls)
         instance.init_from_config_dict_mapping(load_result)
+        if configuration_cache is not None:
+            configuration_cache.put(signature, load_result)
+        instance.configuration_filepath = configuration_filepath
         return instance
 
     def to_configuration_file(self, configuration_filepath: str) -> None:
@@ -138,7 +360,10 @@ class BatteryHandyman:
         """Initializes the instance using a configuration dictionary"""
         try:
             config_namespaces_mapping = {
-                config_section_name: ConfigSectionNamespace(**config)
+                config_section_name: (
+                    [ConfigSectionNamespace(**item_config) for item_config in config]
+                    if isinstance(config, list) else ConfigSectionNamespace(**config)
+                )
                 for config_section_name, config in config_dict_mapping.items()
             }
             self.__init__(**config_namespaces_mapping)
@@ -166,16 +391,133 @@ class BatteryHandyman:
                 "check_interval": self.check_interval,
             },
         }
+        check_config = config_dict_mapping[battery_handyman.constants.CONFIG_NAME_CHECK]
+        set_config_value_if_not_default(
+            check_config, "battery_source", self.battery_source_name,
+            battery_handyman.constants.BATTERY_SOURCE_DEFAULT
+        )
+        set_config_value_if_not_default(
+            check_config, "adaptive_check_interval", self.adaptive_check_interval, False
+        )
+        set_config_value_if_not_default(
+            check_config, "check_interval_max", self.check_interval_max,
+            battery_handyman.constants.CHECK_INTERVAL_MAX_IN_SECONDS_DEFAULT
+        )
+        set_config_value_if_not_default(
+            check_config, "check_tick", self.check_tick,
+            battery_handyman.constants.CHECK_TICK_IN_SECONDS_DEFAULT
+        )
+        set_config_value_if_not_default(check_config, "check_slack", self.check_slack, None)
+        set_config_value_if_not_default(check_config, "power_events", self.power_events, False)
+        set_config_value_if_not_default(
+            check_config, "reload_on_change", self.reload_on_change, False
+        )
+        set_config_value_if_not_default(check_config, "profile_stages", self.profile_stages, False)
+        set_config_value_if_not_default(check_config, "history_path", self.history_path, None)
+        set_config_value_if_not_default(
+            check_config, "history_size", self.history_size,
+            battery_handyman.constants.HISTORY_SIZE_DEFAULT
+        )
+        battery_filter_config: Dict[str, Any] = {}
+        for key, value, default in (
+                (
+                    "median_size", self.filter_median_size,
+                    battery_handyman.constants.BATTERY_FILTER_MEDIAN_SIZE_DEFAULT,
+                ),
+                (
+                    "ewma_alpha", self.filter_ewma_alpha,
+                    battery_handyman.constants.BATTERY_FILTER_EWMA_ALPHA_DEFAULT,
+                ),
+                (
+                    "min_dwell_time", self.filter_min_dwell_time,
+                    battery_handyman.constants.BATTERY_FILTER_MIN_DWELL_TIME_IN_SECONDS_DEFAULT,
+                ),
+        ):
+            set_config_value_if_not_default(battery_filter_config, key, value, default)
+        if battery_filter_config:
+            config_dict_mapping[battery_handyman.constants.CONFIG_NAME_BATTERY_FILTER] = (
+                battery_filter_config
+            )
 
         if not self._skip_send_request:
-            config_dict_mapping[battery_handyman.constants.CONFIG_NAME_REMOTE_REQUEST] = {
+            remote_request_config = {
                 "remote_address": self.remote_address,
                 "request_data_mapping": self.request_data_mapping,
                 "request_method": self.request_method,
                 "request_template": self.request_template,
             }
+            set_config_value_if_not_default(
+                remote_request_config, "connection_pool_size", self.connection_pool_size,
+                battery_handyman.constants.CONNECTION_POOL_SIZE_DEFAULT
+            )
+            set_config_value_if_not_default(
+                remote_request_config, "connection_idle_timeout", self.connection_idle_timeout,
+                battery_handyman.constants.CONNECTION_IDLE_TIMEOUT_IN_SECONDS_DEFAULT
+            )
+            set_config_value_if_not_default(
+                remote_request_config, "command_confirm_timeout", self.command_confirm_timeout,
+                battery_handyman.constants.COMMAND_CONFIRM_TIMEOUT_IN_SECONDS_DEFAULT
+            )
+            set_config_value_if_not_default(
+                remote_request_config, "connect_timeout", self.connect_timeout,
+                battery_handyman.constants.CONNECT_TIMEOUT_IN_SECONDS_DEFAULT
+            )
+            set_config_value_if_not_default(
+                remote_request_config, "read_timeout", self.read_timeout,
+                battery_handyman.constants.READ_TIMEOUT_IN_SECONDS_DEFAULT
+            )
+            set_config_value_if_not_default(
+                remote_request_config, "dispatch_mode", self.dispatch_mode,
+                battery_handyman.constants.DISPATCH_MODE_DEFAULT
+            )
+            for key, value, default in (
+                    ("batch_template", self.batch_template, None),
+                    (
+                        "batch_separator", self.batch_separator,
+                        battery_handyman.constants.BATCH_SEPARATOR_DEFAULT,
+                    ),
+                    (
+                        "batch_window", self.batch_window,
+                        battery_handyman.constants.BATCH_WINDOW_IN_SECONDS_DEFAULT,
+                    ),
+                    (
+                        "retry_max_attempts", self.retry_max_attempts,
+                        battery_handyman.constants.RETRY_MAX_ATTEMPTS_DEFAULT,
+                    ),
+                    (
+                        "retry_base_delay", self.retry_base_delay,
+                        battery_handyman.constants.RETRY_BASE_DELAY_IN_SECONDS_DEFAULT,
+                    ),
+                    (
+                        "retry_max_delay", self.retry_max_delay,
+                        battery_handyman.constants.RETRY_MAX_DELAY_IN_SECONDS_DEFAULT,
+                    ),
+                    (
+                        "circuit_breaker_threshold", self.circuit_breaker_threshold,
+                        battery_handyman.constants.CIRCUIT_BREAKER_THRESHOLD_DEFAULT,
+                    ),
+                    (
+                        "circuit_breaker_reset_timeout", self.circuit_breaker_reset_timeout,
+                        battery_handyman.constants.CIRCUIT_BREAKER_RESET_TIMEOUT_IN_SECONDS_DEFAULT,
+                    ),
+            ):
+                set_config_value_if_not_default(remote_request_config, key, value, default)
+            if self._reaction_list:
+                remote_request_config = [remote_request_config] + self.get_reaction_config_list()
+            config_dict_mapping[battery_handyman.constants.CONFIG_NAME_REMOTE_REQUEST] = (
+                remote_request_config
+            )
         return config_dict_mapping
 
+    def get_reaction_config_list(self) -> List[Dict[str, Any]]:
+        """Returns the remote request configuration sections of the additional reactions"""
+        return [
+            reaction.to_config_dict_mapping()[
+                battery_handyman.constants.CONFIG_NAME_REMOTE_REQUEST
+            ]
+            for reaction in self._reaction_list
+        ]
+
     # SUBSECTION: PyYAML SUPPORT
     YAML_TAG = "!BatteryHandyman"
 
@@ -196,25 +538,35 @@ class BatteryHandyman:
         instance.init_from_config_dict_mapping(node_map)  # pylint: disable=protected-access
 
     # SECTION: REQUESTER
+    def collect_request_data(
+            self, battery_info: battery_handyman.util.BatteryInfo
+    ) -> Optional[Dict[str, Any]]:
+        """Transforms `battery_info` into the dictionary of the data
+         requited by the request line template.
+         Only the fields referenced by the template are computed (see `template_fields`).
+         Returns `None` if the charging must be unchanged"""
+        request_data = {}
+        for request_data_key, template_field in self._request_field_list:
+            value = template_field.compute(self, battery_info)
+            if value is None:
+                return None
+            request_data[request_data_key] = value
+        return request_data
+
     def extract_request_data(
             self, battery_info: battery_handyman.util.BatteryInfo
     ) -> Dict[str, Any]:
         """Transforms `battery_info` into the dictionary of the data
          requited by the request line template"""
-        request_data = {}
-        request_data_key_needs_charging = battery_handyman.constants.REQUEST_DATA_KEY_NEEDS_CHARGING
-        if request_data_key_needs_charging in self._request_data_key_list:
-            if battery_info.is_charging:
-                if battery_info.left_in_percents > self.battery_limit_charged:
-                    logger.debug("Charging must be disabled")
-                    request_data[request_data_key_needs_charging] = False
-            else:
-                if battery_info.left_in_percents < self.battery_limit_low:
-                    logger.debug("Charging must be enabled")
-                    request_data[request_data_key_needs_charging] = True
-            if request_data_key_needs_charging not in request_data:
-                logger.debug(battery_handyman.constants.MSG_CHARGING_MUST_NOT_TO_BE_TOOGLED)
-                raise battery_handyman.util.DoNotToogleChargingException
+        request_data = self.collect_request_data(battery_info)
+        if request_data is None:
+            logger.debug(battery_handyman.constants.MSG_CHARGING_MUST_NOT_TO_BE_TOOGLED)
+            raise battery_handyman.util.DoNotToogleChargingException
+        needs_charging = request_data.get(
+            battery_handyman.constants.REQUEST_DATA_KEY_NEEDS_CHARGING
+        )
+        if needs_charging is not None:
+            logger.debug("Charging must be %s", "enabled" if needs_charging else "disabled")
         return request_data
 
     def map_request_data_inplace(self, request_data: Dict[str, Any]) -> None:
@@ -225,67 +577,1043 @@ class BatteryHandyman:
                 if value in request_arg_value_mapping:
                     request_data[request_arg] = request_arg_value_mapping[value]
 
-    def send_request(self, battery_info: battery_handyman.util.BatteryInfo) -> None:
-        """Runs the whole pipeline from processing `battery_info` to HTTP response handling"""
+    def render_request_line(self, request_data: Dict[str, Any]) -> str:
+        """Maps `request_data` and fills the request line template with it"""
+        self.map_request_data_inplace(request_data)
+        return self.remote_address + self.request_template.format(**request_data)
+
+    def build_decision_table(self) -> List[List[Optional[str]]]:
+        """Precomputes the ready request lines for all the integer battery percentages
+
+        The result is indexed by `is_charging` and then by `left_in_percents`.
+        `None` means the charging must be unchanged
+        """
+        ready_request_line_cache: Dict[Tuple[Tuple[str, Any], ...], str] = {}
+        decision_table = []
+        for is_charging in (False, True):
+            decision_table_row = []
+            for left_in_percents in range(
+                    battery_handyman.constants.BATTERY_LIMIT_VALUE_MINIMAL,
+                    battery_handyman.constants.BATTERY_LIMIT_VALUE_MAXIMAL + 1,
+            ):
+                request_data = self.collect_request_data(battery_handyman.util.BatteryInfo(
+                    is_charging=is_charging, left_in_percents=left_in_percents,
+                ))
+                ready_request_line = None
+                if request_data is not None:
+                    request_data_key = tuple(sorted(request_data.items()))
+                    ready_request_line = ready_request_line_cache.get(request_data_key)
+                    if ready_request_line is None:
+                        ready_request_line = self.render_request_line(request_data)
+                        ready_request_line_cache[request_data_key] = ready_request_line
+                decision_table_row.append(ready_request_line)
+            decision_table.append(decision_table_row)
+        return decision_table
+
+    def prepare_request_line(self, battery_info: battery_handyman.util.BatteryInfo) -> str:
+        """Transforms `battery_info` into the ready request line (the URL)
+
+        The percentages are looked up in the decision table
+        built on the first call after a change of the limits or the request settings
+        if all the fields of the template depend only on the battery state.
+        A fractional percentage (e.g. of the sysfs source or the filters) takes the entry
+        of its floor only if the entry of its ceiling is the same: the limit comparisons
+        give the same result on the whole interval then. Otherwise it is rendered directly.
+        Raises `DoNotToogleChargingException` if the charging must be unchanged
+        """
+        left_in_percents = battery_info.left_in_percents
+        if (
+                self._is_request_data_cacheable
+                and battery_handyman.constants.BATTERY_LIMIT_VALUE_MINIMAL
+                <= left_in_percents <= battery_handyman.constants.BATTERY_LIMIT_VALUE_MAXIMAL
+        ):
+            decision_table = self._decision_table
+            if decision_table is None:
+                decision_table = self._decision_table = self.build_decision_table()
+            decision_table_row = decision_table[bool(battery_info.is_charging)]
+            percent_index = int(left_in_percents)
+            ready_request_line = decision_table_row[percent_index]
+            if (
+                    percent_index == left_in_percents
+                    or ready_request_line == decision_table_row[percent_index + 1]
+            ):
+                if ready_request_line is None:
+                    logger.debug(battery_handyman.constants.MSG_CHARGING_MUST_NOT_TO_BE_TOOGLED)
+                    raise battery_handyman.util.DoNotToogleChargingException
+                return ready_request_line
+
+        return self.render_request_line(self.extract_request_data(battery_info))
+
+    def prepare_request_line_timed(self, battery_info: battery_handyman.util.BatteryInfo) -> str:
+        """Calls `prepare_request_line` reporting its time as the "prepare" stage"""
+        if not self._stage_hook_list:
+            return self.prepare_request_line(battery_info)
+        prepare_start_time = time.perf_counter()
+        try:
+            return self.prepare_request_line(battery_info)
+        finally:
+            self.report_stage(
+                battery_handyman.constants.STAGE_PREPARE, time.perf_counter() - prepare_start_time
+            )
+
+    def forget_confirmed_command(self, battery_info: battery_handyman.util.BatteryInfo) -> None:
+        """Forgets the delivered command if the charging state confirms it
+
+        So the command is sent again immediately if the state changes back
+        """
+        last_delivered_command = self._last_delivered_command
+        if (
+                last_delivered_command is not None
+                and battery_info.is_charging == last_delivered_command.expected_is_charging
+        ):
+            self._last_delivered_command = None
+
+    def is_command_duplicate(self, ready_request_line: str) -> bool:
+        """Checks whether the same command has been delivered recently and not confirmed yet"""
+        last_delivered_command = self._last_delivered_command
+        return (
+            last_delivered_command is not None
+            and ready_request_line == last_delivered_command.ready_request_line
+            and (
+                self._scheduler.timefunc() - last_delivered_command.delivered_at
+                < self.command_confirm_timeout
+            )
+        )
+
+    def remember_delivered_command(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo
+    ) -> None:
+        """Saves the successfully delivered command for `is_command_duplicate`"""
+        if not self.command_confirm_timeout:
+            return
+        self._last_delivered_command = battery_handyman.util.DeliveredCommand(
+            ready_request_line=ready_request_line,
+            # The command toggles the charging if it is sent
+            expected_is_charging=not battery_info.is_charging,
+            delivered_at=self._scheduler.timefunc(),
+        )
+
+    def handle_response_status(
+            self, ready_request_line: str, status_code: int, reason: str
+    ) -> bool:
+        """Logs the result of the request and returns whether it is successful"""
+        is_successful = status_code <= battery_handyman.constants.RESPONSE_STATUS_CODE_SUCCESS_MAX
+        level = logging.DEBUG if is_successful else logging.ERROR
+        if logger.isEnabledFor(level):
+            logger.log(
+                level, "Response %s to %s request to %s. Reason: %s", status_code,
+                self.request_method, ready_request_line, reason,
+                extra=battery_handyman.util.make_log_event(
+                    battery_handyman.constants.LOG_EVENT_RESPONSE,
+                    remote_address=self.remote_address, method=self.request_method,
+                    url=ready_request_line, status_code=status_code, reason=reason,
+                ),
+            )
+        return is_successful
+
+    def send_request(self, battery_info: battery_handyman.util.BatteryInfo) -> int:
+        """Runs the whole pipeline from processing `battery_info` to HTTP response handling
+
+        Returns the outcome as one of the `DECISION_*` constants
+        """
         if self._skip_send_request:
+            return battery_handyman.constants.DECISION_KEEP
+
+        self.forget_confirmed_command(battery_info)
+        try:
+            ready_request_line = self.prepare_request_line_timed(battery_info)
+        except battery_handyman.util.DoNotToogleChargingException:
+            self.cancel_retry()
+            raise
+        if self.is_command_duplicate(ready_request_line):
+            logger.debug("%s has been sent recently, it is not confirmed yet", ready_request_line)
+            return battery_handyman.constants.DECISION_DUPLICATE
+        if ready_request_line == self._retry_request_line:
+            logger.debug("%s is going to be retried", ready_request_line)
+            return battery_handyman.constants.DECISION_DUPLICATE
+        self.cancel_retry()
+
+        if self._batch_template is not None:
+            return self.batch_request(ready_request_line, battery_info)
+        if self.dispatch_mode == battery_handyman.constants.DISPATCH_MODE_POOL:
+            return self.dispatch_request(ready_request_line, battery_info)
+        return self.deliver_and_handle_request(ready_request_line, battery_info)
+
+    def react(self, battery_info: battery_handyman.util.BatteryInfo) -> Tuple[int, float]:
+        """Runs `send_request` as an additional reaction of the check of another instance
+
+        Returns the outcome and the duration in seconds.
+        A failure is logged and gives `DECISION_FAILED` so it does not affect the other reactions
+        """
+        react_start_time = time.perf_counter()
+        try:
+            decision = self.send_request(battery_info)
+        except battery_handyman.util.DoNotToogleChargingException:
+            decision = battery_handyman.constants.DECISION_KEEP
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("The reaction of %s has failed", self.remote_address)
+            decision = battery_handyman.constants.DECISION_FAILED
+        return decision, time.perf_counter() - react_start_time
+
+    def deliver_and_handle_request(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int = 0
+    ) -> int:
+        """Sends the ready request line and handles the response
+
+        `attempt` is the number of the previous failed attempts.
+        Returns `DECISION_SENT`, `DECISION_FAILED` or `DECISION_BLOCKED`
+        """
+        if not self.is_request_allowed(ready_request_line):
+            return battery_handyman.constants.DECISION_BLOCKED
+        self.log_request(ready_request_line, attempt)
+
+        request_start_time = time.perf_counter()
+        try:
+            response_status = self.deliver_request(ready_request_line)
+        except Exception:
+            self.record_unexpected_delivery_failure()
+            raise
+        self.record_response_metrics(time.perf_counter() - request_start_time, response_status)
+        return self.handle_delivery_result(
+            ready_request_line, battery_info, attempt, response_status
+        )
+
+    def log_request(self, ready_request_line: str, attempt: int) -> None:
+        """Logs the request being sent with its structured event"""
+        logger.info(
+            "Sending %s request to %s", self.request_method, ready_request_line,
+            extra=battery_handyman.util.make_log_event(
+                battery_handyman.constants.LOG_EVENT_REQUEST, remote_address=self.remote_address,
+                method=self.request_method, url=ready_request_line, attempt=attempt,
+            ),
+        )
+
+    def dispatch_request(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int = 0
+    ) -> int:
+        """Passes the request to the worker threads and returns `DECISION_DISPATCHED`
+
+        The request equal to the not finished one is not dispatched again (`DECISION_DUPLICATE`).
+        A different request replaces the not started one
+        """
+        with self._check_lock:
+            if ready_request_line == self._dispatched_request_line:
+                logger.debug("%s is being sent, it is not dispatched again", ready_request_line)
+                return battery_handyman.constants.DECISION_DUPLICATE
+            self._dispatched_request_line = ready_request_line
+
+        def deliver_dispatched_request():
+            try:
+                self.deliver_and_handle_request(ready_request_line, battery_info, attempt)
+            finally:
+                release_dispatched_request()
+
+        def release_dispatched_request():
+            with self._check_lock:
+                if self._dispatched_request_line == ready_request_line:
+                    self._dispatched_request_line = None
+
+        battery_handyman.dispatch.REQUEST_DISPATCHER.submit(
+            (self.remote_address, id(self)), deliver_dispatched_request,
+            release_dispatched_request,
+        )
+        return battery_handyman.constants.DECISION_DISPATCHED
+
+    def batch_request(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int = 0
+    ) -> int:
+        """Passes the command to the batch of `remote_address` and returns `DECISION_DISPATCHED`
+
+        The command is the rendered `request_template` without its leading `/`.
+        The commands collected during `batch_window` are sent as one request
+        rendered by `batch_template`.
+        Returns `DECISION_BLOCKED` if the circuit of the remote device is open
+        """
+        if not self.is_request_allowed(ready_request_line):
+            return battery_handyman.constants.DECISION_BLOCKED
+        self.get_command_batcher().add(
+            (self.remote_address, self.request_method, self.batch_template, self.batch_separator),
+            id(self), ready_request_line[len(self.remote_address) + 1:], self.batch_window,
+            self.deliver_batch,
+            functools.partial(self.handle_batch_result, ready_request_line, battery_info, attempt),
+        )
+        return battery_handyman.constants.DECISION_DISPATCHED
+
+    def deliver_batch(
+            self, command_list: List[str]
+    ) -> Optional[battery_handyman.util.ResponseStatus]:
+        """Sends the batch request with the commands of all the instances in the batch"""
+        batch_request_line = self.remote_address + self.batch_template.format(**{
+            battery_handyman.constants.BATCH_TEMPLATE_KEY_COMMANDS:
+                self.batch_separator.join(command_list),
+        })
+        logger.info(
+            "Sending %s request of %s commands to %s",
+            self.request_method, len(command_list), batch_request_line,
+            extra=battery_handyman.util.make_log_event(
+                battery_handyman.constants.LOG_EVENT_REQUEST, remote_address=self.remote_address,
+                method=self.request_method, url=batch_request_line,
+                command_count=len(command_list),
+            ),
+        )
+        request_start_time = time.perf_counter()
+        response_status = self.deliver_request(batch_request_line)
+        self.record_response_metrics(time.perf_counter() - request_start_time, response_status)
+        return response_status
+
+    def handle_batch_result(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int, response_status: Optional[battery_handyman.util.ResponseStatus]
+    ) -> None:
+        """Handles the status of the batch request the command has been sent by.
+         It is called by the worker thread"""
+        self.handle_delivery_result(ready_request_line, battery_info, attempt, response_status)
+
+    def get_command_batcher(self) -> battery_handyman.batching.CommandBatcher:
+        """Returns the batcher collecting the commands of `batch_template`"""
+        return battery_handyman.batching.COMMAND_BATCHER
+
+    def get_circuit_breaker(self) -> Optional[battery_handyman.retry.CircuitBreaker]:
+        """Returns the circuit breaker of the remote device or `None` if it is disabled"""
+        if not self.circuit_breaker_threshold:
+            return None
+        return battery_handyman.retry.get_circuit_breaker(
+            self.remote_address, self.circuit_breaker_threshold, self.circuit_breaker_reset_timeout
+        )
+
+    def record_unexpected_delivery_failure(self) -> None:
+        """Counts the delivery ended by an unexpected exception (e.g. of the invalid URL)
+         as the failure, so the probe of the half-open circuit does not hold it"""
+        circuit_breaker = self.get_circuit_breaker()
+        if circuit_breaker is not None:
+            circuit_breaker.record_failure()
+
+    def is_request_allowed(self, ready_request_line: str) -> bool:
+        """Checks the circuit breaker of the remote device"""
+        circuit_breaker = self.get_circuit_breaker()
+        if circuit_breaker is None or circuit_breaker.allow_request():
+            return True
+        logger.warning(
+            "The circuit of %s is open, %s is not sent", self.remote_address, ready_request_line
+        )
+        return False
+
+    def handle_delivery_result(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int, response_status: Optional[battery_handyman.util.ResponseStatus]
+    ) -> int:
+        """Updates the circuit breaker, remembers the delivered command or schedules the retry
+
+        `None` as `response_status` means the connection error.
+        Returns `DECISION_SENT` or `DECISION_FAILED`
+        """
+        circuit_breaker = self.get_circuit_breaker()
+        if response_status is not None and self.handle_response_status(
+                ready_request_line, response_status[0], response_status[1]
+        ):
+            if circuit_breaker is not None:
+                circuit_breaker.record_success()
+            self.remember_delivered_command(ready_request_line, battery_info)
+            return battery_handyman.constants.DECISION_SENT
+
+        retry_after = None
+        if response_status is not None:
+            if not battery_handyman.retry.is_status_code_retryable(response_status[0]):
+                # The remote device is reachable, so the probe closes the circuit
+                if circuit_breaker is not None:
+                    circuit_breaker.record_success()
+                return battery_handyman.constants.DECISION_FAILED
+            retry_after = getattr(response_status, "retry_after", None)
+        if circuit_breaker is not None:
+            circuit_breaker.record_failure()
+        self.schedule_retry(ready_request_line, battery_info, attempt, retry_after)
+        return battery_handyman.constants.DECISION_FAILED
+
+    def schedule_retry(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int, retry_after: Optional[float] = None
+    ) -> None:
+        """Schedules the retry of the failed request if the attempts are not exhausted
+
+        Without the retries the request is repeated by the next check if it is still needed
+        """
+        if attempt >= self.retry_max_attempts:
+            if self.retry_max_attempts:
+                logger.error(
+                    "%s is not delivered after %s retries", ready_request_line, attempt
+                )
             return
+        delay = battery_handyman.retry.get_retry_delay(
+            attempt, self.retry_base_delay, self.retry_max_delay, retry_after
+        )
+        logger.warning("%s is retried in %.3f seconds", ready_request_line, delay)
+        self.enter_retry(delay, ready_request_line, battery_info, attempt + 1)
 
-        request_data = self.extract_request_data(battery_info)
-        self.map_request_data_inplace(request_data)
-        ready_request_line = (
-            self.remote_address + self.request_template.format(**request_data)
+    def enter_retry(
+            self, delay: float, ready_request_line: str,
+            battery_info: battery_handyman.util.BatteryInfo, attempt: int
+    ) -> None:
+        """Adds the retry to the scheduler replacing the pending one"""
+        self.cancel_retry()
+        with self._check_lock:
+            self._retry_request_line = ready_request_line
+            self._retry_event = self._scheduler.enter(
+                delay, 1, self.retry_request, (ready_request_line, battery_info, attempt)
+            )
+        self.wake_scheduler()
+
+    def retry_request(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int
+    ) -> None:
+        """Sends the request again"""
+        with self._check_lock:
+            self._retry_request_line = None
+            self._retry_event = None
+        if self._batch_template is not None:
+            self.batch_request(ready_request_line, battery_info, attempt)
+        elif self.dispatch_mode == battery_handyman.constants.DISPATCH_MODE_POOL:
+            self.dispatch_request(ready_request_line, battery_info, attempt)
+        else:
+            self.deliver_and_handle_request(ready_request_line, battery_info, attempt)
+
+    def cancel_retry(self) -> None:
+        """Cancels the pending retry"""
+        if self._retry_request_line is None:
+            return
+        with self._check_lock:
+            if self._retry_event is not None:
+                try:
+                    self._scheduler.cancel(self._retry_event)
+                except ValueError:
+                    # The retry is being performed now
+                    pass
+            self._retry_request_line = None
+            self._retry_event = None
+
+    def record_response_metrics(
+            self, request_duration: float,
+            response_status: Optional[battery_handyman.util.ResponseStatus]
+    ) -> None:
+        """Updates the metrics of the HTTP requests. `None` means the connection error"""
+        if self._stage_hook_list:
+            self.report_stage(battery_handyman.constants.STAGE_DELIVER, request_duration)
+        controller_label_values = (self.remote_address, )
+        battery_handyman.metrics.REQUEST_DURATION.observe(
+            request_duration, controller_label_values
         )
+        if response_status is None:
+            battery_handyman.metrics.CONNECTION_ERRORS_TOTAL.inc(controller_label_values)
+        else:
+            battery_handyman.metrics.RESPONSES_TOTAL.inc(
+                (self.remote_address, str(response_status[0]))
+            )
 
-        logger.info("Sending %s request to %s", self.request_method, ready_request_line)
+    def deliver_request(
+            self, ready_request_line: str
+    ) -> Optional[battery_handyman.util.ResponseStatus]:
+        """Sends the HTTP request and returns the status of the response
 
-        # Retry will be performed after the next check if it is needed
+        Returns `None` if the remote device is not reachable or does not respond in time
+        """
+        import requests  # pylint: disable=import-outside-toplevel  # It is slow to import
+        timeout = (self.connect_timeout, self.read_timeout)
         try:
-            response = requests.request(self.request_method, ready_request_line)
-        except requests.exceptions.ConnectionError as exception_instance:
+            if self.connection_pool_size:
+                response = battery_handyman.session_pool.SESSION_POOL.request(
+                    self.remote_address, self.connection_pool_size, self.connection_idle_timeout,
+                    self.request_method, ready_request_line, timeout=timeout
+                )
+            else:
+                response = requests.request(
+                    self.request_method, ready_request_line, timeout=timeout
+                )
+        except (
+                requests.exceptions.ConnectionError, requests.exceptions.Timeout
+        ) as exception_instance:
             logger.error(
                 "%s request to %s: %s",
                 self.request_method, ready_request_line, exception_instance
             )
-            return
+            return None
+        retry_after = None
+        if battery_handyman.retry.is_status_code_retryable(response.status_code):
+            retry_after = battery_handyman.retry.parse_retry_after(
+                response.headers.get("Retry-After")
+            )
+        return battery_handyman.util.ResponseStatus(
+            response.status_code, response.reason, retry_after
+        )
+
+    # SECTION: CHECKER
+    def perform_check(self) -> None:
+        """Obtains `battery_info`, pass it to `send_request` and schedule the next check
+
+        The next check is scheduled even if the current one has failed
+        so the failure does not stop the check cycle of a scheduler shared with other instances
+        """
+        now = self._scheduler.timefunc()
+        with self._check_lock:
+            next_check_event = self._next_check_event
+            self._next_check_event = None
+            self._is_immediate_check_requested = False
+            self._check_deadline = now if next_check_event is None else next_check_event.time
+        scheduler_lag = None
+        if next_check_event is not None:
+            scheduler_lag = now - next_check_event.time
+        check_start_time = time.perf_counter()
+        self.record_check_start(scheduler_lag)
+        try:
+            battery_info = self.read_battery_info()
+            reaction_future_list = self.start_reactions(battery_info)
+            try:
+                decision = self.send_request(battery_info)
+            except battery_handyman.util.DoNotToogleChargingException:
+                decision = battery_handyman.constants.DECISION_KEEP
+            finally:
+                for reaction, reaction_future in reaction_future_list:
+                    self.record_reaction(battery_info, reaction, *reaction_future.result())
+            self.record_decision_timed(battery_info, decision, check_start_time)
+        finally:
+            self.schedule_new_check()
+
+    def create_reaction(
+            self, battery_limit_config: Optional[ConfigSectionNamespace],
+            remote_request_config: ConfigSectionNamespace
+    ) -> BatteryHandyman:
+        """Creates the additional reaction: the instance sending its own requests
+         on the checks of this instance"""
+        reaction = type(self)(
+            battery_limit_config,
+            # The reaction does not read the battery, this source opens nothing
+            ConfigSectionNamespace(
+                battery_source=battery_handyman.constants.BATTERY_SOURCE_PSUTIL
+            ),
+            remote_request_config,
+        )
+        self.adopt_reaction(reaction)
+        return reaction
+
+    def adopt_reaction(self, reaction: BatteryHandyman) -> None:
+        """Makes the reaction share the runtime of this instance"""
+        reaction.scheduler = self._scheduler
+
+    def start_reactions(
+            self, battery_info: battery_handyman.util.BatteryInfo
+    ) -> List[Tuple[BatteryHandyman, concurrent.futures.Future]]:
+        """Starts the additional reactions to `battery_info` in the shared thread pool"""
+        if not self._reaction_list:
+            return []
+        reaction_executor = battery_handyman.dispatch.get_reaction_executor()
+        return [
+            (reaction, reaction_executor.submit(reaction.react, battery_info))
+            for reaction in self._reaction_list
+        ]
+
+    def record_reaction(
+            self, battery_info: battery_handyman.util.BatteryInfo, reaction: BatteryHandyman,
+            decision: int, duration: float
+    ) -> None:
+        """Counts the outcome of the additional reaction and reports its time
+         as the "reaction" stage of the reaction"""
+        reaction.record_decision(battery_info, decision)
+        if self._stage_hook_list:
+            self.report_stage(battery_handyman.constants.STAGE_REACTION, duration, reaction)
+
+    def record_check_start(self, scheduler_lag: Optional[float]) -> None:
+        """Updates the metrics of the started check and starts collecting its stages
+
+        `scheduler_lag` is the delay after the scheduled time, `None` if it is unknown
+        """
+        if self._stage_profiler is not None:
+            self._stage_profiler.begin_check()
+        controller_label_values = (self.remote_address, )
+        battery_handyman.metrics.CHECKS_TOTAL.inc(controller_label_values)
+        if scheduler_lag is not None:
+            battery_handyman.metrics.SCHEDULER_LAG.observe(
+                max(scheduler_lag, 0), controller_label_values
+            )
+
+    def read_battery_info(self) -> battery_handyman.util.BatteryInfo:
+        """Reads the battery state from `battery_source` and records it.
+         Returns the filtered reading"""
+        read_start_time = time.perf_counter()
+        battery_info = self.battery_source.read()
+        read_duration = time.perf_counter() - read_start_time
+        battery_handyman.metrics.BATTERY_READ_DURATION.observe(
+            read_duration, (self._battery_source_name, )
+        )
+        if self._stage_hook_list:
+            self.report_stage(battery_handyman.constants.STAGE_READ, read_duration)
+        self.record_battery_info(battery_info)
+        self._last_raw_battery_info = battery_info
+        if self._battery_filter is not None:
+            battery_info = self._battery_filter.apply(self._scheduler.timefunc(), battery_info)
+        return battery_info
+
+    def get_battery_zone(self, battery_info: battery_handyman.util.BatteryInfo) -> int:
+        """Returns -1 if the percentage is below `battery_limit_low`,
+         1 if it is above `battery_limit_charged` and 0 otherwise"""
+        if battery_info.left_in_percents < self.battery_limit_low:
+            return -1
+        if battery_info.left_in_percents > self.battery_limit_charged:
+            return 1
+        return 0
+
+    def reset_battery_filter(self) -> None:
+        """Recreates the filter of the readings from the filter properties.
+         The previous readings are forgotten"""
+        self._battery_filter = battery_handyman.filters.create_battery_filter(
+            self._filter_median_size, self._filter_ewma_alpha, self._filter_min_dwell_time,
+            self.get_battery_zone,
+        )
+
+    def record_battery_info(self, battery_info: battery_handyman.util.BatteryInfo) -> None:
+        """Saves the obtained `battery_info` for the adaptive check interval
+         and the template fields using the charge rate"""
+        if self.adaptive_check_interval or self._needs_charge_rate:
+            if self._charge_rate_estimator is None:
+                self._charge_rate_estimator = battery_handyman.adaptive.ChargeRateEstimator(
+                    battery_handyman.constants.ADAPTIVE_HISTORY_SIZE
+                )
+            self._charge_rate_estimator.add_sample(self._scheduler.timefunc(), battery_info)
+
+    def get_wall_time(self) -> float:
+        """Returns the time in seconds since the epoch for the records
+
+        The monotonic time of the scheduler is replaced by the system time,
+        the other clocks (e.g. the virtual clock of the simulation) are taken as is
+        """
+        if self._scheduler.timefunc is time.monotonic:
+            return time.time()
+        return self._scheduler.timefunc()
+
+    def record_decision(
+            self, battery_info: battery_handyman.util.BatteryInfo, decision: int
+    ) -> None:
+        """Counts the outcome of the check and appends it to the history file if it is configured
 
-        if response.status_code <= battery_handyman.constants.RESPONSE_STATUS_CODE_SUCCESS_MAX:
+        The history gets the raw reading of the check (see `read_battery_info`),
+        so it can be replayed by the simulation applying the filters again.
+        `battery_info` is recorded if the battery has not been read by this instance.
+        The file is opened on the first record
+        """
+        check_time = self.get_wall_time()
+        self._last_battery_info = battery_info
+        self._last_decision = decision
+        self._last_check_time = check_time
+        decision_name = battery_handyman.constants.DECISION_NAME_LIST[decision]
+        battery_handyman.metrics.DECISIONS_TOTAL.inc((self.remote_address, decision_name))
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(
-                "Response %s to %s request to %s", response.status_code,
-                self.request_method, ready_request_line
+                "The decision for %s is %s", self.remote_address, decision_name,
+                extra=battery_handyman.util.make_log_event(
+                    battery_handyman.constants.LOG_EVENT_DECISION,
+                    remote_address=self.remote_address, decision=decision_name,
+                    left_in_percents=battery_info.left_in_percents,
+                    is_charging=battery_info.is_charging,
+                ),
             )
+        if self._history_path is None or self._is_history_unavailable:
             return
+        history_recorder = self._history_recorder
+        if history_recorder is None:
+            try:
+                history_recorder = self._history_recorder = (
+                    battery_handyman.history.HistoryRecorder(self._history_path, self.history_size)
+                )
+            except (OSError, ValueError) as exception_instance:
+                logger.error(
+                    "The history is not recorded to %s: %s", self._history_path, exception_instance
+                )
+                self._is_history_unavailable = True
+                return
+        raw_battery_info = self._last_raw_battery_info
+        if raw_battery_info is None:
+            raw_battery_info = battery_info
+        try:
+            history_recorder.append(
+                check_time, raw_battery_info.left_in_percents,
+                raw_battery_info.is_charging, decision
+            )
+        except (struct.error, OSError, ValueError) as exception_instance:
+            # A failed record must not stop the checks
+            logger.error(
+                "The check is not recorded to %s: %s", self._history_path, exception_instance
+            )
 
-        logger.error(
-            "Response %s to %s request to %s. Reason: %s", response.status_code,
-            self.request_method, ready_request_line, response.reason
+    def record_decision_timed(
+            self, battery_info: battery_handyman.util.BatteryInfo, decision: int,
+            check_start_time: float
+    ) -> None:
+        """Calls `record_decision` reporting its time as the "record" stage
+         and the time since `check_start_time` (by `time.perf_counter`) as the "check" stage"""
+        if not self._stage_hook_list:
+            self.record_decision(battery_info, decision)
+            return
+        record_start_time = time.perf_counter()
+        self.record_decision(battery_info, decision)
+        record_finish_time = time.perf_counter()
+        self.report_stage(
+            battery_handyman.constants.STAGE_RECORD, record_finish_time - record_start_time
+        )
+        self.report_stage(
+            battery_handyman.constants.STAGE_CHECK, record_finish_time - check_start_time
         )
 
-    # SECTION: CHECKER
-    def perform_check(self) -> None:
-        """Obtains `battery_info`, pass it to `send_request` and schedule the next check"""
-        battery_info = battery_handyman.util.get_battery_info()
-        try:
-            self.send_request(battery_info)
-        except battery_handyman.util.DoNotToogleChargingException:
-            pass
-        self.schedule_new_check()
+    def close_history(self) -> None:
+        """Releases the history file. It is reopened on the next record"""
+        if self._history_recorder is not None:
+            self._history_recorder.close()
+            self._history_recorder = None
+
+    def add_stage_hook(self, stage_hook: Callable[[BatteryHandyman, str, float], None]) -> None:
+        """Starts calling `stage_hook(instance, stage, duration)` after the stages of the checks
+
+        The stages are the `STAGE_*` constants: "read" (the battery state reading),
+        "prepare" (the decision and the request line rendering), "deliver" (the HTTP request),
+        "reaction" (the whole additional reaction, reported with the reaction as the instance),
+        "record" (the metrics and the history) and "check" (the whole check, reported last).
+        The durations are in seconds. The stages that are not reached are not reported.
+        Without the hooks the stages are not timed
+        """
+        self._stage_hook_list.append(stage_hook)
+
+    def remove_stage_hook(self, stage_hook: Callable[[BatteryHandyman, str, float], None]) -> None:
+        """Stops calling `stage_hook`"""
+        self._stage_hook_list.remove(stage_hook)
+
+    def report_stage(
+            self, stage: str, duration: float, instance: Optional[BatteryHandyman] = None
+    ) -> None:
+        """Passes the duration of the stage to the stage hooks.
+         `instance` is the one the stage belongs to, this one by default"""
+        for stage_hook in self._stage_hook_list:
+            stage_hook(self if instance is None else instance, stage, duration)
+
+    def get_next_check_delay(self) -> float:
+        """Returns the time in seconds until the next check
+
+        With the adaptive check interval the next check is performed before the predicted time
+        when the battery percentage crosses the limit of the current charging state.
+        The result is between `check_interval` and `check_interval_max`
+        """
+        if not self.adaptive_check_interval or self._charge_rate_estimator is None:
+            return self.check_interval
+        last_battery_info = self._charge_rate_estimator.last_battery_info
+        if last_battery_info is None or self._charge_rate_estimator.estimate_rate() is None:
+            return self.check_interval
+
+        if last_battery_info.is_charging:
+            battery_limit = self.battery_limit_charged
+            is_beyond_limit = last_battery_info.left_in_percents > battery_limit
+        else:
+            battery_limit = self.battery_limit_low
+            is_beyond_limit = last_battery_info.left_in_percents < battery_limit
+        if is_beyond_limit:
+            # The reaction to the limit crossing must be confirmed soon
+            return self.check_interval
+
+        time_to_limit = self._charge_rate_estimator.estimate_time_to(battery_limit)
+        if time_to_limit is None:
+            return self.check_interval_max
+        return min(
+            max(
+                time_to_limit * battery_handyman.constants.ADAPTIVE_TIME_TO_LIMIT_FRACTION,
+                self.check_interval,
+            ),
+            self.check_interval_max,
+        )
+
+    def estimate_seconds_left(
+            self, battery_info: battery_handyman.util.BatteryInfo
+    ) -> Optional[float]:
+        """Returns the estimated time in seconds until the battery is full while charging
+         or empty while discharging according to `battery_info`
+
+        The charge rate is estimated by the recent readings, so no more readings are taken.
+        Returns `None` if there are not enough readings or the battery is not expected
+        to become full (empty)
+        """
+        if self._charge_rate_estimator is None:
+            return None
+        return self._charge_rate_estimator.estimate_time_to(
+            battery_handyman.constants.BATTERY_LIMIT_VALUE_MAXIMAL if battery_info.is_charging
+            else battery_handyman.constants.BATTERY_LIMIT_VALUE_MINIMAL
+        )
+
+    def get_next_check_deadline(self, check_deadline: float, now: float) -> float:
+        """Returns the scheduler time of the next check after the check planned at `check_deadline`
+
+        It is `get_next_check_delay()` after `check_deadline` aligned to `check_tick`,
+        so the durations of the checks do not shift the next ones.
+        The deadlines missed because of a long check are counted and skipped
+        """
+        deadline, missed_count = battery_handyman.deadlines.advance_deadline(
+            check_deadline, self.get_next_check_delay(), now
+        )
+        if missed_count:
+            battery_handyman.metrics.MISSED_CHECKS_TOTAL.inc(
+                (self.remote_address, ), missed_count
+            )
+            logger.warning(
+                "%s checks are skipped, the previous one has finished %.3f seconds"
+                " after its deadline",
+                missed_count, now - check_deadline
+            )
+        return battery_handyman.deadlines.align_deadline(
+            deadline, self.check_tick, self.check_slack
+        )
 
     def schedule_new_check(self, initial: bool = False) -> None:
-        """Only adds additional entry in the scheduler"""
-        self._scheduler.enter(
-            0 if initial else self.check_interval, 1, self.perform_check
+        """Only adds additional entry in the scheduler
+
+        The checks are planned at the absolute deadlines, see `get_next_check_deadline`
+        """
+        with self._check_lock:
+            now = self._scheduler.timefunc()
+            if initial or self._is_immediate_check_requested or self._check_deadline is None:
+                deadline = now
+            else:
+                deadline = self.get_next_check_deadline(self._check_deadline, now)
+            self._next_check_event = self._scheduler.enterabs(deadline, 1, self.perform_check)
+
+    def request_immediate_check(self) -> None:
+        """Moves the next check to the current moment. It can be called from any thread
+
+        If the check is being performed now, the next one is performed right after it
+        """
+        with self._check_lock:
+            next_check_event = self._next_check_event
+            try:
+                if next_check_event is None:
+                    raise ValueError("No check is scheduled")
+                self._scheduler.cancel(next_check_event)
+            except ValueError:
+                # The check is being performed now
+                self._is_immediate_check_requested = True
+            else:
+                self._next_check_event = self._scheduler.enter(0, 1, self.perform_check)
+        logger.debug("The immediate check is requested")
+        self.wake_scheduler()
+
+    def wake_scheduler(self) -> None:
+        """Interrupts the waiting of the scheduler for the next event if it is possible"""
+        wake = getattr(self._scheduler.delayfunc, "wake", None)
+        if wake is not None:
+            wake()
+
+    def subscribe_to_power_events(self) -> None:
+        """Starts performing the checks on the power supply events if they are enabled"""
+        if self._power_event_source is not None:
+            try:
+                self._power_event_source.subscribe(self.request_immediate_check)
+            except OSError as exception_instance:
+                logger.warning(
+                    "The power supply events are unavailable (%s)."
+                    " Only the periodic checks are performed",
+                    exception_instance
+                )
+
+    def unsubscribe_from_power_events(self) -> None:
+        """Stops performing the checks on the power supply events"""
+        if self._power_event_source is not None:
+            self._power_event_source.unsubscribe(self.request_immediate_check)
+
+    def subscribe_to_configuration_changes(self) -> None:
+        """Starts reloading the configuration file after its changes if it is enabled"""
+        if self._config_file_watcher is None or self._configuration_filepath is None:
+            return
+        try:
+            self._config_file_watcher.subscribe(
+                self._configuration_filepath, self.request_configuration_reload
+            )
+        except OSError as exception_instance:
+            logger.warning(
+                "The changes of %s are not watched (%s)."
+                " The configuration is applied only on the start",
+                self._configuration_filepath, exception_instance
+            )
+
+    def unsubscribe_from_configuration_changes(self) -> None:
+        """Stops reloading the configuration file after its changes"""
+        if self._config_file_watcher is not None and self._configuration_filepath is not None:
+            self._config_file_watcher.unsubscribe(
+                self._configuration_filepath, self.request_configuration_reload
+            )
+
+    def request_configuration_reload(self) -> None:
+        """Reloads the configuration file before the next check.
+         It can be called from any thread"""
+        logger.debug("The reload of %s is requested", self._configuration_filepath)
+        self._scheduler.enter(0, 0, self.reload_configuration)
+        self.wake_scheduler()
+
+    def call_between_checks(self, function: Callable[[], Any]) -> concurrent.futures.Future:
+        """Calls `function` by the thread performing the checks, so it does not run
+         during a check. It can be called from any thread. Returns the future of the result
+
+        Without the running check cycle `function` is called at once
+        """
+        future, call = battery_handyman.dispatch.make_future_call(function)
+        if self._is_check_cycle_running:
+            self._scheduler.enter(0, 0, call)
+            self.wake_scheduler()
+        else:
+            call()
+        return future
+
+    def reload_configuration(self) -> bool:
+        """Applies the configuration file again. Returns whether it has been applied
+
+        The invalid configuration is logged and the current one is kept
+        """
+        try:
+            other = type(self).from_configuration_file(self._configuration_filepath)
+        except (OSError, ValueError, yaml.YAMLError) as exception_instance:
+            logger.error(
+                "The changed configuration %s is not applied: %s",
+                self._configuration_filepath, exception_instance
+            )
+            return False
+        return self.apply_configuration(other)
+
+    def apply_configuration(self, other: BatteryHandyman) -> bool:
+        """Takes the configured properties of `other` that differ from the current ones.
+         Returns whether they have been applied
+
+        The runtime state (the scheduled checks, the sent commands, the history) is kept.
+        If a property cannot be set, the changed ones are restored.
+        The check is performed right after the change so the new settings act without a delay
+        """
+        changed_name_list = [
+            name for name in self.CONFIG_PROPERTY_NAME_LIST
+            if getattr(other, name) != getattr(self, name)
+        ]
+        reaction_config_list = self.get_reaction_config_list()
+        other_reaction_config_list = other.get_reaction_config_list()
+        is_reaction_list_changed = reaction_config_list != other_reaction_config_list
+        if not changed_name_list and not is_reaction_list_changed:
+            logger.debug("The configuration is not changed")
+            return True
+        previous_value_list = []
+        is_resubscription_needed = bool(
+            {"power_events", "reload_on_change"}.intersection(changed_name_list)
         )
+        if is_resubscription_needed:
+            self.unsubscribe_from_power_events()
+            self.unsubscribe_from_configuration_changes()
+        try:
+            for name in changed_name_list:
+                previous_value = getattr(self, name)
+                setattr(self, name, getattr(other, name))
+                previous_value_list.append((name, previous_value))
+        except (TypeError, ValueError) as exception_instance:
+            logger.error(
+                "The configuration is not applied, the previous one is restored: %s",
+                exception_instance
+            )
+            for name, previous_value in reversed(previous_value_list):
+                setattr(self, name, previous_value)
+            return False
+        finally:
+            if is_resubscription_needed:
+                self.subscribe_to_power_events()
+                self.subscribe_to_configuration_changes()
+        if is_reaction_list_changed:
+            self.replace_reactions(other, reaction_config_list, other_reaction_config_list)
+            changed_name_list.append("reactions")
+        logger.info("The configuration is applied, changed: %s", ", ".join(changed_name_list))
+        self.request_immediate_check()
+        return True
+
+    def replace_reactions(
+            self, other: BatteryHandyman, reaction_config_list: List[Dict[str, Any]],
+            other_reaction_config_list: List[Dict[str, Any]]
+    ) -> None:
+        """Takes the reactions of `other`. The unchanged reactions are kept with their state"""
+        reaction_list = []
+        for index, other_reaction in enumerate(other.reactions):
+            if (
+                    index < len(self._reaction_list)
+                    and reaction_config_list[index] == other_reaction_config_list[index]
+            ):
+                reaction_list.append(self._reaction_list[index])
+                continue
+            self.adopt_reaction(other_reaction)
+            reaction_list.append(other_reaction)
+        for reaction in self._reaction_list:
+            if reaction not in reaction_list:
+                reaction.stop()
+        self._reaction_list = reaction_list
 
     def start(self, blocking: bool = True) -> None:
         """Runs the check cycle"""
+        self.subscribe_to_power_events()
+        self.subscribe_to_configuration_changes()
         self.schedule_new_check(initial=True)
-        self._scheduler.run(blocking=blocking)
+        self._is_check_cycle_running = blocking
+        try:
+            self._scheduler.run(blocking=blocking)
+        finally:
+            self._is_check_cycle_running = False
 
     def stop(self) -> None:
-        """Stops the check cycle"""
-        if not self._scheduler.empty():
-            for event in self._scheduler.queue:
-                self._scheduler.cancel(event)
+        """Stops the check cycle
+
+        Only the events of this instance are cancelled since the scheduler may be shared
+        """
+        self.unsubscribe_from_power_events()
+        self.unsubscribe_from_configuration_changes()
+        self.cancel_retry()
+        if self._batch_template is not None:
+            self.get_command_batcher().discard(id(self))
+        self.close_history()
+        for reaction in self._reaction_list:
+            reaction.stop()
+        with self._check_lock:
+            self._next_check_event = None
+            self._is_immediate_check_requested = False
+            if not self._scheduler.empty():
+                for event in self._scheduler.queue:
+                    if getattr(event.action, "__self__", None) is self:
+                        self._scheduler.cancel(event)
+        self.wake_scheduler()
+
+    @property
+    def scheduler(self) -> sched.scheduler:
+        """The scheduler running the check cycle. It can be shared by several instances"""
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, value: sched.scheduler) -> None:
+        self._scheduler = value
+        for reaction in self._reaction_list:
+            reaction.scheduler = value
+
+    @property
+    def last_battery_info(self) -> Optional[battery_handyman.util.BatteryInfo]:
+        """The battery state of the last finished check. `None` before the first check"""
+        return self._last_battery_info
+
+    @property
+    def last_decision(self) -> Optional[int]:
+        """The outcome of the last finished check as one of the `DECISION_*` constants"""
+        return self._last_decision
+
+    @property
+    def last_check_time(self) -> Optional[float]:
+        """The time of the last finished check, see `get_wall_time`"""
+        return self._last_check_time
+
+    @property
+    def reactions(self) -> List[BatteryHandyman]:
+        """The additional reactions configured after the first `remote_request_config` entry.
+         They send their requests concurrently on the checks of this instance"""
+        return self._reaction_list
 
     # SECTION: PROPERTIES
     @property
@@ -299,6 +1627,9 @@ class BatteryHandyman:
     @common_only_battery_limit_property_setter_routine
     def battery_limit_charged(self, value: int) -> None:
         self._battery_limit_charged = value
+        self._decision_table = None
+        for reaction in self._reaction_list:
+            reaction.battery_limit_charged = value
 
     @property
     def battery_limit_low(self) -> int:
@@ -311,6 +1642,9 @@ class BatteryHandyman:
     @common_only_battery_limit_property_setter_routine
     def battery_limit_low(self, value: int) -> None:
         self._battery_limit_low = value
+        self._decision_table = None
+        for reaction in self._reaction_list:
+            reaction.battery_limit_low = value
 
     @property
     def check_interval(self) -> int:
@@ -322,6 +1656,237 @@ class BatteryHandyman:
     def check_interval(self, value: int) -> None:
         self._check_interval = value
 
+    @property
+    def adaptive_check_interval(self) -> bool:
+        """Whether the time between checks is adapted to the predicted time to the limit"""
+        return self._adaptive_check_interval
+
+    @adaptive_check_interval.setter
+    @common_property_setter_routine
+    def adaptive_check_interval(self, value: bool) -> None:
+        self._adaptive_check_interval = value
+
+    @property
+    def check_interval_max(self) -> float:
+        """The maximal time interval between checks in seconds with the adaptive check interval.
+         The minimal one is `check_interval`"""
+        return self._check_interval_max
+
+    @check_interval_max.setter
+    @common_property_setter_routine
+    def check_interval_max(self, value: float) -> None:
+        self._check_interval_max = value
+
+    @property
+    def filter_median_size(self) -> int:
+        """The number of the last readings the median percentage is taken of, 1 disables it"""
+        return self._filter_median_size
+
+    @filter_median_size.setter
+    @common_property_setter_routine
+    def filter_median_size(self, value: int) -> None:
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ValueError(f"The provided median size ({value}) is invalid")
+        self._filter_median_size = value
+        self.reset_battery_filter()
+
+    @property
+    def filter_ewma_alpha(self) -> float:
+        """The weight of the new reading in the exponentially weighted moving average
+         of the percentage, 1 disables the averaging"""
+        return self._filter_ewma_alpha
+
+    @filter_ewma_alpha.setter
+    @common_property_setter_routine
+    def filter_ewma_alpha(self, value: float) -> None:
+        if not 0 < value <= 1:
+            raise ValueError(f"The provided EWMA weight ({value}) is invalid")
+        self._filter_ewma_alpha = value
+        self.reset_battery_filter()
+
+    @property
+    def filter_min_dwell_time(self) -> float:
+        """The time in seconds the percentage must stay beyond a battery limit
+         before the decision takes it into account, 0 disables it"""
+        return self._filter_min_dwell_time
+
+    @filter_min_dwell_time.setter
+    @common_property_setter_routine
+    def filter_min_dwell_time(self, value: float) -> None:
+        if value < 0:
+            raise ValueError(f"The provided minimal dwell time ({value}) is invalid")
+        self._filter_min_dwell_time = value
+        self.reset_battery_filter()
+
+    @property
+    def check_tick(self) -> float:
+        """The period in seconds of the shared ticks the check deadlines are aligned to,
+         so the checks of many instances wake the system up together. 0 disables it"""
+        return self._check_tick
+
+    @check_tick.setter
+    @common_property_setter_routine
+    def check_tick(self, value: float) -> None:
+        if value < 0:
+            raise ValueError(f"The provided check tick ({value}) is invalid")
+        self._check_tick = value
+
+    @property
+    def check_slack(self) -> Optional[float]:
+        """The maximal postponement in seconds of a check to the next tick.
+         The later ticks are not waited for. `None` means the whole tick"""
+        return self._check_slack
+
+    @check_slack.setter
+    @common_property_setter_routine
+    def check_slack(self, value: Optional[float]) -> None:
+        if value is not None and value < 0:
+            raise ValueError(f"The provided check slack ({value}) is invalid")
+        self._check_slack = value
+
+    @property
+    def battery_source_name(self) -> str:
+        """The name of the source of the battery state"""
+        return self._battery_source_name
+
+    @battery_source_name.setter
+    @common_property_setter_routine
+    def battery_source_name(self, value: str) -> None:
+        if value not in battery_handyman.constants.BATTERY_SOURCE_LIST:
+            raise ValueError(f"The battery source ({value}) is unknown")
+        # The source is obtained by the first reading,
+        # so the loading of the configuration (e.g. by `--validate`) does not access the battery
+        self._battery_source = None
+        self._battery_source_name = value
+
+    @property
+    def battery_source(self) -> battery_handyman.battery_source.BatterySource:
+        """The source of the battery state. It is set by `battery_source_name`
+         and can be replaced by a custom one"""
+        if self._battery_source is None:
+            self._battery_source = battery_handyman.battery_source.get_battery_source(
+                self._battery_source_name
+            )
+        return self._battery_source
+
+    @battery_source.setter
+    def battery_source(self, value: battery_handyman.battery_source.BatterySource) -> None:
+        self._battery_source = value
+
+    @property
+    def power_events(self) -> bool:
+        """Whether the check is performed immediately on the power supply events
+         in addition to the periodic checks"""
+        return self._power_events
+
+    @power_events.setter
+    @common_property_setter_routine
+    def power_events(self, value: bool) -> None:
+        self._power_event_source = None
+        if value:
+            self._power_event_source = battery_handyman.power_events.get_power_event_source()
+            if self._power_event_source is None:
+                logger.warning(
+                    "The power supply events are not supported on this platform."
+                    " Only the periodic checks are performed"
+                )
+        self._power_events = value
+
+    @property
+    def power_event_source(self) -> Optional[battery_handyman.power_events.PowerEventSource]:
+        """The source of the power supply events. It is set by `power_events`
+         and can be replaced by a custom one"""
+        return self._power_event_source
+
+    @power_event_source.setter
+    def power_event_source(
+            self, value: Optional[battery_handyman.power_events.PowerEventSource]
+    ) -> None:
+        self._power_event_source = value
+
+    @property
+    def reload_on_change(self) -> bool:
+        """Whether the configuration file is applied again after its changes
+         while the check cycle runs"""
+        return self._reload_on_change
+
+    @reload_on_change.setter
+    @common_property_setter_routine
+    def reload_on_change(self, value: bool) -> None:
+        self._config_file_watcher = None
+        if value:
+            self._config_file_watcher = battery_handyman.config_watcher.get_config_file_watcher()
+        self._reload_on_change = value
+
+    @property
+    def config_file_watcher(self) -> Optional[battery_handyman.config_watcher.ConfigFileWatcher]:
+        """The watcher of the configuration file. It is set by `reload_on_change`
+         and can be replaced by a custom one"""
+        return self._config_file_watcher
+
+    @config_file_watcher.setter
+    def config_file_watcher(
+            self, value: Optional[battery_handyman.config_watcher.ConfigFileWatcher]
+    ) -> None:
+        self._config_file_watcher = value
+
+    @property
+    def configuration_filepath(self) -> Optional[str]:
+        """The configuration file the instance is loaded from. `None` if it is unknown"""
+        return self._configuration_filepath
+
+    @configuration_filepath.setter
+    def configuration_filepath(self, value: Optional[str]) -> None:
+        self._configuration_filepath = value
+
+    @property
+    def profile_stages(self) -> bool:
+        """Whether the durations of the check stages are logged by the built-in stage hook"""
+        return self._stage_profiler is not None
+
+    @profile_stages.setter
+    @common_property_setter_routine
+    def profile_stages(self, value: bool) -> None:
+        if value and self._stage_profiler is None:
+            self._stage_profiler = battery_handyman.profiling.StageProfiler()
+            self.add_stage_hook(self._stage_profiler)
+        elif not value and self._stage_profiler is not None:
+            self.remove_stage_hook(self._stage_profiler)
+            self._stage_profiler = None
+
+    @property
+    def stage_profiler(self) -> Optional[battery_handyman.profiling.StageProfiler]:
+        """The built-in stage hook. It is `None` if `profile_stages` is disabled"""
+        return self._stage_profiler
+
+    @property
+    def history_path(self) -> Optional[str]:
+        """The path to the file keeping the results of the recent checks.
+         `None` means the history is not recorded"""
+        return self._history_path
+
+    @history_path.setter
+    @common_property_setter_routine
+    def history_path(self, value: Optional[str]) -> None:
+        self.close_history()
+        self._is_history_unavailable = False
+        self._history_path = value
+
+    @property
+    def history_size(self) -> int:
+        """The number of the records kept in the new history file"""
+        return self._history_size
+
+    @history_size.setter
+    @common_property_setter_routine
+    def history_size(self, value: int) -> None:
+        self._history_size = value
+
+    @property
+    def history_recorder(self) -> Optional[battery_handyman.history.HistoryRecorder]:
+        """The opened history file. It is `None` before the first record"""
+        return self._history_recorder
+
     @property
     def remote_address(self) -> str:
         """The address of the remote device that controls the charging of this device"""
@@ -331,20 +1896,34 @@ class BatteryHandyman:
     @common_property_setter_routine
     def remote_address(self, value: str) -> None:
         self._remote_address = value
+        self._decision_table = None
 
     @property
     def request_template(self) -> str:
-        """A URL path template with named placeholders"""
+        """A URL path template (starting with `/`) with named placeholders of the template fields.
+         See `template_fields`, the unknown placeholders are rejected"""
         return self._request_template
 
     @request_template.setter
     @common_property_setter_routine
     def request_template(self, value: str) -> None:
-        self._request_data_key_list = None
+        if value and not value.startswith("/"):
+            raise ValueError(f"The request template ({value}) must start with /")
+        request_field_list = []
         if value:
-            self._request_data_key_list = battery_handyman.util.parse_request_data_key_list(value)
+            request_field_list = battery_handyman.template_fields.get_template_field_list(
+                battery_handyman.util.parse_request_data_key_list(value)
+            )
 
+        self._request_field_list = request_field_list
+        self._is_request_data_cacheable = all(
+            template_field.is_cacheable for _, template_field in request_field_list
+        )
+        self._needs_charge_rate = any(
+            template_field.needs_charge_rate for _, template_field in request_field_list
+        )
         self._request_template = value
+        self._decision_table = None
 
     @property
     def request_method(self) -> str:
@@ -358,16 +1937,191 @@ class BatteryHandyman:
 
     @property
     def request_data_mapping(self) -> Dict[Any, Any]:
-        """A mapping for the values prepared for `request_template`"""
+        """A mapping for the values prepared for `request_template`.
+         Assign the changed mapping again to apply it"""
         return self._request_data_mapping
 
     @request_data_mapping.setter
     @common_property_setter_routine
     def request_data_mapping(self, value: Dict[Any, Any]) -> None:
         self._request_data_mapping = value
+        self._decision_table = None
+
+    @property
+    def connection_pool_size(self) -> int:
+        """The maximal number of the keep-alive connections to `remote_address`.
+         0 disables keeping the connections alive"""
+        return self._connection_pool_size
+
+    @connection_pool_size.setter
+    @common_property_setter_routine
+    def connection_pool_size(self, value: int) -> None:
+        if value < 0:
+            raise ValueError(f"The provided connection pool size ({value}) is invalid")
+        self._connection_pool_size = value
+
+    @property
+    def connection_idle_timeout(self) -> float:
+        """A time in seconds after which the not used keep-alive connections are closed"""
+        return self._connection_idle_timeout
+
+    @connection_idle_timeout.setter
+    @common_property_setter_routine
+    def connection_idle_timeout(self, value: float) -> None:
+        self._connection_idle_timeout = value
+
+    @property
+    def command_confirm_timeout(self) -> float:
+        """A time in seconds during which the delivered command is not sent again
+         unless the charging state confirms it. 0 disables the suppression"""
+        return self._command_confirm_timeout
+
+    @command_confirm_timeout.setter
+    @common_property_setter_routine
+    def command_confirm_timeout(self, value: float) -> None:
+        self._command_confirm_timeout = value
+
+    @property
+    def connect_timeout(self) -> float:
+        """The time in seconds to wait for the connection to the remote device"""
+        return self._connect_timeout
+
+    @connect_timeout.setter
+    @common_property_setter_routine
+    def connect_timeout(self, value: float) -> None:
+        self._connect_timeout = value
+
+    @property
+    def read_timeout(self) -> float:
+        """The time in seconds to wait for the response of the remote device"""
+        return self._read_timeout
+
+    @read_timeout.setter
+    @common_property_setter_routine
+    def read_timeout(self, value: float) -> None:
+        self._read_timeout = value
+
+    @property
+    def retry_max_attempts(self) -> int:
+        """The number of the retries of the failed request. 0 disables the retries"""
+        return self._retry_max_attempts
+
+    @retry_max_attempts.setter
+    @common_property_setter_routine
+    def retry_max_attempts(self, value: int) -> None:
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"The provided number of the retries ({value}) is invalid")
+        self._retry_max_attempts = value
+
+    @property
+    def retry_base_delay(self) -> float:
+        """The time in seconds the delay before a retry is doubled from"""
+        return self._retry_base_delay
+
+    @retry_base_delay.setter
+    @common_property_setter_routine
+    def retry_base_delay(self, value: float) -> None:
+        if value < 0:
+            raise ValueError(f"The provided base retry delay ({value}) is invalid")
+        self._retry_base_delay = value
+
+    @property
+    def retry_max_delay(self) -> float:
+        """The maximal delay in seconds before a retry"""
+        return self._retry_max_delay
+
+    @retry_max_delay.setter
+    @common_property_setter_routine
+    def retry_max_delay(self, value: float) -> None:
+        if value < 0:
+            raise ValueError(f"The provided maximal retry delay ({value}) is invalid")
+        self._retry_max_delay = value
+
+    @property
+    def circuit_breaker_threshold(self) -> int:
+        """The number of the consecutive failed requests to `remote_address`
+         after which the requests to it are stopped. 0 disables the circuit breaker"""
+        return self._circuit_breaker_threshold
+
+    @circuit_breaker_threshold.setter
+    @common_property_setter_routine
+    def circuit_breaker_threshold(self, value: int) -> None:
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"The provided circuit breaker threshold ({value}) is invalid")
+        self._circuit_breaker_threshold = value
+
+    @property
+    def circuit_breaker_reset_timeout(self) -> float:
+        """The time in seconds after which one probe request to the open circuit is let through"""
+        return self._circuit_breaker_reset_timeout
+
+    @circuit_breaker_reset_timeout.setter
+    @common_property_setter_routine
+    def circuit_breaker_reset_timeout(self, value: float) -> None:
+        if value < 0:
+            raise ValueError(f"The provided circuit breaker reset timeout ({value}) is invalid")
+        self._circuit_breaker_reset_timeout = value
+
+    @property
+    def dispatch_mode(self) -> str:
+        """How the requests are sent: by the check itself ("inline")
+         or by the worker threads not delaying the checks ("pool")"""
+        return self._dispatch_mode
+
+    @dispatch_mode.setter
+    @common_property_setter_routine
+    def dispatch_mode(self, value: str) -> None:
+        if value not in battery_handyman.constants.DISPATCH_MODE_LIST:
+            raise ValueError(f"The dispatch mode {value} is unknown")
+        self._dispatch_mode = value
+
+    @property
+    def batch_template(self) -> Optional[str]:
+        """A URL path template (starting with `/`) of the batch request with the `{commands}`
+         placeholder. `None` means the requests are sent one by one"""
+        return self._batch_template
+
+    @batch_template.setter
+    @common_property_setter_routine
+    def batch_template(self, value: Optional[str]) -> None:
+        if value is not None and not value.startswith("/"):
+            raise ValueError(f"The batch template ({value}) must start with /")
+        if value is not None and (
+                battery_handyman.constants.TEMPLATE_REGEXP.findall(value)
+                != [battery_handyman.constants.BATCH_TEMPLATE_KEY_COMMANDS]
+        ):
+            raise ValueError(
+                f"The batch template ({value}) must have the only"
+                f" {{{battery_handyman.constants.BATCH_TEMPLATE_KEY_COMMANDS}}} placeholder"
+            )
+        self._batch_template = value
+
+    @property
+    def batch_separator(self) -> str:
+        """The separator of the commands in the batch request"""
+        return self._batch_separator
+
+    @batch_separator.setter
+    @common_property_setter_routine
+    def batch_separator(self, value: str) -> None:
+        self._batch_separator = value
+
+    @property
+    def batch_window(self) -> float:
+        """The time in seconds during which the commands to `remote_address` are collected"""
+        return self._batch_window
+
+    @batch_window.setter
+    @common_property_setter_routine
+    def batch_window(self, value: float) -> None:
+        if value < 0:
+            raise ValueError(f"The provided batch window ({value}) is invalid")
+        self._batch_window = value
 
 
 yaml.add_representer(BatteryHandyman, BatteryHandyman.to_yaml, Dumper=yaml.SafeDumper)
 yaml.add_constructor(
     BatteryHandyman.YAML_TAG, BatteryHandyman.from_yaml, Loader=yaml.SafeLoader
 )
+if YAML_LOADER is not yaml.SafeLoader:
+    yaml.add_constructor(BatteryHandyman.YAML_TAG, BatteryHandyman.from_yaml, Loader=YAML_LOADER)
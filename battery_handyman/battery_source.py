@@ -0,0 +1,157 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The sources of the battery state
+
+`psutil.sensors_battery` finds the battery and opens several files on every call.
+On Linux the sysfs source does it once and only re-reads the opened files
+"""
+import logging
+import os
+import os.path
+import threading
+from typing import Dict, List, Optional
+
+import battery_handyman.constants
+import battery_handyman.util
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class BatterySource:
+    """The base class of the sources of `BatteryInfo`"""
+    def read(self) -> battery_handyman.util.BatteryInfo:
+        """Returns the current state of the battery"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Releases the resources of the source"""
+
+
+class PsutilBatterySource(BatterySource):
+    """The source using `psutil`. It is available on all the platforms supported by `psutil`"""
+    def read(self) -> battery_handyman.util.BatteryInfo:
+        return battery_handyman.util.get_battery_info()
+
+
+class SysfsBatterySource(BatterySource):
+    """The source reading the Linux sysfs attribute files opened once
+
+    The battery and the attributes are chosen the same way `psutil` does it
+    so the results are the same
+    """
+    def __init__(
+            self,
+            power_supply_dirpath: str = battery_handyman.constants.SYSFS_POWER_SUPPLY_DIRPATH
+    ):
+        battery_dirname_list = sorted(
+            dirname for dirname in os.listdir(power_supply_dirpath)
+            if dirname.startswith("BAT") or "battery" in dirname.lower()
+        )
+        if not battery_dirname_list:
+            raise FileNotFoundError(f"No battery is found in {power_supply_dirpath}")
+        battery_dirpath = os.path.join(power_supply_dirpath, battery_dirname_list[0])
+
+        self._fd_list: List[int] = []
+        self._energy_now_fd = self._open_first(battery_dirpath, "energy_now", "charge_now")
+        self._energy_full_fd = self._open_first(battery_dirpath, "energy_full", "charge_full")
+        self._capacity_fd = None
+        if self._energy_now_fd is None or self._energy_full_fd is None:
+            self._capacity_fd = self._open_first(battery_dirpath, "capacity")
+            if self._capacity_fd is None:
+                self.close()
+                raise FileNotFoundError(f"No charge level is found in {battery_dirpath}")
+
+        self._online_fd = self._open_first(power_supply_dirpath, "AC0/online", "AC/online")
+        self._status_fd = None
+        if self._online_fd is None:
+            self._status_fd = self._open_first(battery_dirpath, "status")
+        logger.debug("The battery in %s is used", battery_dirpath)
+
+    def _open_first(self, dirpath: str, *relative_path_list: str) -> Optional[int]:
+        """Opens the first existing file and returns its descriptor"""
+        for relative_path in relative_path_list:
+            try:
+                fd = os.open(os.path.join(dirpath, relative_path), os.O_RDONLY)
+            except OSError:
+                continue
+            self._fd_list.append(fd)
+            return fd
+        return None
+
+    @staticmethod
+    def _read_attribute(fd: int) -> bytes:
+        # A read from the beginning makes sysfs provide the actual value
+        return os.pread(fd, battery_handyman.constants.SYSFS_ATTRIBUTE_SIZE_MAX, 0).strip()
+
+    def read(self) -> battery_handyman.util.BatteryInfo:
+        if self._capacity_fd is None:
+            energy_now = int(self._read_attribute(self._energy_now_fd))
+            energy_full = int(self._read_attribute(self._energy_full_fd))
+            left_in_percents = 100.0 * energy_now / energy_full if energy_full else 0.0
+        else:
+            left_in_percents = int(self._read_attribute(self._capacity_fd))
+
+        is_charging = None
+        if self._online_fd is not None:
+            is_charging = self._read_attribute(self._online_fd) == b"1"
+        elif self._status_fd is not None:
+            status = self._read_attribute(self._status_fd).lower()
+            if status == b"discharging":
+                is_charging = False
+            elif status in (b"charging", b"full"):
+                is_charging = True
+
+        return battery_handyman.util.BatteryInfo(
+            is_charging=is_charging,
+            left_in_percents=left_in_percents,
+        )
+
+    def close(self) -> None:
+        for fd in self._fd_list:
+            os.close(fd)
+        self._fd_list.clear()
+
+
+def create_battery_source(battery_source_name: str) -> BatterySource:
+    """Creates the source by its name
+
+    "auto" means the sysfs source where it is available and the `psutil` source otherwise
+    """
+    if battery_source_name == battery_handyman.constants.BATTERY_SOURCE_PSUTIL:
+        return PsutilBatterySource()
+    if battery_source_name == battery_handyman.constants.BATTERY_SOURCE_SYSFS:
+        return SysfsBatterySource()
+    if battery_source_name == battery_handyman.constants.BATTERY_SOURCE_AUTO:
+        if hasattr(os, "pread"):
+            try:
+                return SysfsBatterySource()
+            except OSError as exception_instance:
+                logger.debug("The sysfs battery source is not available: %s", exception_instance)
+        return PsutilBatterySource()
+    raise ValueError(f"The battery source ({battery_source_name}) is unknown")
+
+
+_battery_source_mapping: Dict[str, BatterySource] = {}
+_battery_source_mapping_lock = threading.Lock()
+
+
+def get_battery_source(battery_source_name: str) -> BatterySource:
+    """Returns the source by its name. The source is shared by all the instances in the process"""
+    with _battery_source_mapping_lock:
+        battery_source = _battery_source_mapping.get(battery_source_name)
+        if battery_source is None:
+            battery_source = create_battery_source(battery_source_name)
+            _battery_source_mapping[battery_source_name] = battery_source
+        return battery_source
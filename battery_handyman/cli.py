@@ -14,6 +14,8 @@
 """The setup of the CLI arguments parsing"""
 import argparse
 
+import battery_handyman.constants
+
 
 def setup_parser() -> argparse.ArgumentParser:
     """Return the parser of the CLI arguments"""
@@ -31,4 +33,77 @@ def setup_parser() -> argparse.ArgumentParser:
             " relative to the \"configuration\" directory"
         )
     )
+    parser.add_argument(
+        "-f", "--fleet-path", action="append", help=(
+            "The path to the configuration YAML file or the directory with such files"
+            " relative to the \"configuration\" directory."
+            " It can be provided several times."
+            " All the configurations are run in this process and \"--config-path\" is ignored"
+        )
+    )
+    parser.add_argument(
+        "-e", "--engine", default=battery_handyman.constants.ENGINE_SCHED,
+        choices=battery_handyman.constants.ENGINE_LIST, help=(
+            "The engine running the check cycle."
+            f" \"{battery_handyman.constants.ENGINE_ASYNCIO}\" does not let a slow remote device"
+            " delay the checks of the other configurations in the fleet mode"
+        )
+    )
+    parser.add_argument(
+        "-m", "--metrics-address", help=(
+            "The \"HOST:PORT\" or \"PORT\" to serve the metrics on"
+            " in the Prometheus text format (the host is"
+            f" {battery_handyman.constants.METRICS_HOST_DEFAULT} by default)"
+        )
+    )
+    parser.add_argument(
+        "--control-socket", help=(
+            "The path to the Unix domain socket to query and tune the running process by"
+            " (see \"python -m battery_handyman.control --help\")"
+        )
+    )
+    parser.add_argument(
+        "--log-level", default=battery_handyman.constants.LOG_LEVEL_DEFAULT,
+        choices=battery_handyman.constants.LOG_LEVEL_LIST, help=(
+            "The minimal level of the written log records"
+        )
+    )
+    parser.add_argument(
+        "--log-format", default=battery_handyman.constants.LOG_FORMAT_TEXT,
+        choices=battery_handyman.constants.LOG_FORMAT_LIST, help=(
+            f"\"{battery_handyman.constants.LOG_FORMAT_JSON}\" writes a JSON object per line"
+            " with the structured decision and request events"
+        )
+    )
+    parser.add_argument(
+        "--log-file", help=(
+            "The path to the file to append the log to (the standard error by default)"
+        )
+    )
+    parser.add_argument(
+        "--log-queue", action="store_true", help=(
+            "Write the log by a background thread, so the slow disks do not delay the checks"
+        )
+    )
+    parser.add_argument(
+        "--log-rate-limit", type=int, default=0, help=(
+            "The maximal number of the records with the same message per"
+            f" {battery_handyman.constants.LOG_RATE_LIMIT_PERIOD_IN_SECONDS} seconds,"
+            " the rest are suppressed. 0 disables the limit"
+        )
+    )
+    parser.add_argument(
+        "--config-cache-path", nargs="?", const="", help=(
+            "Cache the parsed configuration files in the provided path"
+            " (\"battery_handyman/configuration_cache.marshal\""
+            " in the user cache directory without the value)."
+            " The files are parsed without the cache by default"
+        )
+    )
+    parser.add_argument(
+        "--validate", action="store_true", help=(
+            "Only load the configuration(s) and report whether they are valid."
+            " Neither the battery nor the remote devices are accessed"
+        )
+    )
     return parser
@@ -0,0 +1,133 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The cache of the parsed configuration files
+
+The YAML parsing is the most of the configuration loading time.
+The cache keeps the configuration dictionaries in the `marshal` format
+in the single file, so a restart of a large fleet reads one file
+instead of parsing every configuration file.
+An entry is valid while the modification time and the size of its file are the same
+"""
+import logging
+import marshal
+import os
+import os.path
+import sys
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+import battery_handyman.constants
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def get_default_cache_filepath() -> str:
+    """Returns the path in the user cache directory (`XDG_CACHE_HOME` is respected)"""
+    cache_dirpath = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(
+        cache_dirpath, "battery_handyman", battery_handyman.constants.CONFIG_CACHE_FILENAME
+    )
+
+
+def get_file_signature(filepath: str) -> Tuple[str, int, int]:
+    """Returns the cache key of the file: its real path, modification time and size"""
+    stat_result = os.stat(filepath)
+    return os.path.realpath(filepath), stat_result.st_mtime_ns, stat_result.st_size
+
+
+class ConfigurationCache:
+    """The configuration dictionaries keyed by the file signature
+
+    The cache file is read on the first access and written by `save`
+    only if an entry has been added.
+    A missing, corrupted or outdated cache file is treated as the empty cache
+    """
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._entry_mapping: Optional[Dict[str, Tuple[int, int, Any]]] = None
+        self._is_changed = False
+
+    def __len__(self) -> int:
+        return len(self._get_entry_mapping())
+
+    @staticmethod
+    def get_header() -> Tuple[int, Tuple[int, int]]:
+        """The header of the cache file.
+         The `marshal` format depends on the Python version"""
+        return battery_handyman.constants.CONFIG_CACHE_FORMAT_VERSION, sys.version_info[:2]
+
+    def get(self, signature: Tuple[str, int, int]) -> Optional[Any]:
+        """Returns the cached configuration dictionary or `None` if it is absent or outdated"""
+        filepath, mtime_ns, size = signature
+        entry = self._get_entry_mapping().get(filepath)
+        if entry is None or entry[0] != mtime_ns or entry[1] != size:
+            return None
+        return entry[2]
+
+    def put(self, signature: Tuple[str, int, int], config_dict_mapping: Any) -> None:
+        """Adds the configuration dictionary.
+         The values `marshal` does not support are not cached"""
+        try:
+            marshal.dumps(config_dict_mapping)
+        except ValueError:
+            logger.debug("%s has the values that cannot be cached", signature[0])
+            return
+        filepath, mtime_ns, size = signature
+        self._get_entry_mapping()[filepath] = (mtime_ns, size, config_dict_mapping)
+        self._is_changed = True
+
+    def save(self) -> None:
+        """Writes the cache file atomically if there are new entries.
+         A failure is logged only since the cache is optional"""
+        if not self._is_changed:
+            return
+        try:
+            cache_dirpath = os.path.dirname(self.filepath) or "."
+            os.makedirs(cache_dirpath, exist_ok=True)
+            file_descriptor, temporary_filepath = tempfile.mkstemp(
+                dir=cache_dirpath, prefix=".battery_handyman", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(file_descriptor, mode='wb') as cache_file:
+                    marshal.dump((self.get_header(), self._entry_mapping), cache_file)
+                os.replace(temporary_filepath, self.filepath)
+            except BaseException:
+                os.unlink(temporary_filepath)
+                raise
+        except OSError as exception_instance:
+            logger.warning("The configuration cache is not saved: %s", exception_instance)
+            return
+        self._is_changed = False
+
+    def _get_entry_mapping(self) -> Dict[str, Tuple[int, int, Any]]:
+        if self._entry_mapping is None:
+            self._entry_mapping = self._read()
+        return self._entry_mapping
+
+    def _read(self) -> Dict[str, Tuple[int, int, Any]]:
+        try:
+            with open(self.filepath, mode='rb') as cache_file:
+                header, entry_mapping = marshal.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, EOFError, ValueError, TypeError) as exception_instance:
+            logger.warning("The configuration cache is ignored: %s", exception_instance)
+            return {}
+        if header != self.get_header() or not isinstance(entry_mapping, dict):
+            logger.debug("The configuration cache of another version is ignored")
+            return {}
+        return entry_mapping
@@ -0,0 +1,351 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The watchers of the configuration files
+
+A running instance reloads its configuration file after the file is changed.
+On Linux the changes are reported by inotify, on the other platforms
+the modification time and the size of the files are polled
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import errno
+import logging
+import os
+import os.path
+import select
+import struct
+import sys
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+import battery_handyman.config_cache
+import battery_handyman.constants
+
+if TYPE_CHECKING:  # `ctypes` is imported only when inotify is going to be used
+    import ctypes
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# wd, mask, cookie, len. The name of `len` bytes follows
+INOTIFY_EVENT_STRUCT = struct.Struct("iIII")
+
+
+class ConfigFileWatcher:
+    """The base class of the watchers. The subscribers are called from the thread of the watcher
+
+    The paths are compared after resolving the symbolic links
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callback_list_mapping: Dict[str, List[Callable[[], None]]] = {}
+
+    def subscribe(self, filepath: str, callback: Callable[[], None]) -> None:
+        """Starts calling `callback` after every change of the file.
+         The first subscription starts the watcher"""
+        filepath = os.path.realpath(filepath)
+        with self._lock:
+            if not self._callback_list_mapping:
+                self.start()
+            if filepath not in self._callback_list_mapping:
+                try:
+                    self.watch(filepath)
+                except OSError:
+                    if not self._callback_list_mapping:
+                        self.stop()
+                    raise
+                self._callback_list_mapping[filepath] = []
+            self._callback_list_mapping[filepath].append(callback)
+
+    def unsubscribe(self, filepath: str, callback: Callable[[], None]) -> None:
+        """Stops calling `callback`. The last unsubscription stops the watcher"""
+        filepath = os.path.realpath(filepath)
+        with self._lock:
+            callback_list = self._callback_list_mapping.get(filepath, [])
+            if callback not in callback_list:
+                return
+            callback_list.remove(callback)
+            if not callback_list:
+                del self._callback_list_mapping[filepath]
+                self.unwatch(filepath)
+            if not self._callback_list_mapping:
+                self.stop()
+
+    def notify(self, filepath_list: Iterable[str]) -> None:
+        """Calls the subscribers of the changed files.
+         A failed subscriber does not affect the others"""
+        with self._lock:
+            callback_list = [
+                callback
+                for filepath in filepath_list
+                for callback in self._callback_list_mapping.get(filepath, [])
+            ]
+        for callback in callback_list:
+            try:
+                callback()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("The configuration file subscriber has failed")
+
+    def start(self) -> None:
+        """Starts watching. It is called under the lock"""
+
+    def stop(self) -> None:
+        """Stops watching. It is called under the lock"""
+
+    def watch(self, filepath: str) -> None:
+        """Starts watching the file. It is called under the lock"""
+
+    def unwatch(self, filepath: str) -> None:
+        """Stops watching the file. It is called under the lock"""
+
+
+class FakeConfigFileWatcher(ConfigFileWatcher):
+    """The watcher whose changes are triggered manually. It is intended for the tests"""
+    def trigger(self, filepath: str) -> None:
+        """Emulates a change of the file"""
+        self.notify([os.path.realpath(filepath)])
+
+
+def get_file_signature_if_exists(filepath: str) -> Optional[Tuple[str, int, int]]:
+    """Returns the signature of the file or `None` if it is absent now"""
+    try:
+        return battery_handyman.config_cache.get_file_signature(filepath)
+    except OSError:
+        return None
+
+
+class PollingConfigFileWatcher(ConfigFileWatcher):
+    """The watcher comparing the modification time and the size of the files periodically
+
+    A file being replaced (absent at the moment) is reported after it appears again
+    """
+    def __init__(
+            self,
+            poll_interval: float = battery_handyman.constants.CONFIG_WATCH_POLL_INTERVAL_IN_SECONDS
+    ):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self._signature_mapping: Dict[str, Optional[Tuple[str, int, int]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        # A new event per thread, the stopped thread may still be finishing
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._poll_periodically, args=(self._stop_event, ),
+            name="battery_handyman_config_polling", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        # The thread is not joined since it may be waiting for the lock held by the caller
+        self._thread = None
+
+    def watch(self, filepath: str) -> None:
+        self._signature_mapping[filepath] = get_file_signature_if_exists(filepath)
+
+    def unwatch(self, filepath: str) -> None:
+        self._signature_mapping.pop(filepath, None)
+
+    def poll(self) -> None:
+        """Notifies about the files changed since the previous poll"""
+        with self._lock:
+            filepath_list = list(self._signature_mapping)
+        changed_filepath_list = []
+        for filepath in filepath_list:
+            signature = get_file_signature_if_exists(filepath)
+            with self._lock:
+                if filepath not in self._signature_mapping:
+                    continue
+                previous_signature = self._signature_mapping[filepath]
+                self._signature_mapping[filepath] = signature
+            if signature is not None and signature != previous_signature:
+                changed_filepath_list.append(filepath)
+        if changed_filepath_list:
+            self.notify(changed_filepath_list)
+
+    def _poll_periodically(self, stop_event: threading.Event) -> None:
+        while not stop_event.wait(self.poll_interval):
+            self.poll()
+
+
+def load_inotify_functions() -> Optional[ctypes.CDLL]:
+    """Returns the C library providing inotify or `None` if it is unavailable"""
+    if not sys.platform.startswith("linux"):
+        return None
+    # pylint: disable=import-outside-toplevel,redefined-outer-name
+    import ctypes
+    try:
+        # The symbols of the running process include the C library
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+def get_last_os_error(*args) -> OSError:
+    """Returns the error of the last failed call of the C library function"""
+    import ctypes  # pylint: disable=import-outside-toplevel,redefined-outer-name
+    error_number = ctypes.get_errno()
+    return OSError(error_number, os.strerror(error_number), *args)
+
+
+def parse_inotify_events(data: bytes) -> List[Tuple[int, int, bytes]]:
+    """Splits the data read from the inotify descriptor into (wd, mask, name) tuples"""
+    event_list = []
+    offset = 0
+    while offset + INOTIFY_EVENT_STRUCT.size <= len(data):
+        watch_descriptor, mask, _, name_size = INOTIFY_EVENT_STRUCT.unpack_from(data, offset)
+        offset += INOTIFY_EVENT_STRUCT.size
+        name = data[offset:offset + name_size].rstrip(b"\0")
+        offset += name_size
+        event_list.append((watch_descriptor, mask, name))
+    return event_list
+
+
+class InotifyConfigFileWatcher(ConfigFileWatcher):
+    """The watcher receiving the changes from the Linux kernel via inotify
+
+    The directories of the files are watched since many editors
+    replace the file by renaming a new one over it
+    """
+    def __init__(self, libc: ctypes.CDLL):
+        super().__init__()
+        self._libc = libc
+        self._inotify_descriptor: Optional[int] = None
+        # The directory watch descriptor and the number of the watched files in it
+        self._directory_watch_mapping: Dict[str, List[int]] = {}
+        self._watch_directory_mapping: Dict[int, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        # The write end of the stop pipe of the running thread
+        self._stop_write_descriptor: Optional[int] = None
+
+    def start(self) -> None:
+        inotify_descriptor = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if inotify_descriptor < 0:
+            raise get_last_os_error()
+        try:
+            # A new pipe per thread, the stopped thread may still be finishing
+            stop_read_descriptor, self._stop_write_descriptor = os.pipe()
+        except OSError:
+            os.close(inotify_descriptor)
+            raise
+        self._inotify_descriptor = inotify_descriptor
+        self._thread = threading.Thread(
+            target=self._receive_events, args=(inotify_descriptor, stop_read_descriptor),
+            name="battery_handyman_inotify", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._stop_write_descriptor is not None:
+            # The read end becomes readable (the end of the file) and wakes the thread up
+            os.close(self._stop_write_descriptor)
+            self._stop_write_descriptor = None
+        # The descriptors are closed by the thread, it is not joined
+        # since it may be waiting for the lock held by the caller
+        self._inotify_descriptor = None
+        self._thread = None
+        self._directory_watch_mapping.clear()
+        self._watch_directory_mapping.clear()
+
+    def watch(self, filepath: str) -> None:
+        dirpath = os.path.dirname(filepath)
+        directory_watch = self._directory_watch_mapping.get(dirpath)
+        if directory_watch is not None:
+            directory_watch[1] += 1
+            return
+        watch_descriptor = self._libc.inotify_add_watch(
+            self._inotify_descriptor, os.fsencode(dirpath),
+            battery_handyman.constants.INOTIFY_IN_CLOSE_WRITE
+            | battery_handyman.constants.INOTIFY_IN_MOVED_TO,
+        )
+        if watch_descriptor < 0:
+            raise get_last_os_error(dirpath)
+        self._directory_watch_mapping[dirpath] = [watch_descriptor, 1]
+        self._watch_directory_mapping[watch_descriptor] = dirpath
+
+    def unwatch(self, filepath: str) -> None:
+        dirpath = os.path.dirname(filepath)
+        directory_watch = self._directory_watch_mapping.get(dirpath)
+        if directory_watch is None:
+            return
+        directory_watch[1] -= 1
+        if directory_watch[1] > 0:
+            return
+        del self._directory_watch_mapping[dirpath]
+        del self._watch_directory_mapping[directory_watch[0]]
+        self._libc.inotify_rm_watch(self._inotify_descriptor, directory_watch[0])
+
+    def _receive_events(self, inotify_descriptor: int, stop_read_descriptor: int) -> None:
+        try:
+            while True:
+                # Without a timeout, the idle watcher does not wake the thread up
+                readable_list, _, _ = select.select(
+                    [inotify_descriptor, stop_read_descriptor], [], []
+                )
+                if stop_read_descriptor in readable_list:
+                    return
+                try:
+                    data = os.read(
+                        inotify_descriptor, battery_handyman.constants.INOTIFY_EVENT_BUFFER_SIZE
+                    )
+                except OSError as exception_instance:
+                    if exception_instance.errno == errno.EAGAIN:
+                        continue
+                    logger.error(
+                        "Reading of the inotify events has failed: %s", exception_instance
+                    )
+                    return
+                changed_filepath_list = []
+                with self._lock:
+                    for watch_descriptor, _, name in parse_inotify_events(data):
+                        dirpath = self._watch_directory_mapping.get(watch_descriptor)
+                        if dirpath is None or not name:
+                            continue
+                        filepath = os.path.join(dirpath, os.fsdecode(name))
+                        if (
+                                filepath in self._callback_list_mapping
+                                and filepath not in changed_filepath_list
+                        ):
+                            changed_filepath_list.append(filepath)
+                if changed_filepath_list:
+                    self.notify(changed_filepath_list)
+        finally:
+            os.close(inotify_descriptor)
+            os.close(stop_read_descriptor)
+
+
+_config_file_watcher: Optional[ConfigFileWatcher] = None
+
+
+def get_config_file_watcher() -> ConfigFileWatcher:
+    """Returns the watcher shared by all the instances in the process
+
+    It uses inotify if it is available and polls the files otherwise
+    """
+    global _config_file_watcher  # pylint: disable=global-statement,invalid-name
+    if _config_file_watcher is None:
+        libc = load_inotify_functions()
+        if libc is not None:
+            _config_file_watcher = InotifyConfigFileWatcher(libc)
+        else:
+            _config_file_watcher = PollingConfigFileWatcher()
+    return _config_file_watcher
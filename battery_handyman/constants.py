@@ -21,19 +21,175 @@ TEMPLATE_REGEXP = re.compile(r"\{([^}]+)\}")
 BATTERY_INFO_KEY_IS_CHARGING = "is_charging"
 BATTERY_INFO_KEY_LEFT_INPERCENTS = "left_in_percents"
 
+BATTERY_SOURCE_AUTO = "auto"
+BATTERY_SOURCE_PSUTIL = "psutil"
+BATTERY_SOURCE_SYSFS = "sysfs"
+BATTERY_SOURCE_DEFAULT = BATTERY_SOURCE_AUTO
+BATTERY_SOURCE_LIST = [BATTERY_SOURCE_AUTO, BATTERY_SOURCE_PSUTIL, BATTERY_SOURCE_SYSFS, ]
+SYSFS_POWER_SUPPLY_DIRPATH = "/sys/class/power_supply"
+# In bytes
+SYSFS_ATTRIBUTE_SIZE_MAX = 64
+
 BATTERY_LIMIT_VALUE_MINIMAL = 0
 BATTERY_LIMIT_VALUE_MAXIMAL = 100
 BATTERY_LIMIT_VALUE_DEFAULT_CHARGED = 90
 BATTERY_LIMIT_VALUE_DEFAULT_LOW = 40
 CHECK_INTERVAL_IN_SECONDS_DEFAULT = 1
+CHECK_INTERVAL_MAX_IN_SECONDS_DEFAULT = 600
+# The alignment of the check deadlines to the shared ticks is disabled
+CHECK_TICK_IN_SECONDS_DEFAULT = 0
+ADAPTIVE_HISTORY_SIZE = 8
+# The next check is performed after this part of the predicted time to the limit
+ADAPTIVE_TIME_TO_LIMIT_FRACTION = 0.5
+# The defaults disable the filters of the battery readings
+BATTERY_FILTER_MEDIAN_SIZE_DEFAULT = 1
+BATTERY_FILTER_EWMA_ALPHA_DEFAULT = 1
+BATTERY_FILTER_MIN_DWELL_TIME_IN_SECONDS_DEFAULT = 0
 
 CONFIG_NAME_BATTERY_LIMIT = "battery_limit_config"
 CONFIG_NAME_CHECK = "check_config"
 CONFIG_NAME_REMOTE_REQUEST = "remote_request_config"
+CONFIG_NAME_BATTERY_FILTER = "battery_filter_config"
+
+CONNECTION_POOL_SIZE_DEFAULT = 1
+CONNECTION_IDLE_TIMEOUT_IN_SECONDS_DEFAULT = 60
+
+COMMAND_CONFIRM_TIMEOUT_IN_SECONDS_DEFAULT = 0
+
+CONNECT_TIMEOUT_IN_SECONDS_DEFAULT = 5
+READ_TIMEOUT_IN_SECONDS_DEFAULT = 10
+
+# 0 disables the retries
+RETRY_MAX_ATTEMPTS_DEFAULT = 0
+RETRY_BASE_DELAY_IN_SECONDS_DEFAULT = 1
+RETRY_MAX_DELAY_IN_SECONDS_DEFAULT = 60
+# Too Many Requests and the server errors
+RETRY_STATUS_CODE_LIST = [429, ]
+RETRY_STATUS_CODE_SERVER_ERROR_MIN = 500
+# 0 disables the circuit breaker
+CIRCUIT_BREAKER_THRESHOLD_DEFAULT = 0
+CIRCUIT_BREAKER_RESET_TIMEOUT_IN_SECONDS_DEFAULT = 30
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half-open"
+
+DISPATCH_MODE_INLINE = "inline"
+DISPATCH_MODE_POOL = "pool"
+DISPATCH_MODE_LIST = [DISPATCH_MODE_INLINE, DISPATCH_MODE_POOL, ]
+DISPATCH_MODE_DEFAULT = DISPATCH_MODE_INLINE
+DISPATCH_WORKER_COUNT_DEFAULT = 4
+# The maximal number of the not started requests
+DISPATCH_QUEUE_SIZE_DEFAULT = 64
+# The threads running the additional reactions of the checks
+REACTION_WORKER_COUNT_MAX = 8
+
+# The placeholder of the joined commands in the batch template
+BATCH_TEMPLATE_KEY_COMMANDS = "commands"
+BATCH_SEPARATOR_DEFAULT = ";"
+BATCH_WINDOW_IN_SECONDS_DEFAULT = 0.2
+
+# The outcomes of the checks
+DECISION_KEEP = 0
+DECISION_SENT = 1
+DECISION_DUPLICATE = 2
+DECISION_FAILED = 3
+# The request is passed to the worker threads
+DECISION_DISPATCHED = 4
+# The circuit breaker of the remote device does not let the request through
+DECISION_BLOCKED = 5
+DECISION_NAME_LIST = ["keep", "sent", "duplicate", "failed", "dispatched", "blocked", ]
+
+# The stages of the check reported to the stage hooks
+STAGE_READ = "read"
+STAGE_PREPARE = "prepare"
+STAGE_DELIVER = "deliver"
+STAGE_RECORD = "record"
+STAGE_CHECK = "check"
+# The whole additional reaction, it is reported with the reaction as the instance
+STAGE_REACTION = "reaction"
+
+HISTORY_FILE_MAGIC = b"BHHIST01"
+# The stored charging state of the sources that cannot tell it (e.g. "Not charging" status)
+HISTORY_IS_CHARGING_UNKNOWN = 2
+# A week of the checks performed every minute
+HISTORY_SIZE_DEFAULT = 10080
+
+CONTROL_COMMAND_STATUS = "status"
+CONTROL_COMMAND_SET = "set"
+CONTROL_COMMAND_CHECK = "check"
+CONTROL_COMMAND_METRICS = "metrics"
+CONTROL_COMMAND_LIST = [
+    CONTROL_COMMAND_STATUS, CONTROL_COMMAND_SET, CONTROL_COMMAND_CHECK, CONTROL_COMMAND_METRICS,
+]
+# The properties that can be changed by the control socket while the checks run
+CONTROL_PROPERTY_NAME_LIST = [
+    "battery_limit_charged", "battery_limit_low",
+    "check_interval", "adaptive_check_interval", "check_interval_max",
+    "command_confirm_timeout", "connect_timeout", "read_timeout",
+    "retry_max_attempts", "retry_base_delay", "retry_max_delay",
+]
+# In bytes, a request is a JSON line
+CONTROL_REQUEST_SIZE_MAX = 65536
+CONTROL_CLIENT_TIMEOUT_IN_SECONDS = 5
+# The waiting for the check cycle to apply the values, shorter than the client timeout
+CONTROL_CALL_TIMEOUT_IN_SECONDS = 4
+
+METRICS_HOST_DEFAULT = "127.0.0.1"
+# In seconds
+METRICS_LATENCY_BUCKET_LIST = [
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+]
+
+NETLINK_KOBJECT_UEVENT = 15
+NETLINK_KOBJECT_UEVENT_GROUP_KERNEL = 1
+# In bytes
+NETLINK_MESSAGE_SIZE_MAX = 16384
+
+# The stat polling is used where inotify is unavailable
+CONFIG_WATCH_POLL_INTERVAL_IN_SECONDS = 2
+INOTIFY_IN_CLOSE_WRITE = 0x00000008
+INOTIFY_IN_MOVED_TO = 0x00000080
+# In bytes, enough for many events with the names of the maximal length
+INOTIFY_EVENT_BUFFER_SIZE = 65536
+
+ENGINE_SCHED = "sched"
+ENGINE_ASYNCIO = "asyncio"
+ENGINE_LIST = [ENGINE_SCHED, ENGINE_ASYNCIO, ]
+# The time the checks are run by `main` in the testing mode
+TESTING_RUN_DURATION_IN_SECONDS = 2.5
+
+CONFIGURATION_FILE_EXTENSION_LIST = [".yml", ".yaml", ]
+CONFIG_CACHE_FILENAME = "configuration_cache.marshal"
+# Increase it if the cached configuration dictionaries become incompatible
+CONFIG_CACHE_FORMAT_VERSION = 1
+
+LOG_LEVEL_LIST = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL", ]
+LOG_LEVEL_DEFAULT = "WARNING"
+LOG_FORMAT_TEXT = "text"
+LOG_FORMAT_JSON = "json"
+LOG_FORMAT_LIST = [LOG_FORMAT_TEXT, LOG_FORMAT_JSON, ]
+LOG_TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# The period the rate limit of the same messages is counted over
+LOG_RATE_LIMIT_PERIOD_IN_SECONDS = 60
+# The attributes of the log record carrying the structured event and its data
+LOG_RECORD_ATTR_EVENT = "event"
+LOG_RECORD_ATTR_EVENT_DATA = "event_data"
+LOG_EVENT_REQUEST = "request"
+LOG_EVENT_RESPONSE = "response"
+LOG_EVENT_DECISION = "decision"
 
 MSG_CHARGING_MUST_NOT_TO_BE_TOOGLED = "Charging must not to be toogled"
 
 RESPONSE_STATUS_CODE_SUCCESS_MAX = 399
 
 REQUEST_DATA_KEY_NEEDS_CHARGING = "needs_charging"
-REQUEST_DATA_VALID_KEY_LIST = [REQUEST_DATA_KEY_NEEDS_CHARGING, ]
+REQUEST_DATA_KEY_LEFT_IN_PERCENTS = "left_in_percents"
+REQUEST_DATA_KEY_IS_CHARGING = "is_charging"
+REQUEST_DATA_KEY_SECONDS_LEFT = "seconds_left"
+# The built-in fields, see `battery_handyman.template_fields`
+REQUEST_DATA_VALID_KEY_LIST = [
+    REQUEST_DATA_KEY_NEEDS_CHARGING, REQUEST_DATA_KEY_LEFT_IN_PERCENTS,
+    REQUEST_DATA_KEY_IS_CHARGING, REQUEST_DATA_KEY_SECONDS_LEFT,
+]
+# The same as `psutil.POWER_TIME_UNKNOWN`
+REQUEST_DATA_SECONDS_LEFT_UNKNOWN = -1
@@ -0,0 +1,363 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The local control socket of the running process and its client
+
+Every request and every response is a JSON object on a single line.
+A request has the "command" (see `CONTROL_COMMAND_LIST`) and optionally the "instance"
+(the index of the configuration in the fleet, all of them by default).
+"set" takes the "values" mapping of `CONTROL_PROPERTY_NAME_LIST` properties.
+A response has "ok" and the "result" or the "error"
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import argparse
+import concurrent.futures
+import functools
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import battery_handyman.constants
+
+if TYPE_CHECKING:  # The class module is imported by the server only, not by the client
+    from battery_handyman.battery_handyman_class import BatteryHandyman
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def get_instance_status(index: int, instance: BatteryHandyman) -> Dict[str, Any]:
+    """Returns the last check results and the control properties of the instance"""
+    decision_name_list = battery_handyman.constants.DECISION_NAME_LIST
+    last_battery_info = instance.last_battery_info
+    return {
+        "instance": index,
+        "configuration_filepath": instance.configuration_filepath,
+        "remote_address": instance.remote_address,
+        "last_check_time": instance.last_check_time,
+        "last_battery_info": None if last_battery_info is None else last_battery_info._asdict(),
+        "last_decision": (
+            None if instance.last_decision is None else decision_name_list[instance.last_decision]
+        ),
+        "reactions": [
+            {
+                "remote_address": reaction.remote_address,
+                "last_decision": (
+                    None if reaction.last_decision is None
+                    else decision_name_list[reaction.last_decision]
+                ),
+            }
+            for reaction in instance.reactions
+        ],
+        "properties": {
+            name: getattr(instance, name)
+            for name in battery_handyman.constants.CONTROL_PROPERTY_NAME_LIST
+        },
+    }
+
+
+def check_property_values(
+        instance_list: Sequence[BatteryHandyman], value_mapping: Dict[str, Any]
+) -> None:
+    """Raises `ValueError` if a property cannot be set by the control socket
+     or its value does not have the type of the current one"""
+    for name, value in value_mapping.items():
+        if name not in battery_handyman.constants.CONTROL_PROPERTY_NAME_LIST:
+            raise ValueError(f"The property {name} cannot be set by the control socket")
+        for instance in instance_list:
+            current_value = getattr(instance, name)
+            if isinstance(current_value, bool):
+                is_type_valid = isinstance(value, bool)
+            else:
+                is_type_valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if not is_type_valid:
+                raise ValueError(f"The value {value!r} of {name} has the wrong type")
+
+
+def replace_property_values(
+        instance: BatteryHandyman, value_mapping: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Sets the properties of the instance and returns their previous values.
+     If a property cannot be set, the already set ones are restored"""
+    previous_value_mapping: Dict[str, Any] = {}
+    try:
+        for name, value in value_mapping.items():
+            previous_value = getattr(instance, name)
+            setattr(instance, name, value)
+            previous_value_mapping[name] = previous_value
+    except (TypeError, ValueError):
+        for name, previous_value in reversed(list(previous_value_mapping.items())):
+            setattr(instance, name, previous_value)
+        raise
+    return previous_value_mapping
+
+
+def set_instance_properties(
+        instance_list: Sequence[BatteryHandyman], value_mapping: Dict[str, Any]
+) -> None:
+    """Sets the control properties of the instances and requests the immediate checks,
+     so the new settings act without a delay
+
+    The value must have the type of the current one. The properties are set
+    between the checks of every instance (see `BatteryHandyman.call_between_checks`)
+    for all the instances or for none of them: if a property cannot be set,
+    the already changed instances are restored and `ValueError` is raised
+    """
+    check_property_values(instance_list, value_mapping)
+    previous_value_list = []
+    try:
+        for instance in instance_list:
+            future = instance.call_between_checks(
+                functools.partial(replace_property_values, instance, value_mapping)
+            )
+            try:
+                previous_value_mapping = future.result(
+                    battery_handyman.constants.CONTROL_CALL_TIMEOUT_IN_SECONDS
+                )
+            except concurrent.futures.TimeoutError:
+                # The values are not set later if they are not being set now
+                if not future.cancel():
+                    previous_value_mapping = future.result()
+                    previous_value_list.append((instance, previous_value_mapping))
+                raise
+            previous_value_list.append((instance, previous_value_mapping))
+    except (TypeError, ValueError, concurrent.futures.TimeoutError) as exception_instance:
+        for instance, previous_value_mapping in reversed(previous_value_list):
+            instance.call_between_checks(
+                functools.partial(replace_property_values, instance, previous_value_mapping)
+            ).result(battery_handyman.constants.CONTROL_CALL_TIMEOUT_IN_SECONDS)
+        if isinstance(exception_instance, concurrent.futures.TimeoutError):
+            raise ValueError("The check cycle has not applied the values in time") from None
+        raise
+    for instance in instance_list:
+        instance.request_immediate_check()
+
+
+class ControlServer:
+    """Serves the control requests to the instances on the Unix domain socket
+
+    The socket file is accessible by the owner only. The stale file of a finished process
+    is replaced, the socket of a running one is not
+    """
+    def __init__(self, socket_path: str, instances: Sequence[BatteryHandyman]):
+        self.socket_path = socket_path
+        self.instances = list(instances)
+        self._server_socket: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def handle_request(self, request: Any) -> Any:
+        """Performs the request and returns its result. Raises `ValueError` for a bad request"""
+        if not isinstance(request, dict):
+            raise ValueError("The request must be a JSON object")
+        command = request.get("command")
+        if command not in battery_handyman.constants.CONTROL_COMMAND_LIST:
+            raise ValueError(f"The command {command!r} is unknown")
+        if command == battery_handyman.constants.CONTROL_COMMAND_METRICS:
+            # pylint: disable=import-outside-toplevel
+            from battery_handyman.metrics import REGISTRY
+            return REGISTRY.render()
+
+        index_list = list(range(len(self.instances)))
+        index = request.get("instance")
+        if index is not None:
+            if not isinstance(index, int) or not 0 <= index < len(self.instances):
+                raise ValueError(f"The instance {index!r} is not found")
+            index_list = [index]
+        if command == battery_handyman.constants.CONTROL_COMMAND_STATUS:
+            return [get_instance_status(index, self.instances[index]) for index in index_list]
+        if command == battery_handyman.constants.CONTROL_COMMAND_SET:
+            value_mapping = request.get("values")
+            if not isinstance(value_mapping, dict) or not value_mapping:
+                raise ValueError("The \"values\" object is required")
+            set_instance_properties([self.instances[index] for index in index_list], value_mapping)
+            logger.info(
+                "The control socket has set %s of the instance(s) %s",
+                ", ".join(value_mapping), ", ".join(str(index) for index in index_list)
+            )
+            return None
+        for index in index_list:
+            self.instances[index].request_immediate_check()
+        return None
+
+    def handle_line(self, line: bytes) -> bytes:
+        """Decodes the request line and encodes the response line"""
+        try:
+            response = {"ok": True, "result": self.handle_request(json.loads(line))}
+        except (ValueError, TypeError) as exception_instance:
+            response = {"ok": False, "error": str(exception_instance)}
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("The control request has failed")
+            response = {"ok": False, "error": "The request has failed, see the log"}
+        return json.dumps(response).encode("utf-8") + b"\n"
+
+    def start(self) -> None:
+        """Starts serving in a background thread"""
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("The Unix domain sockets are not supported on this platform")
+        self.remove_stale_socket_file()
+        server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # The socket file is created with the permissions limited by the umask
+            previous_umask = os.umask(0o177)
+            try:
+                server_socket.bind(self.socket_path)
+            finally:
+                os.umask(previous_umask)
+            server_socket.listen()
+        except OSError:
+            server_socket.close()
+            raise
+        self._server_socket = server_socket
+        self._thread = threading.Thread(
+            target=self._accept_connections, args=(server_socket, ),
+            name="battery_handyman_control", daemon=True,
+        )
+        self._thread.start()
+        logger.info("The control socket is served on %s", self.socket_path)
+
+    def stop(self) -> None:
+        """Stops serving and removes the socket file"""
+        server_socket, self._server_socket = self._server_socket, None
+        if server_socket is None:
+            return
+        try:
+            # It interrupts `accept` of the serving thread
+            server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        server_socket.close()
+        if self._thread is not None:
+            self._thread.join(battery_handyman.constants.CONTROL_CLIENT_TIMEOUT_IN_SECONDS)
+            self._thread = None
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    def remove_stale_socket_file(self) -> None:
+        """Removes the socket file nobody listens to. Raises `OSError` if it is in use"""
+        if not os.path.exists(self.socket_path):
+            return
+        probe_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe_socket.connect(self.socket_path)
+        except ConnectionRefusedError:
+            os.unlink(self.socket_path)
+            return
+        finally:
+            probe_socket.close()
+        raise OSError(f"The control socket {self.socket_path} is used by another process")
+
+    def _accept_connections(self, server_socket: socket.socket) -> None:
+        while True:
+            try:
+                connection, _ = server_socket.accept()
+            except OSError:
+                # The server socket is closed
+                return
+            threading.Thread(
+                target=self._serve_connection, args=(connection, ),
+                name="battery_handyman_control_connection", daemon=True,
+            ).start()
+
+    def _serve_connection(self, connection: socket.socket) -> None:
+        with connection, connection.makefile(mode='rb') as request_file:
+            connection.settimeout(battery_handyman.constants.CONTROL_CLIENT_TIMEOUT_IN_SECONDS)
+            try:
+                while True:
+                    line = request_file.readline(
+                        battery_handyman.constants.CONTROL_REQUEST_SIZE_MAX
+                    )
+                    if not line:
+                        return
+                    connection.sendall(self.handle_line(line))
+            except OSError as exception_instance:
+                logger.debug("The control connection is closed: %s", exception_instance)
+
+
+def send_control_request(
+        socket_path: str, request: Dict[str, Any],
+        timeout: float = battery_handyman.constants.CONTROL_CLIENT_TIMEOUT_IN_SECONDS,
+) -> Dict[str, Any]:
+    """Sends the request to the control socket and returns the response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+        client_socket.settimeout(timeout)
+        client_socket.connect(socket_path)
+        client_socket.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client_socket.makefile(mode='rb') as response_file:
+            response_line = response_file.readline()
+    if not response_line:
+        raise OSError("The control socket has closed the connection without the response")
+    return json.loads(response_line)
+
+
+def parse_property_value(assignment: str) -> Tuple[str, Any]:
+    """Splits "NAME=VALUE" into the name and the JSON value"""
+    name, separator, value = assignment.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"{assignment} is not NAME=VALUE")
+    try:
+        return name, json.loads(value)
+    except ValueError as exception_instance:
+        raise argparse.ArgumentTypeError(f"{value} is not a JSON value") from exception_instance
+
+
+def main(args: List[str]) -> None:
+    """Sends the command to the control socket of the running process and prints the result"""
+    parser = argparse.ArgumentParser(
+        prog="python -m battery_handyman.control",
+        description="Queries and tunes the running process through its control socket",
+    )
+    parser.add_argument("socket_path", help="The path to the control socket")
+    parser.add_argument(
+        "command", choices=battery_handyman.constants.CONTROL_COMMAND_LIST,
+        help="\"status\" prints the last checks, \"set\" changes the properties,"
+             " \"check\" performs the check now, \"metrics\" prints the metrics",
+    )
+    parser.add_argument(
+        "assignments", nargs="*", type=parse_property_value, metavar="NAME=VALUE",
+        help="The properties of \"set\", e.g. battery_limit_charged=80",
+    )
+    parser.add_argument(
+        "-i", "--instance", type=int, default=None,
+        help="The index of the configuration in the fleet (all of them by default)",
+    )
+    parsed_args = parser.parse_args(args)
+
+    request: Dict[str, Any] = {"command": parsed_args.command}
+    if parsed_args.instance is not None:
+        request["instance"] = parsed_args.instance
+    if parsed_args.command == battery_handyman.constants.CONTROL_COMMAND_SET:
+        if not parsed_args.assignments:
+            parser.error("\"set\" requires NAME=VALUE")
+        request["values"] = dict(parsed_args.assignments)
+    try:
+        response = send_control_request(parsed_args.socket_path, request)
+    except OSError as exception_instance:
+        parser.exit(1, f"The control socket is unavailable: {exception_instance}\n")
+    if not response.get("ok"):
+        parser.exit(1, f"The request has failed: {response.get('error')}\n")
+    result = response.get("result")
+    if isinstance(result, str):
+        sys.stdout.write(result)
+    elif result is not None:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,49 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The deadlines of the checks
+
+The next check is planned from the deadline of the previous one, not from its end,
+so the durations of the checks and the delays of the wakeups do not accumulate.
+The deadlines can be aligned to the shared tick boundaries, so the checks
+of many instances wake the system up together
+"""
+import math
+from typing import Optional, Tuple
+
+
+def advance_deadline(deadline: float, interval: float, now: float) -> Tuple[float, int]:
+    """Returns the deadline `interval` seconds after `deadline` and the number of the missed ones
+
+    If the check (or the suspension of the system) has lasted longer than the interval,
+    the missed deadlines are skipped: the result is the latest passed deadline,
+    so the late check is performed at once and the phase of the checks is kept
+    """
+    next_deadline = deadline + interval
+    if next_deadline >= now or interval <= 0:
+        return next_deadline, 0
+    missed_count = int((now - next_deadline) // interval)
+    return next_deadline + missed_count * interval, missed_count
+
+
+def align_deadline(deadline: float, tick: float, slack: Optional[float] = None) -> float:
+    """Moves the deadline to the next multiple of `tick` if it is at most `slack` seconds later
+
+    `None` as `slack` means any postponement within the tick. 0 as `tick` disables the alignment
+    """
+    if not tick:
+        return deadline
+    aligned_deadline = math.ceil(deadline / tick) * tick
+    if slack is not None and aligned_deadline - deadline > slack:
+        return deadline
+    return aligned_deadline
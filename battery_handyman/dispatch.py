@@ -0,0 +1,174 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The delivery of the requests by the worker threads
+
+So a slow or hung remote device does not delay the checks
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import collections
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import battery_handyman.constants
+
+if TYPE_CHECKING:  # `concurrent.futures` is imported only by the reactions and the control
+    import concurrent.futures
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class RequestDispatcher:
+    """A bounded queue of the tasks run by the worker threads
+
+    The tasks are queued by the key (e.g. the remote device).
+    A new task replaces the not started one with the same key keeping its place in the queue,
+    so only the newest command is sent to the device when the queue backs up.
+    If the queue is full, the oldest task is dropped.
+    The `on_drop` callback of a replaced or dropped task is called instead of it,
+    so the submitter can release what it keeps for the task
+    """
+    def __init__(
+            self,
+            worker_count: int = battery_handyman.constants.DISPATCH_WORKER_COUNT_DEFAULT,
+            queue_size: int = battery_handyman.constants.DISPATCH_QUEUE_SIZE_DEFAULT,
+    ):
+        self.worker_count = worker_count
+        self.queue_size = queue_size
+        self._condition = threading.Condition()
+        self._key_deque: Deque[Hashable] = collections.deque()
+        # The task and its `on_drop` callback by the key
+        self._task_mapping: Dict[
+            Hashable, Tuple[Callable[[], None], Optional[Callable[[], None]]]
+        ] = {}
+        self._worker_list: List[threading.Thread] = []
+        self._idle_worker_count = 0
+        self._is_shut_down = False
+
+    def __len__(self) -> int:
+        """The number of the not started tasks"""
+        with self._condition:
+            return len(self._key_deque)
+
+    def submit(
+            self, key: Hashable, task: Callable[[], None],
+            on_drop: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Queues `task` replacing the not started one with the same `key`
+
+        `on_drop` is called by the submitting thread if the task is replaced or dropped
+        without being run
+        """
+        dropped_list = []
+        with self._condition:
+            if self._is_shut_down:
+                raise RuntimeError("The dispatcher is shut down")
+            if key in self._task_mapping:
+                logger.debug("The not started task for %s is replaced by the newer one", key)
+                dropped_list.append((key, self._task_mapping[key][1]))
+            else:
+                if len(self._key_deque) >= self.queue_size:
+                    dropped_key = self._key_deque.popleft()
+                    dropped_list.append((dropped_key, self._task_mapping.pop(dropped_key)[1]))
+                    logger.warning("The queue is full, the task for %s is dropped", dropped_key)
+                self._key_deque.append(key)
+            self._task_mapping[key] = (task, on_drop)
+            if self._idle_worker_count == 0 and len(self._worker_list) < self.worker_count:
+                self._start_worker()
+            self._condition.notify()
+        for dropped_key, dropped_on_drop in dropped_list:
+            if dropped_on_drop is None:
+                continue
+            try:
+                dropped_on_drop()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("The drop callback of the task for %s has failed", dropped_key)
+
+    def _start_worker(self) -> None:
+        """Starts one more worker thread. Requires the lock"""
+        worker = threading.Thread(
+            target=self._work, name=f"battery_handyman_dispatch_{len(self._worker_list)}",
+            daemon=True,
+        )
+        self._worker_list.append(worker)
+        worker.start()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                self._idle_worker_count += 1
+                while not self._key_deque and not self._is_shut_down:
+                    self._condition.wait()
+                self._idle_worker_count -= 1
+                if not self._key_deque:
+                    return
+                key = self._key_deque.popleft()
+                task, _ = self._task_mapping.pop(key)
+            try:
+                task()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("The dispatched task for %s has failed", key)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the workers after the queued tasks are finished"""
+        with self._condition:
+            self._is_shut_down = True
+            self._condition.notify_all()
+            worker_list = list(self._worker_list)
+        if wait:
+            for worker in worker_list:
+                worker.join()
+
+
+# The dispatcher shared by all the instances in the process
+REQUEST_DISPATCHER = RequestDispatcher()
+
+_reaction_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_reaction_executor_lock = threading.Lock()
+
+
+def make_future_call(
+        function: Callable[[], Any]
+) -> Tuple[concurrent.futures.Future, Callable[[], None]]:
+    """Returns the future and the callable that calls `function` and sets the future result,
+     so `function` can be run by another thread (e.g. the scheduler) and awaited"""
+    import concurrent.futures  # pylint: disable=import-outside-toplevel,redefined-outer-name
+    future: concurrent.futures.Future = concurrent.futures.Future()
+
+    def call() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function())
+        except Exception as exception_instance:  # pylint: disable=broad-except
+            future.set_exception(exception_instance)
+
+    return future, call
+
+
+def get_reaction_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Returns the thread pool shared by all the instances in the process
+     that runs the additional reactions of a check concurrently"""
+    global _reaction_executor  # pylint: disable=global-statement,invalid-name
+    with _reaction_executor_lock:
+        if _reaction_executor is None:
+            # pylint: disable=import-outside-toplevel,redefined-outer-name
+            import concurrent.futures
+            _reaction_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=battery_handyman.constants.REACTION_WORKER_COUNT_MAX,
+                thread_name_prefix="battery_handyman_reaction",
+            )
+        return _reaction_executor
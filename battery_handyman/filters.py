@@ -0,0 +1,157 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The filters of the battery readings applied before the decision
+
+The noisy gauges bounce around the battery limits and make every check toggle the charging.
+The filters smooth the percentage and delay the crossing of the limits.
+Their state does not grow with the number of the readings
+"""
+import collections
+from typing import Callable, Deque, Hashable, List, Optional, Sequence
+
+import battery_handyman.util
+
+
+class BatteryFilter:
+    """The base class of the filters of `BatteryInfo`"""
+    def apply(
+            self, timestamp: float, battery_info: battery_handyman.util.BatteryInfo
+    ) -> battery_handyman.util.BatteryInfo:
+        """Returns the filtered reading. `timestamp` is the time of the reading in seconds"""
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Forgets the previous readings"""
+
+
+class MedianBatteryFilter(BatteryFilter):
+    """Replaces the percentage by the median of the last `size` readings, it drops the spikes
+
+    The lower one of the two middle values is taken for an even number of the readings,
+    so the result is always one of the read values
+    """
+    def __init__(self, size: int):
+        self._percent_deque: Deque[float] = collections.deque(maxlen=size)
+
+    def apply(
+            self, timestamp: float, battery_info: battery_handyman.util.BatteryInfo
+    ) -> battery_handyman.util.BatteryInfo:
+        self._percent_deque.append(battery_info.left_in_percents)
+        percent_list = sorted(self._percent_deque)
+        return battery_info._replace(left_in_percents=percent_list[(len(percent_list) - 1) // 2])
+
+    def reset(self) -> None:
+        self._percent_deque.clear()
+
+
+class EwmaBatteryFilter(BatteryFilter):
+    """Replaces the percentage by its exponentially weighted moving average
+
+    `alpha` is the weight of the new reading, the smaller it is the smoother
+    (and the more delayed) the percentage is
+    """
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self._average: Optional[float] = None
+
+    def apply(
+            self, timestamp: float, battery_info: battery_handyman.util.BatteryInfo
+    ) -> battery_handyman.util.BatteryInfo:
+        if self._average is None:
+            self._average = battery_info.left_in_percents
+        else:
+            self._average += self.alpha * (battery_info.left_in_percents - self._average)
+        return battery_info._replace(left_in_percents=self._average)
+
+    def reset(self) -> None:
+        self._average = None
+
+
+class DwellBatteryFilter(BatteryFilter):
+    """Lets the percentage into another zone only after it has stayed there for `min_dwell_time`
+
+    `get_zone` returns the zone of the reading, e.g. below, between or above the battery limits.
+    Until the new zone is confirmed the last accepted percentage is returned
+    with the actual charging state
+    """
+    def __init__(
+            self, min_dwell_time: float,
+            get_zone: Callable[[battery_handyman.util.BatteryInfo], Hashable],
+    ):
+        self.min_dwell_time = min_dwell_time
+        self.get_zone = get_zone
+        self._accepted_battery_info: Optional[battery_handyman.util.BatteryInfo] = None
+        self._candidate_zone: Optional[Hashable] = None
+        self._candidate_since: Optional[float] = None
+
+    def apply(
+            self, timestamp: float, battery_info: battery_handyman.util.BatteryInfo
+    ) -> battery_handyman.util.BatteryInfo:
+        accepted_battery_info = self._accepted_battery_info
+        zone = self.get_zone(battery_info)
+        if accepted_battery_info is None or zone == self.get_zone(accepted_battery_info):
+            self._accepted_battery_info = battery_info
+            self._candidate_zone = self._candidate_since = None
+            return battery_info
+        if zone != self._candidate_zone:
+            self._candidate_zone, self._candidate_since = zone, timestamp
+        if timestamp - self._candidate_since >= self.min_dwell_time:
+            self._accepted_battery_info = battery_info
+            self._candidate_zone = self._candidate_since = None
+            return battery_info
+        return battery_info._replace(left_in_percents=accepted_battery_info.left_in_percents)
+
+    def reset(self) -> None:
+        self._accepted_battery_info = None
+        self._candidate_zone = self._candidate_since = None
+
+
+class BatteryFilterChain(BatteryFilter):
+    """Applies the filters one after another"""
+    def __init__(self, battery_filter_list: Sequence[BatteryFilter]):
+        self.battery_filter_list: List[BatteryFilter] = list(battery_filter_list)
+
+    def apply(
+            self, timestamp: float, battery_info: battery_handyman.util.BatteryInfo
+    ) -> battery_handyman.util.BatteryInfo:
+        for battery_filter in self.battery_filter_list:
+            battery_info = battery_filter.apply(timestamp, battery_info)
+        return battery_info
+
+    def reset(self) -> None:
+        for battery_filter in self.battery_filter_list:
+            battery_filter.reset()
+
+
+def create_battery_filter(
+        median_size: int, ewma_alpha: float, min_dwell_time: float,
+        get_zone: Callable[[battery_handyman.util.BatteryInfo], Hashable],
+) -> Optional[BatteryFilter]:
+    """Creates the chain of the enabled filters: the median drops the spikes first,
+     the average smooths the rest and the dwell time is applied to the result
+
+    Returns `None` if all of them are disabled (the size 1, the weight 1 and the time 0)
+    """
+    battery_filter_list: List[BatteryFilter] = []
+    if median_size > 1:
+        battery_filter_list.append(MedianBatteryFilter(median_size))
+    if ewma_alpha < 1:
+        battery_filter_list.append(EwmaBatteryFilter(ewma_alpha))
+    if min_dwell_time > 0:
+        battery_filter_list.append(DwellBatteryFilter(min_dwell_time, get_zone))
+    if not battery_filter_list:
+        return None
+    if len(battery_filter_list) == 1:
+        return battery_filter_list[0]
+    return BatteryFilterChain(battery_filter_list)
@@ -0,0 +1,117 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""It runs several `BatteryHandyman` instances in the single process
+
+All the instances share the single scheduler
+so a fleet of devices does not need a process per configuration file
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import logging
+import os
+import sched
+import time
+from typing import Iterable, List, Optional
+
+import yaml
+
+import battery_handyman.config_cache
+import battery_handyman.constants
+import battery_handyman.util
+from battery_handyman.battery_handyman_class import BatteryHandyman
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def collect_configuration_filepaths(path_list: Iterable[str]) -> List[str]:
+    """Expands the directories in `path_list` into the configuration files inside them
+
+    The files placed directly in the directory are taken in the alphabetical order
+    """
+    configuration_filepath_list = []
+    for path in path_list:
+        if not os.path.isdir(path):
+            configuration_filepath_list.append(path)
+            continue
+        for filename in sorted(os.listdir(path)):
+            filepath = os.path.join(path, filename)
+            if (
+                    os.path.isfile(filepath)
+                    and os.path.splitext(filename)[1]
+                    in battery_handyman.constants.CONFIGURATION_FILE_EXTENSION_LIST
+            ):
+                configuration_filepath_list.append(filepath)
+    return configuration_filepath_list
+
+
+class BatteryHandymanFleet:
+    """Drives several `BatteryHandyman` instances using the single scheduler
+
+    A failure of an instance is logged and does not affect the other instances
+    """
+    HANDYMAN_CLASS = BatteryHandyman
+
+    def __init__(self, instances: Iterable[BatteryHandyman]):
+        self._scheduler = sched.scheduler(time.monotonic, battery_handyman.util.WakeableSleep())
+        self.instances = list(instances)
+        for instance in self.instances:
+            instance.scheduler = self._scheduler
+
+    @classmethod
+    def from_configuration_paths(
+            cls, path_list: Iterable[str],
+            configuration_cache: Optional[battery_handyman.config_cache.ConfigurationCache] = None,
+    ) -> BatteryHandymanFleet:
+        """Creates a fleet using the configuration files and the directories with them
+
+        The invalid configuration files are skipped.
+        See `BatteryHandyman.from_configuration_file` about `configuration_cache`
+        """
+        instances = []
+        for configuration_filepath in collect_configuration_filepaths(path_list):
+            try:
+                instances.append(cls.HANDYMAN_CLASS.from_configuration_file(
+                    configuration_filepath, configuration_cache
+                ))
+            except (OSError, ValueError, yaml.YAMLError) as exception_instance:
+                logger.error("Skipping %s: %s", configuration_filepath, exception_instance)
+        if not instances:
+            raise ValueError("No valid configuration file is found")
+        return cls(instances)
+
+    def start(self, blocking: bool = True) -> None:
+        """Runs the check cycles of all the instances"""
+        for instance in self.instances:
+            instance.subscribe_to_power_events()
+            instance.subscribe_to_configuration_changes()
+            instance.schedule_new_check(initial=True)
+            instance._is_check_cycle_running = blocking  # pylint: disable=protected-access
+        try:
+            while True:
+                try:
+                    self._scheduler.run(blocking=blocking)
+                except Exception:  # pylint: disable=broad-except
+                    # The failed instance has already scheduled its next check
+                    logger.exception("A check has failed, the other checks continue")
+                    continue
+                return
+        finally:
+            for instance in self.instances:
+                instance._is_check_cycle_running = False  # pylint: disable=protected-access
+
+    def stop(self) -> None:
+        """Stops the check cycles of all the instances"""
+        for instance in self.instances:
+            instance.stop()
@@ -0,0 +1,238 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The history of the checks stored in a memory-mapped file
+
+The file is a fixed-size ring buffer: the header is followed by `capacity` records
+and the oldest record is overwritten when the buffer is full.
+The printed history is a CSV file readable by `battery_handyman.simulation.load_trace`
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import argparse
+import csv
+import logging
+import mmap
+import os
+import struct
+import sys
+from typing import Iterator, List, NamedTuple, Optional
+
+import battery_handyman.constants
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# magic, record size, capacity, the number of the appended records
+HEADER_STRUCT = struct.Struct("<8sIIQ")
+HEADER_COUNT_OFFSET = 16
+COUNT_STRUCT = struct.Struct("<Q")
+# timestamp, left_in_percents, is_charging (0, 1 or `HISTORY_IS_CHARGING_UNKNOWN`), decision,
+# padding
+RECORD_STRUCT = struct.Struct("<dfBBxx")
+TIMESTAMP_STRUCT = struct.Struct("<d")
+
+HISTORY_FIELD_NAME_LIST = ["timestamp", "is_charging", "left_in_percents", "decision", ]
+
+
+class HistoryRecord(NamedTuple):
+    """A result of the check"""
+    timestamp: float
+    left_in_percents: float
+    # `None` if the battery source could not tell it
+    is_charging: Optional[bool]
+    decision: int
+
+
+class HistoryRecorder:
+    """The ring buffer of the `HistoryRecord`s persisted to the memory-mapped file
+
+    An existing file is reopened with its own capacity so the history survives restarts.
+    `capacity` is used only for the new file, `HISTORY_SIZE_DEFAULT` is used if it is `None`
+    """
+    def __init__(self, filepath: str, capacity: Optional[int] = None, read_only: bool = False):
+        if capacity is not None and capacity <= 0:
+            raise ValueError(f"The history size ({capacity}) must be positive")
+        self.filepath = filepath
+        self.read_only = read_only
+        if read_only:
+            file_descriptor = os.open(filepath, os.O_RDONLY)
+        else:
+            file_descriptor = os.open(filepath, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            file_size = os.fstat(file_descriptor).st_size
+            if file_size == 0:
+                if read_only:
+                    raise ValueError(f"{filepath} is empty")
+                if capacity is None:
+                    capacity = battery_handyman.constants.HISTORY_SIZE_DEFAULT
+                os.ftruncate(file_descriptor, HEADER_STRUCT.size + capacity * RECORD_STRUCT.size)
+            self._mmap = mmap.mmap(
+                file_descriptor, 0, access=mmap.ACCESS_READ if read_only else mmap.ACCESS_WRITE
+            )
+        finally:
+            os.close(file_descriptor)
+
+        if file_size == 0:
+            HEADER_STRUCT.pack_into(
+                self._mmap, 0,
+                battery_handyman.constants.HISTORY_FILE_MAGIC, RECORD_STRUCT.size, capacity, 0
+            )
+        else:
+            self._read_header(capacity)
+        _, _, self.capacity, self._count = HEADER_STRUCT.unpack_from(self._mmap, 0)
+
+    def _read_header(self, capacity: Optional[int]) -> None:
+        try:
+            magic, record_size, stored_capacity, _ = HEADER_STRUCT.unpack_from(self._mmap, 0)
+        except struct.error:
+            magic, record_size, stored_capacity = None, None, 0
+        if (
+                magic != battery_handyman.constants.HISTORY_FILE_MAGIC
+                or record_size != RECORD_STRUCT.size
+                or stored_capacity == 0
+                or len(self._mmap) != HEADER_STRUCT.size + stored_capacity * RECORD_STRUCT.size
+        ):
+            self._mmap.close()
+            raise ValueError(f"{self.filepath} is not a battery history file")
+        if capacity is not None and stored_capacity != capacity:
+            logger.warning(
+                "%s keeps %s records, the configured history size %s is ignored",
+                self.filepath, stored_capacity, capacity
+            )
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def __enter__(self) -> HistoryRecorder:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_offset(self, index: int) -> int:
+        """Returns the offset of the record by its index counted from the oldest record"""
+        start = self._count - len(self)
+        return HEADER_STRUCT.size + ((start + index) % self.capacity) * RECORD_STRUCT.size
+
+    def append(
+            self, timestamp: float, left_in_percents: float, is_charging: Optional[bool],
+            decision: int
+    ) -> None:
+        """Adds the record overwriting the oldest one if the buffer is full
+
+        The counter is updated after the record so an interrupted write is not visible.
+        Raises `struct.error` if the values cannot be stored
+        """
+        RECORD_STRUCT.pack_into(
+            self._mmap, HEADER_STRUCT.size + (self._count % self.capacity) * RECORD_STRUCT.size,
+            timestamp, left_in_percents,
+            battery_handyman.constants.HISTORY_IS_CHARGING_UNKNOWN if is_charging is None
+            else bool(is_charging),
+            decision
+        )
+        self._count += 1
+        COUNT_STRUCT.pack_into(self._mmap, HEADER_COUNT_OFFSET, self._count)
+
+    def get(self, index: int) -> HistoryRecord:
+        """Returns the record by its index counted from the oldest record"""
+        if not 0 <= index < len(self):
+            raise IndexError("The history record index is out of range")
+        timestamp, left_in_percents, is_charging, decision = RECORD_STRUCT.unpack_from(
+            self._mmap, self._get_offset(index)
+        )
+        if left_in_percents.is_integer():
+            left_in_percents = int(left_in_percents)
+        return HistoryRecord(
+            timestamp, left_in_percents,
+            None if is_charging == battery_handyman.constants.HISTORY_IS_CHARGING_UNKNOWN
+            else bool(is_charging),
+            decision
+        )
+
+    def _bisect_timestamp(self, timestamp: float, is_right: bool) -> int:
+        """Finds the index like `bisect.bisect_left`/`bisect.bisect_right`
+         reading only the timestamps of the visited records"""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            middle_timestamp, = TIMESTAMP_STRUCT.unpack_from(self._mmap, self._get_offset(middle))
+            if middle_timestamp < timestamp or (is_right and middle_timestamp == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def read_range(
+            self, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Iterator[HistoryRecord]:
+        """Yields the records with `start <= timestamp <= end` from the oldest one
+
+        The range is found by the binary search, so the records are expected to be appended
+        in the order of their timestamps. The timestamps are the wall clock time:
+        after the system clock is set back the range may miss the records around the jump.
+        All the records are yielded in the order of their appending without `start` and `end`
+        """
+        start_index = 0 if start is None else self._bisect_timestamp(start, is_right=False)
+        end_index = len(self) if end is None else self._bisect_timestamp(end, is_right=True)
+        for index in range(start_index, end_index):
+            yield self.get(index)
+
+    def flush(self) -> None:
+        """Writes the changes to the disk"""
+        if not self.read_only:
+            self._mmap.flush()
+
+    def close(self) -> None:
+        """Releases the file"""
+        if not self._mmap.closed:
+            if not self.read_only:
+                self._mmap.flush()
+            self._mmap.close()
+
+
+def main(args: List[str]) -> None:
+    """Prints the records of the history file as CSV"""
+    parser = argparse.ArgumentParser(
+        prog="python -m battery_handyman.history",
+        description="Prints the battery history recorded by the checks",
+    )
+    parser.add_argument("history_path", help="The path to the history file")
+    parser.add_argument(
+        "-s", "--start", type=float, default=None,
+        help="The minimal timestamp (in seconds since the epoch) of the printed records",
+    )
+    parser.add_argument(
+        "-e", "--end", type=float, default=None,
+        help="The maximal timestamp (in seconds since the epoch) of the printed records",
+    )
+    parsed_args = parser.parse_args(args)
+
+    try:
+        history_recorder = HistoryRecorder(parsed_args.history_path, read_only=True)
+    except (OSError, ValueError) as exception_instance:
+        parser.error(str(exception_instance))
+    with history_recorder:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(HISTORY_FIELD_NAME_LIST)
+        for history_record in history_recorder.read_range(parsed_args.start, parsed_args.end):
+            writer.writerow([
+                history_record.timestamp,
+                "" if history_record.is_charging is None else int(history_record.is_charging),
+                history_record.left_in_percents,
+                battery_handyman.constants.DECISION_NAME_LIST[history_record.decision],
+            ])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,209 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The logging setup of the process
+
+The handlers writing the records may block the checks on the slow disks (e.g. SD cards).
+In the queued mode the checks only put the records into a queue
+and a background thread writes them. The records can be written as JSON lines
+with the structured events of the decisions and the requests
+(see `battery_handyman.util.make_log_event`), and the repetitive messages can be rate limited
+"""
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import battery_handyman.constants
+
+
+class RateLimitFilter(logging.Filter):
+    """Passes at most `limit` records with the same message template of the same logger
+     per `period` seconds
+
+    The next passed record of the template reports the number of the suppressed ones
+    in its `suppressed_count` attribute
+    """
+    def __init__(
+            self, limit: int,
+            period: float = battery_handyman.constants.LOG_RATE_LIMIT_PERIOD_IN_SECONDS,
+            timefunc: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__()
+        if limit < 1:
+            raise ValueError(f"The rate limit {limit} must be positive")
+        self.limit = limit
+        self.period = period
+        self.timefunc = timefunc
+        self._lock = threading.Lock()
+        # The start of the period, the number of the passed and of the suppressed records
+        self._counter_mapping: Dict[Tuple[str, Any], List[Any]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = self.timefunc()
+        key = (record.name, record.msg)
+        with self._lock:
+            counter = self._counter_mapping.get(key)
+            if counter is None:
+                counter = self._counter_mapping[key] = [now, 0, 0]
+            elif now - counter[0] >= self.period:
+                counter[0], counter[1] = now, 0
+            if counter[1] >= self.limit:
+                counter[2] += 1
+                return False
+            counter[1] += 1
+            suppressed_count, counter[2] = counter[2], 0
+        if suppressed_count:
+            record.suppressed_count = suppressed_count
+        return True
+
+
+def get_suppressed_count(record: logging.LogRecord) -> int:
+    """Returns the number of the records suppressed by `RateLimitFilter` before this one"""
+    return getattr(record, "suppressed_count", 0)
+
+
+class TextFormatter(logging.Formatter):
+    """The human readable format mentioning the suppressed records"""
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message = super().formatMessage(record)
+        suppressed_count = get_suppressed_count(record)
+        if suppressed_count:
+            message += f" ({suppressed_count} similar messages were suppressed)"
+        return message
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats every record as a JSON object on a single line
+
+    The object has "time" (ISO 8601 with the local offset), "level", "logger" and "message".
+    The structured event adds "event" and "data", the suppressed records add "suppressed",
+    the exception adds "exception"
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, battery_handyman.constants.LOG_RECORD_ATTR_EVENT, None)
+        if event is not None:
+            entry["event"] = event
+            entry["data"] = getattr(
+                record, battery_handyman.constants.LOG_RECORD_ATTR_EVENT_DATA, {}
+            )
+        suppressed_count = get_suppressed_count(record)
+        if suppressed_count:
+            entry["suppressed"] = suppressed_count
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """Puts the records into the queue of the background writer
+
+    The calling thread only renders the message (and the traceback, the frames
+    must not outlive the call), the formatting and the writing are done by the writer
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The other handlers of the record must receive it unchanged
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LoggingPipeline:
+    """The handler installed into the root logger by `setup_logging`
+
+    `close` removes it and writes the queued records
+    """
+    def __init__(
+            self, root_handler: logging.Handler, writing_handler: logging.Handler,
+            listener: Optional[logging.handlers.QueueListener], previous_level: int,
+    ):
+        self.root_handler = root_handler
+        self.writing_handler = writing_handler
+        self.listener = listener
+        self.previous_level = previous_level
+
+    def close(self) -> None:
+        """Restores the root logger and releases the log file"""
+        root_logger = logging.getLogger()
+        root_logger.removeHandler(self.root_handler)
+        root_logger.setLevel(self.previous_level)
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.root_handler.close()
+        self.writing_handler.close()
+
+
+def setup_logging(
+        level: str = battery_handyman.constants.LOG_LEVEL_DEFAULT,
+        log_format: str = battery_handyman.constants.LOG_FORMAT_TEXT,
+        filepath: Optional[str] = None, is_queued: bool = False, rate_limit: int = 0,
+) -> LoggingPipeline:
+    """Installs the handler writing the records of `level` and above
+     to the file (the standard error by default) into the root logger
+
+    `log_format` is one of `LOG_FORMAT_LIST`. With `is_queued` a background thread writes
+    the records. `rate_limit` is the maximal number of the records with the same message
+    per `LOG_RATE_LIMIT_PERIOD_IN_SECONDS`, 0 disables the limit
+    """
+    if log_format not in battery_handyman.constants.LOG_FORMAT_LIST:
+        raise ValueError(f"The log format {log_format} is unknown")
+    if filepath is None:
+        writing_handler: logging.Handler = logging.StreamHandler(sys.stderr)
+    else:
+        writing_handler = logging.FileHandler(filepath, encoding="utf-8")
+    if log_format == battery_handyman.constants.LOG_FORMAT_JSON:
+        writing_handler.setFormatter(JsonLinesFormatter())
+    else:
+        writing_handler.setFormatter(TextFormatter(battery_handyman.constants.LOG_TEXT_FORMAT))
+
+    root_handler = writing_handler
+    listener = None
+    if is_queued:
+        record_queue: queue.SimpleQueue = queue.SimpleQueue()
+        root_handler = QueueingHandler(record_queue)
+        listener = logging.handlers.QueueListener(record_queue, writing_handler)
+        listener.start()
+    if rate_limit:
+        # The suppressed records are dropped before they are queued
+        root_handler.addFilter(RateLimitFilter(rate_limit))
+
+    root_logger = logging.getLogger()
+    logging_pipeline = LoggingPipeline(root_handler, writing_handler, listener, root_logger.level)
+    root_logger.setLevel(level)
+    root_logger.addHandler(root_handler)
+    return logging_pipeline
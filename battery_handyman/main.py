@@ -11,36 +11,118 @@
 #    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
-"""Top-level commands"""
+"""Top-level commands
+
+Only the lightweight modules are imported on the module level.
+The rest is imported after the CLI arguments are parsed,
+so `--help` and the argument errors are reported without the long import
+"""
+import argparse
 import os.path
 import time
-from typing import List
+from typing import Callable, List
 
 import battery_handyman.cli
-from battery_handyman.battery_handyman_class import BatteryHandyman
+import battery_handyman.constants
 
 
 def main(
         args: List[str],
         path_to_dir_with_main_module: str = "battery_handyman",
-        testing: bool = False
+        testing: bool = False,
+        sleep: Callable[[float], None] = time.sleep,
 ) -> None:
     """The entrypoint of the application
 
-    With testing == False this function can not be covered
+    With testing == False this function can not be covered.
+    With testing == True the checks are run for the time waited by `sleep`,
+    e.g. `VirtualClock.sleep` of the simulation does not wait at all
     """
+    # pylint: disable=import-outside-toplevel
     cli_parser = battery_handyman.cli.setup_parser()
     parsed_args = cli_parser.parse_args(args)
 
+    from battery_handyman.logging_pipeline import setup_logging
+    try:
+        logging_pipeline = setup_logging(
+            parsed_args.log_level, parsed_args.log_format, parsed_args.log_file,
+            parsed_args.log_queue, parsed_args.log_rate_limit,
+        )
+    except (OSError, ValueError) as exception:
+        cli_parser.exit(1, f"The logging cannot be set up: {exception}\n")
+    try:
+        run(cli_parser, parsed_args, path_to_dir_with_main_module, testing, sleep)
+    finally:
+        logging_pipeline.close()
+
+
+def run(
+        cli_parser: argparse.ArgumentParser, parsed_args: argparse.Namespace,
+        path_to_dir_with_main_module: str, testing: bool,
+        sleep: Callable[[float], None] = time.sleep,
+) -> None:
+    """Loads the configuration(s) and runs the checks until they are stopped
+
+    With testing == False this function can not be covered,
+    otherwise the checks are stopped after `sleep` returns
+    """
+    # pylint: disable=import-outside-toplevel
+    import yaml
+    from battery_handyman.battery_handyman_class import BatteryHandyman
+    from battery_handyman.config_cache import ConfigurationCache, get_default_cache_filepath
+    from battery_handyman.fleet import BatteryHandymanFleet
     config_dir = os.path.join(
         path_to_dir_with_main_module, "..", "configurations"
     )
-    real_config_path = os.path.join(config_dir, parsed_args.config_path)
+    handyman_class, fleet_class = BatteryHandyman, BatteryHandymanFleet
+    if parsed_args.engine == battery_handyman.constants.ENGINE_ASYNCIO:
+        from battery_handyman.async_engine import AsyncBatteryHandyman, AsyncBatteryHandymanFleet
+        handyman_class, fleet_class = AsyncBatteryHandyman, AsyncBatteryHandymanFleet
 
-    battery_handyman_instance = BatteryHandyman.from_configuration_file(real_config_path)
+    configuration_cache = None
+    if parsed_args.config_cache_path is not None:
+        configuration_cache = ConfigurationCache(
+            parsed_args.config_cache_path or get_default_cache_filepath()
+        )
+    try:
+        if parsed_args.fleet_path:
+            battery_handyman_instance = fleet_class.from_configuration_paths([
+                os.path.join(config_dir, fleet_path) for fleet_path in parsed_args.fleet_path
+            ], configuration_cache)
+        else:
+            real_config_path = os.path.join(config_dir, parsed_args.config_path)
+            battery_handyman_instance = handyman_class.from_configuration_file(
+                real_config_path, configuration_cache
+            )
+    except (OSError, ValueError, yaml.YAMLError) as exception:
+        if not parsed_args.validate:
+            raise
+        cli_parser.exit(1, f"The configuration is invalid: {exception}\n")
+    if configuration_cache is not None:
+        configuration_cache.save()
+    if parsed_args.validate:
+        print("The configuration is valid")
+        return
+    metrics_server = None
+    if parsed_args.metrics_address is not None:
+        from battery_handyman.metrics import parse_address, start_metrics_server
+        metrics_server = start_metrics_server(*parse_address(parsed_args.metrics_address))
+    control_server = None
+    if parsed_args.control_socket is not None:
+        from battery_handyman.control import ControlServer
+        control_server = ControlServer(
+            parsed_args.control_socket,
+            getattr(battery_handyman_instance, "instances", [battery_handyman_instance]),
+        )
+        control_server.start()
     try:
         battery_handyman_instance.start(blocking=not(testing))
         if testing:
-            time.sleep(2.5)
+            sleep(battery_handyman.constants.TESTING_RUN_DURATION_IN_SECONDS)
     finally:
         battery_handyman_instance.stop()
+        if control_server is not None:
+            control_server.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
@@ -0,0 +1,269 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The metrics of the checks and their exposition in the Prometheus text format
+
+The metrics are collected by all the instances in the process.
+The "controller" label is the remote address of the instance
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import bisect
+import functools
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple
+
+import battery_handyman.constants
+
+if TYPE_CHECKING:  # `http.server` is imported only when the metrics are served
+    import http.server
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_URL_PATH = "/metrics"
+
+
+def escape_label_value(value: str) -> str:
+    """Escapes the label value according to the text format"""
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    """Returns the label set like `{name="value"}` or the empty string"""
+    if not label_names:
+        return ""
+    return "{" + ",".join(
+        f"{label_name}=\"{escape_label_value(str(label_value))}\""
+        for label_name, label_value in zip(label_names, label_values)
+    ) + "}"
+
+
+def format_value(value: float) -> str:
+    """Formats the sample value, the integers are printed without the fractional part"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """The base class of the metrics with the values per label set"""
+    TYPE = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def render_samples(self) -> List[str]:
+        """Returns the sample lines"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """Returns the lines of the metric including the HELP and TYPE ones"""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.TYPE}",
+            *self.render_samples(),
+        ]
+
+
+class Counter(Metric):
+    """A monotonically increasing value"""
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._value_mapping: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, label_values: Tuple[str, ...] = (), amount: float = 1) -> None:
+        """Increases the value of the label set"""
+        with self._lock:
+            self._value_mapping[label_values] = self._value_mapping.get(label_values, 0) + amount
+
+    def get(self, label_values: Tuple[str, ...] = ()) -> float:
+        """Returns the value of the label set"""
+        with self._lock:
+            return self._value_mapping.get(label_values, 0)
+
+    def render_samples(self) -> List[str]:
+        with self._lock:
+            value_item_list = sorted(self._value_mapping.items())
+        return [
+            f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}"
+            for label_values, value in value_item_list
+        ]
+
+
+class Histogram(Metric):
+    """The distribution of the observed values over the buckets"""
+    TYPE = "histogram"
+
+    def __init__(
+            self, name: str, documentation: str, label_names: Sequence[str] = (),
+            buckets: Iterable[float] = battery_handyman.constants.METRICS_LATENCY_BUCKET_LIST,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = sorted(buckets)
+        # The bucket counts (not cumulative, the last one is +Inf) and the sum
+        self._state_mapping: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, label_values: Tuple[str, ...] = ()) -> None:
+        """Adds the value to the distribution of the label set"""
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._state_mapping.get(label_values)
+            if state is None:
+                state = self._state_mapping[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][bucket_index] += 1
+            state[1][0] += value
+
+    def get_count(self, label_values: Tuple[str, ...] = ()) -> int:
+        """Returns the number of the observed values of the label set"""
+        with self._lock:
+            state = self._state_mapping.get(label_values)
+            return 0 if state is None else sum(state[0])
+
+    def render_samples(self) -> List[str]:
+        with self._lock:
+            state_item_list = sorted(
+                (label_values, (list(bucket_counts), value_sum[0]))
+                for label_values, (bucket_counts, value_sum) in self._state_mapping.items()
+            )
+        bucket_label_names = self.label_names + ("le", )
+        sample_list = []
+        for label_values, (bucket_counts, value_sum) in state_item_list:
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(self.buckets + [float("inf")], bucket_counts):
+                cumulative_count += bucket_count
+                bucket_labels = format_labels(
+                    bucket_label_names, label_values + (format_value(upper_bound), )
+                )
+                sample_list.append(f"{self.name}_bucket{bucket_labels} {cumulative_count}")
+            labels = format_labels(self.label_names, label_values)
+            sample_list.append(f"{self.name}_sum{labels} {format_value(value_sum)}")
+            sample_list.append(f"{self.name}_count{labels} {cumulative_count}")
+        return sample_list
+
+
+class MetricsRegistry:
+    """The collection of the metrics exposed together"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metric_mapping: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds the metric. The names must be unique"""
+        with self._lock:
+            if metric.name in self._metric_mapping:
+                raise ValueError(f"The metric {metric.name} is already registered")
+            self._metric_mapping[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Returns all the metrics in the text format"""
+        with self._lock:
+            metric_list = list(self._metric_mapping.values())
+        line_list = []
+        for metric in metric_list:
+            line_list.extend(metric.render())
+        return "\n".join(line_list) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+CHECKS_TOTAL = REGISTRY.register(Counter(
+    "battery_handyman_checks_total", "The number of the started checks", ("controller", ),
+))
+BATTERY_READ_DURATION = REGISTRY.register(Histogram(
+    "battery_handyman_battery_read_duration_seconds",
+    "The time of the reading of the battery state", ("source", ),
+))
+DECISIONS_TOTAL = REGISTRY.register(Counter(
+    "battery_handyman_decisions_total", "The number of the finished checks by the outcome",
+    ("controller", "decision"),
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "battery_handyman_request_duration_seconds",
+    "The time of the HTTP requests to the remote devices", ("controller", ),
+))
+RESPONSES_TOTAL = REGISTRY.register(Counter(
+    "battery_handyman_responses_total", "The number of the HTTP responses by the status code",
+    ("controller", "status_code"),
+))
+CONNECTION_ERRORS_TOTAL = REGISTRY.register(Counter(
+    "battery_handyman_connection_errors_total",
+    "The number of the HTTP requests failed without the response", ("controller", ),
+))
+SCHEDULER_LAG = REGISTRY.register(Histogram(
+    "battery_handyman_scheduler_lag_seconds",
+    "The delay of the check start after its scheduled time", ("controller", ),
+))
+MISSED_CHECKS_TOTAL = REGISTRY.register(Counter(
+    "battery_handyman_missed_checks_total",
+    "The number of the check deadlines skipped since the previous check has lasted too long",
+    ("controller", ),
+))
+
+
+@functools.lru_cache(maxsize=None)
+def get_request_handler_class() -> type:
+    """Returns the request handler serving the metrics of `server.registry`"""
+    import http.server  # pylint: disable=import-outside-toplevel,redefined-outer-name
+
+    class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+        """Serves the metrics of `server.registry`"""
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """Handles the scrape"""
+            if self.path.split("?", 1)[0] != METRICS_URL_PATH:
+                self.send_error(404)
+                return
+            body = self.server.registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:  # pylint: disable=redefined-builtin
+            logger.debug("Metrics endpoint: " + format, *args)
+
+    return MetricsRequestHandler
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Splits "HOST:PORT" or "PORT". The host is the loopback interface by default"""
+    host, _, port = address.rpartition(":")
+    return host.strip("[]") or battery_handyman.constants.METRICS_HOST_DEFAULT, int(port)
+
+
+def start_metrics_server(
+        host: str, port: int, registry: MetricsRegistry = REGISTRY
+) -> http.server.ThreadingHTTPServer:
+    """Serves the metrics in a background thread until `shutdown()` of the result is called"""
+    import http.server  # pylint: disable=import-outside-toplevel,redefined-outer-name
+    server = http.server.ThreadingHTTPServer((host, port), get_request_handler_class())
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(
+        target=server.serve_forever, name="battery_handyman_metrics", daemon=True
+    ).start()
+    logger.info(
+        "Metrics are served on http://%s:%s%s", host, server.server_address[1], METRICS_URL_PATH
+    )
+    return server
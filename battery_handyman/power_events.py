@@ -0,0 +1,182 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The sources of the notifications about the power supply changes
+
+On Linux the kernel announces plugging, unplugging and the capacity changes
+as the "power_supply" uevents so the check can be performed immediately
+instead of waiting for the next periodic one
+"""
+import logging
+import os
+import select
+import socket
+import threading
+from typing import Callable, List, Optional
+
+import battery_handyman.constants
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class PowerEventSource:
+    """The base class of the sources. The subscribers are called from the thread of the source"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callback_list: List[Callable[[], None]] = []
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        """Starts calling `callback` on every event. The first subscription starts the source"""
+        with self._lock:
+            if not self._callback_list:
+                self.start()
+            self._callback_list.append(callback)
+
+    def unsubscribe(self, callback: Callable[[], None]) -> None:
+        """Stops calling `callback`. The last unsubscription stops the source"""
+        with self._lock:
+            if callback not in self._callback_list:
+                return
+            self._callback_list.remove(callback)
+            if self._callback_list:
+                return
+            self.stop()
+        # The thread of the source may be waiting for the lock in `notify`
+        self.wait_stopped()
+
+    def notify(self) -> None:
+        """Calls the subscribers. A failed subscriber does not affect the others"""
+        with self._lock:
+            callback_list = list(self._callback_list)
+        for callback in callback_list:
+            try:
+                callback()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("The power event subscriber has failed")
+
+    def start(self) -> None:
+        """Starts receiving the events. It is called under the lock"""
+
+    def stop(self) -> None:
+        """Requests to stop receiving the events. It is called under the lock
+         so it must not wait for the thread calling `notify`"""
+
+    def wait_stopped(self) -> None:
+        """Waits for the stop requested by `stop`. It is called after the lock is released"""
+
+
+class FakePowerEventSource(PowerEventSource):
+    """The source whose events are triggered manually. It is intended for the tests"""
+    def trigger(self) -> None:
+        """Emulates an event"""
+        self.notify()
+
+
+def is_power_supply_uevent(message: bytes) -> bool:
+    """Checks whether the kernel uevent message is about a power supply
+
+    The message is "ACTION@DEVPATH" followed by "KEY=VALUE" lines separated by the null bytes
+    """
+    return b"SUBSYSTEM=power_supply" in message.split(b"\0")[1:]
+
+
+class UeventPowerEventSource(PowerEventSource):
+    """The source listening to the kernel uevents via the netlink socket (Linux only)
+
+    The thread blocks until an event or the stop, so the idle source does not wake it up.
+    The stop closes the write end of the pipe whose read end the thread waits on too
+    """
+    def __init__(self):
+        super().__init__()
+        self._thread: Optional[threading.Thread] = None
+        # The write end of the stop pipe of the running thread
+        self._stop_write_descriptor: Optional[int] = None
+        # The threads that are requested to stop and are not joined yet
+        self._stopped_thread_list: List[threading.Thread] = []
+
+    def start(self) -> None:
+        netlink_socket = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_DGRAM,  # pylint: disable=no-member
+            battery_handyman.constants.NETLINK_KOBJECT_UEVENT,
+        )
+        try:
+            netlink_socket.bind(
+                (0, battery_handyman.constants.NETLINK_KOBJECT_UEVENT_GROUP_KERNEL)
+            )
+            # Every thread has its own pipe, so the restarted source does not revive the stopped one
+            stop_read_descriptor, stop_write_descriptor = os.pipe()
+        except OSError:
+            netlink_socket.close()
+            raise
+        self._stop_write_descriptor = stop_write_descriptor
+        self._thread = threading.Thread(
+            target=self._receive_events, args=(netlink_socket, stop_read_descriptor),
+            name="battery_handyman_uevents", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._stop_write_descriptor is not None:
+            # The read end becomes readable (the end of the file) and wakes the thread up
+            os.close(self._stop_write_descriptor)
+            self._stop_write_descriptor = None
+        if self._thread is not None:
+            self._stopped_thread_list.append(self._thread)
+        self._thread = None
+
+    def wait_stopped(self) -> None:
+        with self._lock:
+            stopped_thread_list, self._stopped_thread_list = self._stopped_thread_list, []
+        for thread in stopped_thread_list:
+            # The last subscriber can unsubscribe from the callback called by the thread
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def _receive_events(self, netlink_socket: socket.socket, stop_read_descriptor: int) -> None:
+        try:
+            while True:
+                try:
+                    readable_list, _, _ = select.select(
+                        [netlink_socket, stop_read_descriptor], [], []
+                    )
+                    if stop_read_descriptor in readable_list:
+                        return
+                    message = netlink_socket.recv(
+                        battery_handyman.constants.NETLINK_MESSAGE_SIZE_MAX
+                    )
+                except OSError as exception_instance:
+                    logger.error("Receiving of the uevents has failed: %s", exception_instance)
+                    return
+                if is_power_supply_uevent(message):
+                    logger.debug("Power supply uevent: %s", message.split(b"\0", 1)[0])
+                    self.notify()
+        finally:
+            netlink_socket.close()
+            os.close(stop_read_descriptor)
+
+
+_uevent_power_event_source: Optional[UeventPowerEventSource] = None
+
+
+def get_power_event_source() -> Optional[PowerEventSource]:
+    """Returns the source shared by all the instances in the process
+
+    Returns `None` if the platform does not provide the power supply events
+    """
+    global _uevent_power_event_source  # pylint: disable=global-statement,invalid-name
+    if not hasattr(socket, "AF_NETLINK"):
+        return None
+    if _uevent_power_event_source is None:
+        _uevent_power_event_source = UeventPowerEventSource()
+    return _uevent_power_event_source
@@ -0,0 +1,106 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The built-in stage hook logging the time of the check stages
+
+See `BatteryHandyman.add_stage_hook` for the stages
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import contextvars
+import logging
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+
+import battery_handyman.constants
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class StageStatistics(NamedTuple):
+    """The accumulated durations of a stage in seconds"""
+    count: int
+    total: float
+    maximum: float
+
+
+class CheckStages:  # pylint: disable=too-few-public-methods
+    """The durations of the stages of one check"""
+    def __init__(self):
+        self.stage_duration_mapping: Dict[str, float] = {}
+        self.is_finished = False
+
+
+class StageProfiler:
+    """Logs the durations of the stages of every check and accumulates their statistics
+
+    An instance is a stage hook. The stages are attached to the check started by `begin_check`
+    in the same thread (or the same asyncio task). The stages reported elsewhere
+    (e.g. the delivery by the worker thread of the pool dispatch mode, the batch delivery
+    or the retry) are logged on their own since their check has been logged already.
+    The hook can be called from several threads
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._check_stages_var: contextvars.ContextVar[Optional[CheckStages]] = (
+            contextvars.ContextVar(f"battery_handyman_check_stages_{id(self)}", default=None)
+        )
+        self.statistics_mapping: Dict[str, StageStatistics] = {}
+
+    def begin_check(self) -> None:
+        """Attaches the stages reported further by this thread (task) to a new check"""
+        self._check_stages_var.set(CheckStages())
+
+    def __call__(self, instance: Any, stage: str, duration: float) -> None:
+        if stage == battery_handyman.constants.STAGE_REACTION:
+            # The reactions of a check are told apart by their remote devices
+            stage = f"{stage} {instance.remote_address}"
+        with self._lock:
+            statistics = self.statistics_mapping.get(stage)
+            if statistics is None:
+                self.statistics_mapping[stage] = StageStatistics(1, duration, duration)
+            else:
+                self.statistics_mapping[stage] = StageStatistics(
+                    statistics.count + 1, statistics.total + duration,
+                    max(statistics.maximum, duration)
+                )
+
+        check_stages = self._check_stages_var.get()
+        if check_stages is None or check_stages.is_finished:
+            logger.info(
+                "Stage of %s outside of its check: %s %.3f ms",
+                instance.remote_address, stage, duration * 1000
+            )
+            return
+        check_stages.stage_duration_mapping[stage] = duration
+        if stage == battery_handyman.constants.STAGE_CHECK:
+            check_stages.is_finished = True
+            logger.info(
+                "Check stages of %s: %s", instance.remote_address, ", ".join(
+                    f"{check_stage} {check_stage_duration * 1000:.3f} ms"
+                    for check_stage, check_stage_duration
+                    in check_stages.stage_duration_mapping.items()
+                )
+            )
+
+    def format_summary(self) -> str:
+        """Returns the mean and the maximal durations of the stages"""
+        with self._lock:
+            statistics_list = list(self.statistics_mapping.items())
+        return "\n".join(
+            f"{stage}: count {statistics.count},"
+            f" mean {statistics.total / statistics.count * 1000:.3f} ms,"
+            f" max {statistics.maximum * 1000:.3f} ms"
+            for stage, statistics in statistics_list
+        )
@@ -0,0 +1,159 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The retry delays and the circuit breakers of the remote devices
+
+The random jitter of the delays keeps many instances from retrying at the same moments
+after a common network failure
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import battery_handyman.constants
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Returns the delay in seconds from the Retry-After header value
+
+    The value is either the number of seconds or the HTTP date.
+    `None` is returned if the value is absent or malformed
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    import email.utils  # pylint: disable=import-outside-toplevel  # It is rarely needed
+    try:
+        retry_datetime = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_datetime is None:
+        return None
+    return max(retry_datetime.timestamp() - (time.time() if now is None else now), 0.0)
+
+
+def is_status_code_retryable(status_code: int) -> bool:
+    """Checks whether the failed request can succeed later"""
+    return (
+        status_code in battery_handyman.constants.RETRY_STATUS_CODE_LIST
+        or status_code >= battery_handyman.constants.RETRY_STATUS_CODE_SERVER_ERROR_MIN
+    )
+
+
+def get_retry_delay(
+        attempt: int, base_delay: float, max_delay: float,
+        retry_after: Optional[float] = None,
+        random_func: Callable[[], float] = random.random,
+) -> float:
+    """Returns the delay before the retry number `attempt` (counted from 0)
+
+    It is the exponential backoff with the full jitter:
+    a random value up to `base_delay * 2 ** attempt` limited by `max_delay`.
+    The delay requested by the remote device via Retry-After is respected
+    """
+    delay = min(base_delay * 2 ** attempt, max_delay) * random_func()
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class CircuitBreaker:
+    """Stops the requests to the remote device after the consecutive failures
+
+    After `reset_timeout` seconds one probe request is let through ("half-open" state).
+    Its success closes the circuit, its failure opens it again.
+    A probe whose result is not reported during `reset_timeout` (e.g. its command is discarded)
+    does not hold the circuit, the next probe is let through
+    """
+    def __init__(
+            self, failure_threshold: int, reset_timeout: float,
+            timefunc: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._timefunc = timefunc
+        self._lock = threading.Lock()
+        self._failure_count = 0
+        self._opened_at: Optional[float] = None
+        self._probe_sent_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        """One of the `CIRCUIT_*` constants"""
+        with self._lock:
+            if self._opened_at is None:
+                return battery_handyman.constants.CIRCUIT_CLOSED
+            if (
+                    self._probe_sent_at is not None
+                    or self._timefunc() - self._opened_at >= self.reset_timeout
+            ):
+                return battery_handyman.constants.CIRCUIT_HALF_OPEN
+            return battery_handyman.constants.CIRCUIT_OPEN
+
+    def allow_request(self) -> bool:
+        """Checks whether the request can be sent now. The probe is let through once"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = self._timefunc()
+            if self._probe_sent_at is not None:
+                if now - self._probe_sent_at < self.reset_timeout:
+                    return False
+            elif now - self._opened_at < self.reset_timeout:
+                return False
+            self._probe_sent_at = now
+            return True
+
+    def record_success(self) -> None:
+        """Closes the circuit"""
+        with self._lock:
+            self._failure_count = 0
+            self._opened_at = None
+            self._probe_sent_at = None
+
+    def record_failure(self) -> None:
+        """Opens the circuit after `failure_threshold` consecutive failures or the failed probe"""
+        with self._lock:
+            self._failure_count += 1
+            if self._probe_sent_at is not None or self._failure_count >= self.failure_threshold:
+                self._opened_at = self._timefunc()
+                self._probe_sent_at = None
+
+
+_circuit_breaker_lock = threading.Lock()
+_circuit_breaker_mapping: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(
+        remote_address: str, failure_threshold: int, reset_timeout: float
+) -> CircuitBreaker:
+    """Returns the circuit breaker shared by the instances with the same `remote_address`
+
+    The settings are updated by every call
+    """
+    with _circuit_breaker_lock:
+        circuit_breaker = _circuit_breaker_mapping.get(remote_address)
+        if circuit_breaker is None:
+            circuit_breaker = _circuit_breaker_mapping[remote_address] = CircuitBreaker(
+                failure_threshold, reset_timeout
+            )
+        circuit_breaker.failure_threshold = failure_threshold
+        circuit_breaker.reset_timeout = reset_timeout
+        return circuit_breaker
@@ -0,0 +1,152 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""Keep-alive HTTP sessions shared by the instances targeting the same remote device
+
+A new connection per request means DNS resolution and TCP (and TLS) handshakes every time.
+It is noticeable for the remote devices connected via slow Wi-Fi
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+if TYPE_CHECKING:  # `requests` is imported on the first use since it is slow to import
+    import requests
+
+
+logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class PooledSession:  # pylint: disable=too-few-public-methods
+    """A session with the details needed for its eviction"""
+    def __init__(self, session: requests.Session, idle_timeout: float, last_used: float):
+        self.session = session
+        self.idle_timeout = idle_timeout
+        self.last_used = last_used
+        # The number of the requests being sent by the session now
+        self.user_count = 0
+
+
+class SessionPool:
+    """Keeps a keep-alive session per remote address
+
+    The sessions not used longer than their idle timeout are closed by a single thread
+    started on demand. A session sending a request is never closed by the eviction.
+    Without `evicts_in_background` the eviction is performed only by `evict_idle`
+    """
+    def __init__(
+            self, timefunc: Callable[[], float] = time.monotonic,
+            evicts_in_background: bool = True,
+    ):
+        self._timefunc = timefunc
+        self._evicts_in_background = evicts_in_background
+        self._condition = threading.Condition()
+        self._pooled_session_mapping: Dict[str, PooledSession] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._pooled_session_mapping)
+
+    def acquire_session(
+            self, remote_address: str, pool_size: int, idle_timeout: float
+    ) -> requests.Session:
+        """Returns the session for `remote_address` creating it if it is needed.
+         It is not closed by the eviction until `release_session` is called
+
+        `pool_size` (the maximal number of the kept connections) is applied
+        only on the creation of the session
+        """
+        with self._condition:
+            pooled_session = self._pooled_session_mapping.get(remote_address)
+            if pooled_session is None:
+                import requests.adapters  # pylint: disable=import-outside-toplevel
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=pool_size
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                pooled_session = PooledSession(session, idle_timeout, self._timefunc())
+                self._pooled_session_mapping[remote_address] = pooled_session
+                logger.debug("A session for %s is created", remote_address)
+                if self._evicts_in_background and self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._evict_idle_sessions, name="battery_handyman_session_pool",
+                        daemon=True,
+                    )
+                    self._thread.start()
+            pooled_session.idle_timeout = idle_timeout
+            pooled_session.user_count += 1
+            return pooled_session.session
+
+    def release_session(self, remote_address: str, session: requests.Session) -> None:
+        """Marks the end of the usage of the session returned by `acquire_session`,
+         its idle time starts now"""
+        with self._condition:
+            pooled_session = self._pooled_session_mapping.get(remote_address)
+            if pooled_session is None or pooled_session.session is not session:
+                # The pool has been closed meanwhile
+                return
+            pooled_session.user_count -= 1
+            pooled_session.last_used = self._timefunc()
+            self._condition.notify()
+
+    def request(
+            self, remote_address: str, pool_size: int, idle_timeout: float,
+            method: str, url: str, **kwargs
+    ) -> requests.Response:
+        """Sends the request using the session for `remote_address`"""
+        session = self.acquire_session(remote_address, pool_size, idle_timeout)
+        try:
+            return session.request(method, url, **kwargs)
+        finally:
+            self.release_session(remote_address, session)
+
+    def close(self) -> None:
+        """Closes all the sessions"""
+        with self._condition:
+            for pooled_session in self._pooled_session_mapping.values():
+                pooled_session.session.close()
+            self._pooled_session_mapping.clear()
+
+    def evict_idle(self) -> Optional[float]:
+        """Closes the not used sessions idle longer than their timeout.
+         Returns the time in seconds until the next eviction, `None` if no session is idle"""
+        with self._condition:
+            now = self._timefunc()
+            next_eviction_delay = None
+            for remote_address, pooled_session in list(self._pooled_session_mapping.items()):
+                if pooled_session.user_count:
+                    continue
+                eviction_delay = pooled_session.last_used + pooled_session.idle_timeout - now
+                if eviction_delay <= 0:
+                    pooled_session.session.close()
+                    del self._pooled_session_mapping[remote_address]
+                    logger.debug("The idle session for %s is closed", remote_address)
+                elif next_eviction_delay is None or eviction_delay < next_eviction_delay:
+                    next_eviction_delay = eviction_delay
+            return next_eviction_delay
+
+    def _evict_idle_sessions(self) -> None:
+        while True:
+            with self._condition:
+                # Without the idle sessions it waits for the release of one
+                self._condition.wait(self.evict_idle())
+
+
+# The pool shared by all the instances in the process
+SESSION_POOL = SessionPool()
@@ -0,0 +1,251 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The offline evaluation of the configurations using the recorded battery traces
+
+The check cycle is run by a virtual clock so a long trace is replayed
+as fast as the checks can be performed. Nothing is sent to the remote devices.
+The pool dispatch and the batches are performed by the check cycle itself,
+so the same trace always gives the same requests
+
+The trace file is a CSV file with the ``timestamp,is_charging,left_in_percents`` header.
+The timestamps are in seconds
+"""
+from __future__ import annotations  # https://stackoverflow.com/a/49872353
+
+import argparse
+import bisect
+import csv
+import sched
+import sys
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+import battery_handyman.batching
+import battery_handyman.constants
+import battery_handyman.util
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.battery_source import BatterySource
+
+
+TRACE_FIELD_NAME_LIST = ["timestamp", "is_charging", "left_in_percents", ]
+
+
+class TraceSample(NamedTuple):
+    """A battery state recorded at the moment"""
+    timestamp: float
+    battery_info: battery_handyman.util.BatteryInfo
+
+
+def load_trace(trace_filepath: str) -> List[TraceSample]:
+    """Reads the trace file. The samples are sorted by the timestamp"""
+    trace = []
+    with open(trace_filepath, mode='r', newline='') as trace_file:
+        for row in csv.DictReader(trace_file):
+            left_in_percents = float(row["left_in_percents"])
+            if left_in_percents.is_integer():
+                left_in_percents = int(left_in_percents)
+            trace.append(TraceSample(
+                timestamp=float(row["timestamp"]),
+                battery_info=battery_handyman.util.BatteryInfo(
+                    is_charging=row["is_charging"].strip().lower() in ("1", "true"),
+                    left_in_percents=left_in_percents,
+                ),
+            ))
+    if not trace:
+        raise ValueError(f"The trace file {trace_filepath} is empty")
+    trace.sort(key=lambda trace_sample: trace_sample.timestamp)
+    return trace
+
+
+def save_trace(trace_filepath: str, trace: Iterable[TraceSample]) -> None:
+    """Writes the trace file"""
+    with open(trace_filepath, mode='w', newline='') as trace_file:
+        writer = csv.writer(trace_file)
+        writer.writerow(TRACE_FIELD_NAME_LIST)
+        for trace_sample in trace:
+            writer.writerow([
+                trace_sample.timestamp,
+                int(bool(trace_sample.battery_info.is_charging)),
+                trace_sample.battery_info.left_in_percents,
+            ])
+
+
+class VirtualClock:
+    """A clock that moves only when somebody sleeps
+
+    `time` and `sleep` replace `time.time` and `time.sleep` in `sched.scheduler`
+    """
+    def __init__(self, start_time: float = 0.0):
+        self._current_time = start_time
+
+    def time(self) -> float:
+        """Returns the current virtual time"""
+        return self._current_time
+
+    def sleep(self, delay: float) -> None:
+        """Moves the virtual time forward"""
+        if delay > 0:
+            self._current_time += delay
+
+    def set_time(self, value: float) -> None:
+        """Moves the virtual time to the provided moment"""
+        self._current_time = value
+
+
+class ReplayBatterySource(BatterySource):
+    """The source returning the latest trace sample recorded at or before the clock time
+
+    The first sample is returned before the beginning of the trace
+    """
+    def __init__(self, trace: List[TraceSample], clock: VirtualClock):
+        self._timestamp_list = [trace_sample.timestamp for trace_sample in trace]
+        self._battery_info_list = [trace_sample.battery_info for trace_sample in trace]
+        self._clock = clock
+
+    def read(self) -> battery_handyman.util.BatteryInfo:
+        sample_index = bisect.bisect_right(self._timestamp_list, self._clock.time()) - 1
+        return self._battery_info_list[max(sample_index, 0)]
+
+
+class ScheduledCommandBatcher:
+    """The replacement of `CommandBatcher` sending the batches by the scheduler
+
+    The batch is sent at the end of its window on the scheduler clock,
+    without the worker threads
+    """
+    def __init__(self, scheduler: sched.scheduler):
+        self._scheduler = scheduler
+        self._batch_mapping: Dict[Hashable, battery_handyman.batching.CommandBatch] = {}
+
+    def __len__(self) -> int:
+        """The number of the not sent batches"""
+        return len(self._batch_mapping)
+
+    def add(
+            self, batch_key: Hashable, submitter_key: Hashable, command: str, window: float,
+            deliver_batch: battery_handyman.batching.DeliverBatch,
+            handle_result: battery_handyman.batching.HandleBatchResult,
+    ) -> None:
+        """Adds the command to the batch. `deliver_batch` of the first command sends the batch"""
+        batch = self._batch_mapping.get(batch_key)
+        if batch is None:
+            batch = self._batch_mapping[batch_key] = battery_handyman.batching.CommandBatch(
+                self._scheduler.timefunc() + window, deliver_batch
+            )
+            self._scheduler.enter(window, 0, self._send_batch, (batch_key, batch))
+        batch.entry_mapping[submitter_key] = (command, handle_result)
+
+    def discard(self, submitter_key: Hashable) -> None:
+        """Removes the not sent commands of the submitter"""
+        for batch_key, batch in list(self._batch_mapping.items()):
+            batch.entry_mapping.pop(submitter_key, None)
+            if not batch.entry_mapping:
+                del self._batch_mapping[batch_key]
+
+    def _send_batch(
+            self, batch_key: Hashable, batch: battery_handyman.batching.CommandBatch
+    ) -> None:
+        # The discarded batch may be replaced by a newer one with the same key
+        if self._batch_mapping.get(batch_key) is batch:
+            del self._batch_mapping[batch_key]
+            batch.send()
+
+
+class SimulatedBatteryHandyman(BatteryHandyman):
+    """`BatteryHandyman` that runs on the virtual clock and records the requests instead of sending
+
+    Every recorded request is considered as successfully delivered.
+    The dispatched requests are sent at once and the batches are sent by the scheduler
+    """
+    def __init__(self, *args, **kwargs):
+        # They are shared with the reactions created by the base class
+        self.virtual_clock = VirtualClock()
+        self.delivered_request_list: List[Tuple[float, str]] = []
+        self.command_batcher: Optional[ScheduledCommandBatcher] = None
+        super().__init__(*args, **kwargs)
+        self.scheduler = sched.scheduler(self.virtual_clock.time, self.virtual_clock.sleep)
+        self.command_batcher = ScheduledCommandBatcher(self.scheduler)
+
+    def adopt_reaction(self, reaction: BatteryHandyman) -> None:
+        """Makes the reaction use the virtual clock and record to the same list"""
+        super().adopt_reaction(reaction)
+        reaction.virtual_clock = self.virtual_clock
+        reaction.delivered_request_list = self.delivered_request_list
+        reaction.command_batcher = self.command_batcher
+
+    def get_command_batcher(self) -> ScheduledCommandBatcher:
+        """Returns the batcher run by the scheduler of the simulation"""
+        return self.command_batcher
+
+    def dispatch_request(
+            self, ready_request_line: str, battery_info: battery_handyman.util.BatteryInfo,
+            attempt: int = 0
+    ) -> int:
+        """Sends the request at once instead of passing it to the worker threads"""
+        self.deliver_and_handle_request(ready_request_line, battery_info, attempt)
+        return battery_handyman.constants.DECISION_DISPATCHED
+
+    def deliver_request(
+            self, ready_request_line: str
+    ) -> Optional[battery_handyman.util.ResponseStatus]:
+        self.delivered_request_list.append((self.virtual_clock.time(), ready_request_line))
+        return battery_handyman.util.ResponseStatus(200, "Simulated")
+
+    def simulate(
+            self, trace: List[TraceSample], duration: Optional[float] = None
+    ) -> List[Tuple[float, str]]:
+        """Runs the check cycle from the beginning of `trace` during `duration` seconds
+
+        The whole trace is replayed by default.
+        Returns the recorded requests with their virtual time
+        """
+        self.battery_source = ReplayBatterySource(trace, self.virtual_clock)
+        start_time = trace[0].timestamp
+        end_time = trace[-1].timestamp if duration is None else start_time + duration
+        self.virtual_clock.set_time(start_time)
+        self.delivered_request_list = []
+        self.command_batcher = ScheduledCommandBatcher(self.scheduler)
+        for reaction in self.reactions:
+            self.adopt_reaction(reaction)
+
+        self.schedule_new_check(initial=True)
+        self.scheduler.enterabs(end_time, 0, self.stop)
+        self.scheduler.run()
+        return self.delivered_request_list
+
+
+def main(args: List[str]) -> None:
+    """Prints the requests that the configuration would send during the trace"""
+    parser = argparse.ArgumentParser(
+        prog="python -m battery_handyman.simulation",
+        description="Replays the battery trace against the configuration without sending requests",
+    )
+    parser.add_argument("config_path", help="The path to the configuration YAML file")
+    parser.add_argument("trace_path", help="The path to the trace CSV file")
+    parser.add_argument(
+        "-d", "--duration", type=float, default=None,
+        help="The replayed duration in seconds. The whole trace is replayed by default",
+    )
+    parsed_args = parser.parse_args(args)
+
+    instance = SimulatedBatteryHandyman.from_configuration_file(parsed_args.config_path)
+    delivered_request_list = instance.simulate(
+        load_trace(parsed_args.trace_path), parsed_args.duration
+    )
+    for request_time, ready_request_line in delivered_request_list:
+        print(f"{request_time:.3f}", instance.request_method, ready_request_line)
+    print("Requests:", len(delivered_request_list))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,101 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The fields of the request line template
+
+Only the fields the parsed `request_template` references are computed on a check,
+so the richer templates cost nothing to the configurations that do not use them.
+A field computed as `None` means the charging must be unchanged and nothing is sent
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import battery_handyman.constants
+import battery_handyman.util
+
+
+class TemplateField(NamedTuple):
+    """A field of the request line template"""
+    # Computes the value by the instance and the battery state
+    compute: Callable[[Any, battery_handyman.util.BatteryInfo], Any]
+    # `True` if the value depends only on the battery state and the settings,
+    # so the ready request lines can be precomputed
+    is_cacheable: bool = True
+    # `True` if the value needs the charge rate estimated by the recent readings
+    needs_charge_rate: bool = False
+
+
+def compute_needs_charging(
+        instance: Any, battery_info: battery_handyman.util.BatteryInfo
+) -> Optional[bool]:
+    """Returns `True` below `battery_limit_low` while discharging,
+     `False` above `battery_limit_charged` while charging and `None` otherwise"""
+    if battery_info.is_charging:
+        if battery_info.left_in_percents > instance.battery_limit_charged:
+            return False
+    elif battery_info.left_in_percents < instance.battery_limit_low:
+        return True
+    return None
+
+
+def compute_seconds_left(
+        instance: Any, battery_info: battery_handyman.util.BatteryInfo
+) -> int:
+    """Returns the rounded estimate of `BatteryHandyman.estimate_seconds_left`
+     or `REQUEST_DATA_SECONDS_LEFT_UNKNOWN`"""
+    seconds_left = instance.estimate_seconds_left(battery_info)
+    if seconds_left is None:
+        return battery_handyman.constants.REQUEST_DATA_SECONDS_LEFT_UNKNOWN
+    return round(seconds_left)
+
+
+TEMPLATE_FIELD_MAPPING: Dict[str, TemplateField] = {
+    battery_handyman.constants.REQUEST_DATA_KEY_NEEDS_CHARGING: TemplateField(
+        compute_needs_charging
+    ),
+    # The readings are rendered as they are: the table of the integer percentages
+    # would render e.g. 50.0 as 50 and the unknown charging state as `False`
+    battery_handyman.constants.REQUEST_DATA_KEY_LEFT_IN_PERCENTS: TemplateField(
+        lambda instance, battery_info: battery_info.left_in_percents, is_cacheable=False
+    ),
+    battery_handyman.constants.REQUEST_DATA_KEY_IS_CHARGING: TemplateField(
+        lambda instance, battery_info: battery_info.is_charging, is_cacheable=False
+    ),
+    battery_handyman.constants.REQUEST_DATA_KEY_SECONDS_LEFT: TemplateField(
+        compute_seconds_left, is_cacheable=False, needs_charge_rate=True
+    ),
+}
+
+
+def register_template_field(
+        key: str, compute: Callable[[Any, battery_handyman.util.BatteryInfo], Any],
+        is_cacheable: bool = False, needs_charge_rate: bool = False,
+) -> None:
+    """Makes the field available to the request line templates set after the registration
+
+    `compute` is called with the instance and the battery state on the checks
+    whose template references `key`. Raises `ValueError` if the field is already registered
+    """
+    if key in TEMPLATE_FIELD_MAPPING:
+        raise ValueError(f"The template field ({key}) is already registered")
+    TEMPLATE_FIELD_MAPPING[key] = TemplateField(compute, is_cacheable, needs_charge_rate)
+
+
+def get_template_field_list(key_list: Sequence[str]) -> List[Tuple[str, TemplateField]]:
+    """Returns the fields by their keys. Raises `ValueError` for the unknown keys"""
+    unknown_key_list = [key for key in key_list if key not in TEMPLATE_FIELD_MAPPING]
+    if unknown_key_list:
+        raise ValueError(
+            f"The template field(s) {', '.join(unknown_key_list)} are unknown, "
+            f"the known ones are {', '.join(TEMPLATE_FIELD_MAPPING)}"
+        )
+    return [(key, TEMPLATE_FIELD_MAPPING[key]) for key in key_list]
@@ -12,9 +12,9 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 """Auxiliary package-level definitions"""
-from typing import List, NamedTuple
-
-import psutil
+import string
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
 
 import battery_handyman.constants
 
@@ -25,8 +25,25 @@ class BatteryInfo(NamedTuple):
     left_in_percents: int
 
 
+class ResponseStatus(NamedTuple):
+    """The result of the request to the remote device"""
+    status_code: int
+    reason: str
+    # The delay in seconds requested by the Retry-After header
+    retry_after: Optional[float] = None
+
+
+class DeliveredCommand(NamedTuple):
+    """A request successfully delivered to the remote device"""
+    ready_request_line: str
+    # The charging state that confirms the command has been applied
+    expected_is_charging: bool
+    delivered_at: float
+
+
 def get_battery_info() -> BatteryInfo:
     """Return a namespace with the `is_charging` and `left_in_percents` key-values"""
+    import psutil  # pylint: disable=import-outside-toplevel  # It is slow to import
     battery_info = psutil.sensors_battery()
     is_charging = battery_info.power_plugged
     left_in_percents = battery_info.percent
@@ -37,15 +54,56 @@ def get_battery_info() -> BatteryInfo:
 
 
 def parse_request_data_key_list(request_template: str) -> List[str]:
-    """Extract the names of the placeholders in the request line template"""
-    request_data_key_list = battery_handyman.constants.TEMPLATE_REGEXP.findall(request_template)
-    request_data_key_list = [
-        key for key in request_data_key_list
-        if key in battery_handyman.constants.REQUEST_DATA_VALID_KEY_LIST
-    ]
+    """Extract the names of the placeholders in the request line template
+
+    The format specifications and the conversions are skipped, e.g. `{left_in_percents:.0f}`
+    gives `left_in_percents`. Every name is returned once in the order of the first occurrence
+    """
+    request_data_key_list = []
+    for _, field_name, _, _ in string.Formatter().parse(request_template):
+        if field_name is None:
+            continue
+        key = field_name.partition(".")[0].partition("[")[0]
+        if key not in request_data_key_list:
+            request_data_key_list.append(key)
     return request_data_key_list
 
 
+def make_log_event(event: str, **event_data: Any) -> Dict[str, Any]:
+    """Returns the `extra` of the log call carrying the structured event (`LOG_EVENT_*`)
+
+    The JSON lines log renders the event and its data, the text log shows only the message
+    """
+    return {
+        battery_handyman.constants.LOG_RECORD_ATTR_EVENT: event,
+        battery_handyman.constants.LOG_RECORD_ATTR_EVENT_DATA: event_data,
+    }
+
+
+class WakeableSleep:
+    """A replacement of `time.sleep` for `sched.scheduler` that can be interrupted
+
+    The scheduler re-checks its queue after the interruption
+    so the events added from another thread are not delayed
+    """
+    def __init__(self):
+        # A plain lock is much lighter than `threading.Event`.
+        # It is held all the time except between `wake` and the end of the sleep
+        self._wake_lock = threading.Lock()
+        self._wake_lock.acquire()
+
+    def __call__(self, delay: float) -> None:
+        self._wake_lock.acquire(timeout=max(delay, 0))
+
+    def wake(self) -> None:
+        """Interrupts the current or the next sleep"""
+        try:
+            self._wake_lock.release()
+        except RuntimeError:
+            # It is already woken
+            pass
+
+
 class DoNotToogleChargingException(Exception):
     """Signals that the charging process must be unchanged"""
     __doc__ += battery_handyman.constants.MSG_CHARGING_MUST_NOT_TO_BE_TOOGLED
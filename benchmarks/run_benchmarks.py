@@ -0,0 +1,308 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The benchmarks of the check pipeline, the configuration I/O, the startup and the memory
+
+Run it from the repository root::
+
+    python benchmarks/run_benchmarks.py --compare
+
+All the results are "lower is better": the time is in seconds per operation,
+the memory is in bytes per instance.
+The baseline depends on the device so save it on the device it is compared on
+"""
+import argparse
+import gc
+import http.server
+import json
+import os
+import os.path
+import subprocess
+import sys
+import tempfile
+import threading
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List
+
+
+REPOSITORY_DIRPATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPOSITORY_DIRPATH)
+
+# pylint: disable=wrong-import-position
+from battery_handyman.battery_handyman_class import BatteryHandyman  # noqa: E402
+from battery_handyman.battery_source import BatterySource  # noqa: E402
+from battery_handyman.config_cache import ConfigurationCache  # noqa: E402
+from battery_handyman.util import BatteryInfo  # noqa: E402
+
+
+CONFIG_PATH_DEFAULT = os.path.join(
+    REPOSITORY_DIRPATH, "configurations", "default_configuration.yml"
+)
+BASELINE_PATH_DEFAULT = os.path.join(os.path.dirname(__file__), "baseline.json")
+# A result is a regression if it is greater than the baseline times the tolerance
+TOLERANCE_DEFAULT = 1.5
+
+BATTERY_INFO_DISCHARGED = BatteryInfo(is_charging=False, left_in_percents=1)
+
+
+class ConstantBatterySource(BatterySource):
+    """The source that does not depend on the battery of the device running the benchmarks"""
+    def read(self) -> BatteryInfo:
+        return BATTERY_INFO_DISCHARGED
+
+
+class StubControllerRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Answers "200 OK" to any POST request keeping the connection alive"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Handles a command"""
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Keeps the output of the benchmarks clean"""
+
+
+def measure_time(function: Callable[[], None], repeat: int = 5) -> float:
+    """Returns the best time of the function call in seconds"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def make_instance(remote_address: str = "http://127.0.0.1:80") -> BatteryHandyman:
+    """Creates the instance from the default configuration not depending on the device"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.battery_source = ConstantBatterySource()
+    instance.remote_address = remote_address
+    return instance
+
+
+def benchmark_perform_check() -> Dict[str, float]:
+    """The whole check including the HTTP request to the local stub controller"""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubControllerRequestHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    try:
+        instance = make_instance(f"http://127.0.0.1:{server.server_address[1]}")
+
+        def perform_check():
+            instance.perform_check()
+            instance.stop()
+
+        return {"perform_check": measure_time(perform_check)}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def benchmark_request_line() -> Dict[str, float]:
+    """The stages of the request line preparation"""
+    instance = make_instance()
+
+    def render_request_line():
+        instance.render_request_line(instance.extract_request_data(BATTERY_INFO_DISCHARGED))
+
+    return {
+        "extract_request_data": measure_time(
+            lambda: instance.extract_request_data(BATTERY_INFO_DISCHARGED)
+        ),
+        "map_request_data_inplace": measure_time(
+            lambda: instance.map_request_data_inplace({"needs_charging": True})
+        ),
+        "render_request_line": measure_time(render_request_line),
+        "prepare_request_line": measure_time(
+            lambda: instance.prepare_request_line(BATTERY_INFO_DISCHARGED)
+        ),
+    }
+
+
+def benchmark_configuration_io() -> Dict[str, float]:
+    """Loading and dumping of the configuration file"""
+    instance = make_instance()
+    with tempfile.TemporaryDirectory() as temporary_dirpath:
+        dump_path = os.path.join(temporary_dirpath, "configuration.yml")
+
+        def round_trip():
+            instance.to_configuration_file(dump_path)
+            BatteryHandyman.from_configuration_file(dump_path)
+
+        configuration_cache = ConfigurationCache(
+            os.path.join(temporary_dirpath, "configuration_cache.marshal")
+        )
+        BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT, configuration_cache)
+
+        return {
+            "from_configuration_file": measure_time(
+                lambda: BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+            ),
+            "from_configuration_file_cached": measure_time(
+                lambda: BatteryHandyman.from_configuration_file(
+                    CONFIG_PATH_DEFAULT, configuration_cache
+                )
+            ),
+            "configuration_round_trip": measure_time(round_trip),
+        }
+
+
+def benchmark_import(repeat: int = 5) -> Dict[str, float]:
+    """The import of the package by a fresh interpreter"""
+    code = (
+        "import time; start = time.perf_counter(); import battery_handyman;"
+        " print(time.perf_counter() - start)"
+    )
+    import_time_list = []
+    for _ in range(repeat):
+        completed_process = subprocess.run(
+            [sys.executable, "-c", code], cwd=REPOSITORY_DIRPATH,
+            stdout=subprocess.PIPE, check=True,
+        )
+        import_time_list.append(float(completed_process.stdout))
+    return {"import": min(import_time_list)}
+
+
+def measure_process_time(args: List[str], repeat: int = 5) -> float:
+    """Returns the best wall time of the fresh interpreter run with `args` in seconds"""
+    run_time_list = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        subprocess.run(
+            [sys.executable] + args, cwd=REPOSITORY_DIRPATH,
+            stdout=subprocess.DEVNULL, check=True,
+        )
+        run_time_list.append(timeit.default_timer() - start)
+    return min(run_time_list)
+
+
+def benchmark_startup(repeat: int = 5) -> Dict[str, float]:
+    """The start of the CLI paths that exit without running the checks
+
+    The start of the bare interpreter is subtracted
+    so the results are the budget spent by the package itself
+    """
+    interpreter_time = measure_process_time(["-c", "pass"], repeat)
+    # The configuration cache of the user is not touched
+    with tempfile.TemporaryDirectory() as temporary_dirpath:
+        validate_args = [
+            "--validate",
+            "--config-cache-path", os.path.join(temporary_dirpath, "configuration_cache.marshal"),
+        ]
+        return {
+            f"startup_{name}": measure_process_time(["-m", "battery_handyman"] + args, repeat)
+            - interpreter_time
+            for name, args in (("help", ["--help"]), ("validate", validate_args))
+        }
+
+
+def benchmark_memory(instance_count: int = 100) -> Dict[str, float]:
+    """The memory allocated per instance"""
+    make_instance()  # The caches filled once per process are not counted
+    gc.collect()
+    tracemalloc.start()
+    try:
+        snapshot_before = tracemalloc.take_snapshot()
+        instances = [make_instance() for _ in range(instance_count)]
+        snapshot_after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocated_size = sum(
+        statistic.size_diff for statistic in snapshot_after.compare_to(snapshot_before, "filename")
+    )
+    del instances
+    return {"memory_per_instance": allocated_size / instance_count}
+
+
+BENCHMARK_LIST = [
+    benchmark_perform_check,
+    benchmark_request_line,
+    benchmark_configuration_io,
+    benchmark_import,
+    benchmark_startup,
+    benchmark_memory,
+]
+
+
+def run_benchmarks(name_filter: str = "") -> Dict[str, float]:
+    """Runs the benchmarks whose names contain `name_filter`"""
+    results = {}
+    for benchmark in BENCHMARK_LIST:
+        if name_filter in benchmark.__name__:
+            results.update(benchmark())
+    return results
+
+
+def compare_with_baseline(
+        results: Dict[str, float], baseline: Dict[str, float], tolerance: float
+) -> List[str]:
+    """Prints the comparison and returns the names of the regressed results"""
+    regression_list = []
+    for name, value in results.items():
+        baseline_value = baseline.get(name)
+        if baseline_value is None:
+            print(f"{name:30} {value:14.6g}  (no baseline)")
+            continue
+        ratio = value / baseline_value if baseline_value else float("inf")
+        is_regression = ratio > tolerance
+        if is_regression:
+            regression_list.append(name)
+        print(
+            f"{name:30} {value:14.6g}  baseline {baseline_value:14.6g}  x{ratio:.2f}"
+            + ("  REGRESSION" if is_regression else "")
+        )
+    return regression_list
+
+
+def main(args: List[str]) -> int:
+    """Runs the benchmarks and returns the exit code"""
+    parser = argparse.ArgumentParser(
+        description="Runs the benchmarks of battery_handyman",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("-b", "--baseline-path", default=BASELINE_PATH_DEFAULT)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Save the results as the baseline"
+    )
+    parser.add_argument(
+        "--compare", action="store_true",
+        help="Compare the results with the baseline and fail on a regression",
+    )
+    parser.add_argument("-t", "--tolerance", type=float, default=TOLERANCE_DEFAULT)
+    parser.add_argument(
+        "-k", "--filter", default="", help="Run only the benchmarks whose names contain it"
+    )
+    parsed_args = parser.parse_args(args)
+
+    results = run_benchmarks(parsed_args.filter)
+
+    baseline = {}
+    if parsed_args.compare and os.path.exists(parsed_args.baseline_path):
+        with open(parsed_args.baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+    regression_list = compare_with_baseline(results, baseline, parsed_args.tolerance)
+
+    if parsed_args.save_baseline:
+        with open(parsed_args.baseline_path, mode='w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+
+    if parsed_args.compare and regression_list:
+        print("Regressions:", ", ".join(regression_list))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
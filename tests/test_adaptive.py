@@ -0,0 +1,141 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/adaptive.py and the adaptive check interval"""
+import os.path
+import unittest.mock
+
+import pytest
+
+from battery_handyman.adaptive import ChargeRateEstimator
+from battery_handyman.simulation import (
+    ReplayBatterySource,
+    SimulatedBatteryHandyman,
+    TraceSample,
+)
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_DIR = "configurations"
+CONFIG_PATH_DEFAULT = os.path.join(CONFIG_DIR, "default_configuration.yml")
+
+SECONDS_IN_QUARTER_OF_DAY = 6 * 60 * 60
+
+
+def make_estimator(sample_list, history_size=8):
+    """Creates the estimator with the provided samples of `(timestamp, is_charging, percent)`"""
+    estimator = ChargeRateEstimator(history_size)
+    for timestamp, is_charging, left_in_percents in sample_list:
+        estimator.add_sample(timestamp, BatteryInfo(is_charging, left_in_percents))
+    return estimator
+
+
+@pytest.mark.parametrize(
+    "sample_list, expected_rate", [
+        pytest.param([(0, False, 50)], None, id="single_sample"),
+        pytest.param([(0, False, 50), (60, False, 49), (120, False, 48)], -1 / 60, id="discharge"),
+        pytest.param(
+            [(0, False, 50), (60, False, 49), (60, True, 49), (120, True, 50)],
+            1 / 60, id="reset_on_charging_change",
+        ),
+        # The line goes through (0, 50), (60, 49) and the latest (61, 49) only,
+        # with the samples of 1 and 2 seconds kept it would be -0.0168
+        pytest.param(
+            [(0, False, 50), (1, False, 50), (2, False, 50), (60, False, 49), (61, False, 49)],
+            -121 / 7322, id="repeated_samples_are_not_kept",
+        ),
+        pytest.param(
+            [(0, False, 50), (60, False, 50)], 0, id="unchanged_percentage",
+        ),
+    ]
+)
+def test_estimate_rate(sample_list, expected_rate):
+    """Tests the rate estimation"""
+    actual_result = make_estimator(sample_list).estimate_rate()
+    if expected_rate is None:
+        assert actual_result is None
+        return
+    assert actual_result == pytest.approx(expected_rate)
+
+
+@pytest.mark.parametrize(
+    "sample_list, threshold, expected_result", [
+        pytest.param([(0, False, 50), (60, False, 49)], 40, 9 * 60, id="approaching"),
+        pytest.param([(0, False, 50), (60, False, 49)], 90, None, id="moving_away"),
+        pytest.param([(0, False, 50), (60, False, 50)], 40, None, id="stalled"),
+        pytest.param(
+            [(0, False, 50), (60, False, 49), (200, False, 49)], 49, 0, id="already_passed",
+        ),
+    ]
+)
+def test_estimate_time_to(sample_list, threshold, expected_result):
+    """Tests the prediction of the threshold crossing time"""
+    actual_result = make_estimator(sample_list).estimate_time_to(threshold)
+    assert actual_result == pytest.approx(expected_result)
+
+
+@pytest.mark.parametrize(
+    "adaptive_check_interval, battery_info_list, expected_result", [
+        pytest.param(False, [], 1, id="disabled"),
+        pytest.param(True, [], 1, id="no_samples"),
+        pytest.param(True, [(False, 60), (False, 59)], 19 * 60 / 2, id="far_from_limit"),
+        pytest.param(True, [(False, 42), (False, 41)], 60 / 2, id="close_to_limit"),
+        pytest.param(True, [(True, 42), (True, 43)], 10 * 60, id="far_from_charged_limit"),
+        pytest.param(True, [(False, 39), (False, 38)], 1, id="beyond_limit"),
+        pytest.param(True, [(True, 41), (True, 40)], 10 * 60, id="moving_away"),
+    ]
+)
+def test_get_next_check_delay(adaptive_check_interval, battery_info_list, expected_result):
+    """Tests the bounds of the adaptive check interval
+
+    The samples are taken every 60 seconds,
+    the next check is performed after a half of the predicted time to the limit
+    """
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.adaptive_check_interval = adaptive_check_interval
+    for is_charging, left_in_percents in battery_info_list:
+        instance.record_battery_info(BatteryInfo(is_charging, left_in_percents))
+        instance.virtual_clock.sleep(60)
+    assert instance.get_next_check_delay() == pytest.approx(expected_result)
+
+
+def test_adaptive_check_interval_reduces_checks():
+    """Tests that the adaptive check interval keeps the requests but skips the useless checks"""
+    trace = []
+    is_charging, left_in_percents = False, 100
+    for timestamp in range(0, SECONDS_IN_QUARTER_OF_DAY + 1, 60):
+        trace.append(TraceSample(timestamp, BatteryInfo(is_charging, left_in_percents)))
+        if not is_charging and left_in_percents < 40:
+            is_charging = True
+        elif is_charging and left_in_percents > 90:
+            is_charging = False
+        left_in_percents += 1 if is_charging else -1
+
+    check_count_list, delivered_request_list_list = [], []
+    for adaptive_check_interval in (False, True):
+        instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+        instance.adaptive_check_interval = adaptive_check_interval
+        with unittest.mock.patch.object(
+                ReplayBatterySource, "read", autospec=True, side_effect=ReplayBatterySource.read
+        ) as read_mock:
+            delivered_request_list_list.append(instance.simulate(trace))
+        check_count_list.append(read_mock.call_count)
+
+    assert check_count_list[1] * 10 < check_count_list[0]
+    fixed_request_list, adaptive_request_list = delivered_request_list_list
+    assert len(adaptive_request_list) == len(fixed_request_list)
+    for (fixed_time, fixed_request), (adaptive_time, adaptive_request) in zip(
+            fixed_request_list, adaptive_request_list
+    ):
+        assert adaptive_request == fixed_request
+        assert adaptive_time - fixed_time < 1
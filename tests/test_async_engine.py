@@ -0,0 +1,223 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/async_engine.py"""
+import asyncio
+import os.path
+import threading
+import unittest.mock
+from contextlib import ExitStack as DoesNotRaise
+
+import pytest
+
+import battery_handyman.constants
+from battery_handyman.async_engine import (
+    AsyncBatteryHandyman,
+    AsyncBatteryHandymanFleet,
+    send_http_request,
+)
+from battery_handyman.util import BatteryInfo, ResponseStatus
+
+
+CONFIG_DIR = "configurations"
+CONFIG_PATH_DEFAULT = os.path.join(CONFIG_DIR, "default_configuration.yml")
+CONFIG_PATH_TASMOTA = os.path.join(CONFIG_DIR, "template_configuration_tasmota.yml")
+CONFIG_PATH_REACTIONS = os.path.join(CONFIG_DIR, "template_configuration_reactions.yml")
+
+
+async def run_with_stub_controller(status_line, coroutine_function):
+    """Runs `coroutine_function(port)` while the local server answers with `status_line`
+
+    Returns the result of the coroutine and the received request lines
+    """
+    received_request_line_list = []
+
+    async def handle_connection(reader, writer):
+        received_request_line_list.append((await reader.readline()).decode("latin-1").strip())
+        writer.write(status_line + b"\r\nContent-Length: 0\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle_connection, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        result = await coroutine_function(port)
+    finally:
+        server.close()
+        await server.wait_closed()
+    return result, received_request_line_list
+
+
+@pytest.mark.parametrize(
+    "status_line, expected_result, expectation", [
+        pytest.param(b"HTTP/1.1 200 OK", ResponseStatus(200, "OK"), DoesNotRaise(), id="ok"),
+        pytest.param(
+            b"HTTP/1.0 404 Not Found", ResponseStatus(404, "Not Found"), DoesNotRaise(),
+            id="not_found"
+        ),
+        pytest.param(b"HTTP/1.1 204", ResponseStatus(204, ""), DoesNotRaise(), id="no_reason"),
+        pytest.param(
+            b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 7",
+            ResponseStatus(503, "Service Unavailable", 7.0), DoesNotRaise(), id="retry_after"
+        ),
+        pytest.param(b"garbage", None, pytest.raises(ConnectionError), id="malformed"),
+    ]
+)
+def test_send_http_request(status_line, expected_result, expectation):
+    """Tests the request line sending and the status line parsing"""
+    with expectation:
+        actual_result, received_request_line_list = asyncio.run(run_with_stub_controller(
+            status_line,
+            lambda port: send_http_request("POST", f"http://127.0.0.1:{port}/cm?cmnd=Power%201"),
+        ))
+        assert actual_result == expected_result
+        assert received_request_line_list == ["POST /cm?cmnd=Power%201 HTTP/1.1"]
+
+
+def test_send_http_request_connection_error():
+    """Tests that the connection failure is raised as `OSError`"""
+    async def send_to_closed_port():
+        server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        await send_http_request("POST", f"http://127.0.0.1:{port}/power/1", connect_timeout=1)
+
+    with pytest.raises(OSError):
+        asyncio.run(send_to_closed_port())
+
+
+def test_from_configuration_file_keeps_class():
+    """Tests that the `!BatteryHandyman` configuration creates the asyncio instance"""
+    instance = AsyncBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    assert isinstance(instance, AsyncBatteryHandyman)
+    assert instance.request_template == "/power/{needs_charging}"
+
+
+@pytest.mark.parametrize(
+    "battery_info, expected_request_line_list", [
+        pytest.param(
+            BatteryInfo(is_charging=False, left_in_percents=1),
+            ["POST /power/1 HTTP/1.1"], id="discharged",
+        ),
+        pytest.param(
+            BatteryInfo(is_charging=False, left_in_percents=50), [], id="discharging",
+        ),
+    ]
+)
+def test_perform_check_async(battery_info, expected_request_line_list):
+    """Tests that the check sends the same request as the sched engine does"""
+    instance = AsyncBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=battery_info)
+    )
+
+    async def perform_check(port):
+        instance.remote_address = f"http://127.0.0.1:{port}"
+        await instance.perform_check_async()
+
+    _, received_request_line_list = asyncio.run(
+        run_with_stub_controller(b"HTTP/1.1 200 OK", perform_check)
+    )
+    assert received_request_line_list == expected_request_line_list
+
+
+
+def test_perform_check_async_reads_battery_outside_event_loop():
+    """Tests that the blocking reading of the battery does not block the event loop thread"""
+    instance = AsyncBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.remote_address = "http://127.0.0.1:1"
+    reading_thread_list = []
+
+    def read():
+        reading_thread_list.append(threading.current_thread())
+        return BatteryInfo(is_charging=False, left_in_percents=50)
+
+    instance.battery_source = unittest.mock.Mock(read=read)
+    asyncio.run(instance.perform_check_async())
+    assert len(reading_thread_list) == 1
+    assert reading_thread_list[0] is not threading.current_thread()
+
+def test_perform_check_async_with_reactions():
+    """Tests that every reaction sends its request and a failed one does not affect the others"""
+    instance = AsyncBatteryHandyman.from_configuration_file(CONFIG_PATH_REACTIONS)
+    instance.battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=BatteryInfo(is_charging=True, left_in_percents=95))
+    )
+    failed_reaction = AsyncBatteryHandyman.from_configuration_file(CONFIG_PATH_REACTIONS)
+
+    async def send_request_async(_):
+        raise RuntimeError
+
+    failed_reaction.send_request_async = send_request_async
+    failed_reaction.record_decision = unittest.mock.Mock()
+    instance.reactions.append(failed_reaction)
+
+    async def perform_check(port):
+        instance.remote_address = f"http://127.0.0.1:{port}"
+        instance.reactions[0].remote_address = f"http://127.0.0.1:{port}"
+        await instance.perform_check_async()
+
+    _, received_request_line_list = asyncio.run(
+        run_with_stub_controller(b"HTTP/1.1 200 OK", perform_check)
+    )
+    assert sorted(received_request_line_list) == [
+        "GET /battery?needs_charging=off HTTP/1.1", "POST /cm?cmnd=Power%200 HTTP/1.1",
+    ]
+    failed_reaction.record_decision.assert_called_once_with(
+        instance.battery_source.read.return_value,
+        battery_handyman.constants.DECISION_FAILED,
+    )
+
+
+def test_fleet_run_and_stop():
+    """Tests that the failed checks do not break the cycle and the fleet can be stopped"""
+    battery_source_read_mock = unittest.mock.Mock(
+        side_effect=[RuntimeError, BatteryInfo(is_charging=False, left_in_percents=50)] * 10,
+    )
+    fleet = AsyncBatteryHandymanFleet.from_configuration_paths(
+        [CONFIG_PATH_DEFAULT, CONFIG_PATH_TASMOTA]
+    )
+    for instance in fleet.instances:
+        instance.check_interval = 0.01
+        instance.battery_source = unittest.mock.Mock(read=battery_source_read_mock)
+
+    async def stop_later():
+        await asyncio.sleep(0.1)
+        fleet.stop()
+
+    async def run_fleet():
+        asyncio.get_running_loop().create_task(stop_later())
+        await asyncio.gather(*(instance.run() for instance in fleet.instances))
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run_fleet())
+    assert battery_source_read_mock.call_count > 2
+
+
+def test_pool_dispatch_mode_is_rejected():
+    """Tests that the requests cannot be passed to the worker threads by the asyncio engine"""
+    instance = AsyncBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    with pytest.raises(ValueError):
+        instance.dispatch_mode = battery_handyman.constants.DISPATCH_MODE_POOL
+    instance.dispatch_mode = battery_handyman.constants.DISPATCH_MODE_INLINE
+    assert instance.dispatch_mode == battery_handyman.constants.DISPATCH_MODE_INLINE
+
+
+def test_stop_while_run_is_finishing():
+    """Tests that the stop does not fail when the event loop is already forgotten"""
+    instance = AsyncBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    # `run` has cleared the event loop but not the task yet
+    instance._task = unittest.mock.Mock()  # pylint: disable=protected-access
+    instance.stop()
+    instance._task.cancel.assert_not_called()  # pylint: disable=protected-access
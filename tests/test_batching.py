@@ -0,0 +1,195 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/batching.py"""
+import os.path
+import threading
+import time
+import unittest.mock
+
+import pytest
+
+import battery_handyman.batching
+import battery_handyman.constants
+from battery_handyman.batching import CommandBatcher
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.dispatch import RequestDispatcher
+from battery_handyman.util import BatteryInfo, ResponseStatus
+
+
+CONFIG_PATH_TASMOTA = os.path.join("configurations", "template_configuration_tasmota.yml")
+THREAD_TIMEOUT = 5
+# Far beyond the duration of the test, the batches are sent by `flush`
+BATCH_WINDOW_LONG = 3600
+
+
+def wait_for(condition):
+    """Waits until `condition()` is true or the time is out"""
+    deadline = time.monotonic() + THREAD_TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_command_batcher_collects_commands():
+    """Tests that the commands of the window are sent once and every submitter gets the status"""
+    request_dispatcher = RequestDispatcher(worker_count=1)
+    batcher = CommandBatcher(request_dispatcher)
+    response_status = ResponseStatus(200, "OK")
+    deliver_batch = unittest.mock.Mock(return_value=response_status)
+    other_deliver_batch = unittest.mock.Mock(return_value=response_status)
+    handle_result_list = [unittest.mock.Mock() for _ in range(4)]
+    batcher.add("strip", "a", "Power1 1", 0.05, deliver_batch, handle_result_list[0])
+    batcher.add("strip", "b", "Power2 1", 0.05, other_deliver_batch, handle_result_list[1])
+    batcher.add("strip", "a", "Power1 0", 0.05, other_deliver_batch, handle_result_list[2])
+    batcher.add("strip", "c", "Power2 1", 0.05, other_deliver_batch, handle_result_list[3])
+    assert len(batcher) == 1
+    # The batch leaves the batcher before it is submitted to the dispatcher
+    wait_for(lambda: all(handle_result.called for handle_result in handle_result_list[1:]))
+    request_dispatcher.shutdown()
+
+    deliver_batch.assert_called_once_with(["Power1 0", "Power2 1"])
+    other_deliver_batch.assert_not_called()
+    handle_result_list[0].assert_not_called()
+    for handle_result in handle_result_list[1:]:
+        handle_result.assert_called_once_with(response_status)
+
+
+def test_command_batcher_isolates_failures():
+    """Tests that the failed batch is reported as the connection error to every submitter"""
+    request_dispatcher = RequestDispatcher(worker_count=1)
+    batcher = CommandBatcher(request_dispatcher)
+    handle_result = unittest.mock.Mock(side_effect=RuntimeError)
+    other_handle_result = unittest.mock.Mock()
+    deliver_batch = unittest.mock.Mock(side_effect=RuntimeError)
+    batcher.add("strip", "a", "Power1 1", BATCH_WINDOW_LONG, deliver_batch, handle_result)
+    batcher.add("strip", "b", "Power2 1", BATCH_WINDOW_LONG, deliver_batch, other_handle_result)
+    batcher.add("other", "a", "Power1 1", BATCH_WINDOW_LONG, deliver_batch, handle_result)
+    batcher.discard("a")
+    assert len(batcher) == 1
+    batcher.flush()
+    wait_for(lambda: other_handle_result.call_count == 1)
+    request_dispatcher.shutdown()
+
+    deliver_batch.assert_called_once_with(["Power2 1"])
+    other_handle_result.assert_called_once_with(None)
+    handle_result.assert_not_called()
+
+
+def test_dropped_batch_is_reported_as_connection_error():
+    """Tests that every submitter of the batch dropped from the full queue gets `None`"""
+    request_dispatcher = RequestDispatcher(worker_count=1, queue_size=1)
+    batcher = CommandBatcher(request_dispatcher)
+    release_event = threading.Event()
+    request_dispatcher.submit("blocker", lambda: release_event.wait(THREAD_TIMEOUT))
+    wait_for(lambda: not len(request_dispatcher))
+    deliver_batch = unittest.mock.Mock(return_value=ResponseStatus(200, "OK"))
+    handle_result_list = [unittest.mock.Mock() for _ in range(2)]
+    batcher.add("strip", "a", "Power1 1", BATCH_WINDOW_LONG, deliver_batch, handle_result_list[0])
+    batcher.add("strip", "b", "Power2 1", BATCH_WINDOW_LONG, deliver_batch, handle_result_list[1])
+    batcher.flush()
+    wait_for(lambda: len(request_dispatcher) == 1)
+    request_dispatcher.submit("other", lambda: None)
+    release_event.set()
+    request_dispatcher.shutdown()
+
+    deliver_batch.assert_not_called()
+    for handle_result in handle_result_list:
+        handle_result.assert_called_once_with(None)
+
+
+def make_batching_instance(outlet):
+    """Creates the instance controlling the outlet of the Tasmota power strip by the batches"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_TASMOTA)
+    instance.request_template = f"/Power{outlet}%20{{needs_charging}}"
+    instance.batch_template = "/cm?cmnd=Backlog%20{commands}"
+    instance.batch_separator = "%3B%20"
+    instance.batch_window = BATCH_WINDOW_LONG
+    instance.command_confirm_timeout = 60
+    instance.battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=BatteryInfo(is_charging=True, left_in_percents=95))
+    )
+    instance.deliver_request = unittest.mock.Mock(return_value=ResponseStatus(200, "OK"))
+    return instance
+
+
+def test_batched_checks_send_one_request():
+    """Tests that the checks of the instances with the same controller send one request
+     and every instance treats its command as delivered"""
+    instance_list = [make_batching_instance(outlet) for outlet in (1, 2)]
+    delivered_event = threading.Event()
+    handle_delivery_result = instance_list[1].handle_delivery_result
+
+    def handle_last_delivery_result(*args):
+        handle_delivery_result(*args)
+        delivered_event.set()
+
+    instance_list[0].handle_delivery_result = unittest.mock.Mock(
+        wraps=instance_list[0].handle_delivery_result
+    )
+    instance_list[1].handle_delivery_result = handle_last_delivery_result
+    for instance in instance_list:
+        assert instance.send_request(instance.battery_source.read()) == (
+            battery_handyman.constants.DECISION_DISPATCHED
+        )
+    battery_handyman.batching.COMMAND_BATCHER.flush()
+    assert delivered_event.wait(THREAD_TIMEOUT)
+    for instance in instance_list:
+        instance.stop()
+
+    instance_list[0].deliver_request.assert_called_once_with(
+        "http://127.0.0.1/cm?cmnd=Backlog%20Power1%200%3B%20Power2%200"
+    )
+    instance_list[1].deliver_request.assert_not_called()
+    instance_list[0].handle_delivery_result.assert_called_once()
+    assert instance_list[0].is_command_duplicate("http://127.0.0.1/Power1%200")
+    assert instance_list[1].is_command_duplicate("http://127.0.0.1/Power2%200")
+
+
+def test_stop_discards_not_sent_command():
+    """Tests that the stopped instance does not send its command"""
+    instance = make_batching_instance(1)
+    instance.send_request(instance.battery_source.read())
+    instance.stop()
+    battery_handyman.batching.COMMAND_BATCHER.flush()
+    time.sleep(0.1)
+    instance.deliver_request.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "batch_template", [
+        pytest.param("/cm?cmnd=Backlog", id="no_placeholder"),
+        pytest.param("/cm?cmnd={needs_charging}", id="other_placeholder"),
+        pytest.param("cm?cmnd=Backlog%20{commands}", id="no_leading_slash"),
+    ]
+)
+def test_batch_template_validation(batch_template):
+    """Tests that the batch template must be a path with the only `{commands}` placeholder"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_TASMOTA)
+    with pytest.raises(ValueError):
+        instance.batch_template = batch_template
+
+
+def test_batch_config_round_trip():
+    """Tests that only the not default batch settings are dumped and they are loaded back"""
+    instance = make_batching_instance(1)
+    remote_request_config = instance.to_config_dict_mapping()["remote_request_config"]
+    assert remote_request_config["batch_template"] == "/cm?cmnd=Backlog%20{commands}"
+    assert remote_request_config["batch_window"] == BATCH_WINDOW_LONG
+
+    another_instance = BatteryHandyman.__new__(BatteryHandyman)
+    another_instance.init_from_config_dict_mapping(instance.to_config_dict_mapping())
+    assert another_instance.to_config_dict_mapping() == instance.to_config_dict_mapping()
+    assert "batch_template" not in BatteryHandyman.from_configuration_file(
+        CONFIG_PATH_TASMOTA
+    ).to_config_dict_mapping()["remote_request_config"]
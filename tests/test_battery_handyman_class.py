@@ -16,7 +16,9 @@ import filecmp
 import os.path
 import random
 import re
+import sched
 import tempfile
+import threading
 import time
 import unittest.mock
 from argparse import Namespace
@@ -26,7 +28,8 @@ import pytest
 import requests.exceptions
 import yaml
 
-from battery_handyman.util import DoNotToogleChargingException
+import battery_handyman.constants
+from battery_handyman.util import BatteryInfo, DoNotToogleChargingException, ResponseStatus
 from battery_handyman.battery_handyman_class import (
     BatteryHandyman,
     common_only_battery_limit_property_setter_routine,
@@ -35,6 +38,9 @@ from battery_handyman.battery_handyman_class import (
 
 CONFIG_DIR = "configurations"
 CONFIG_PATH_DEFAULT = os.path.join(CONFIG_DIR, "default_configuration.yml")
+CONFIG_PATH_REACTIONS = os.path.join(CONFIG_DIR, "template_configuration_reactions.yml")
+# Far beyond the duration of the test
+THREAD_TIMEOUT = 5
 
 
 def test_common_only_battery_limit_property_setter_routine():
@@ -102,7 +108,7 @@ def default_battery_handyman_instance_fixture():
         ),
     ]
 )
-@unittest.mock.patch('requests.request')
+@unittest.mock.patch('requests.Session.request')
 # The arg order: mock, from the parametrization, the fixtures
 def test_send_request_with_mock(
         requests_request_mock,
@@ -124,12 +130,190 @@ def test_send_request_with_mock(
     requests_request_mock.assert_called_once_with(
         default_battery_handyman_instance.request_method,
         default_battery_handyman_instance.remote_address + expected_url_path,
+        timeout=(
+            default_battery_handyman_instance.connect_timeout,
+            default_battery_handyman_instance.read_timeout,
+        ),
     )
 
 
+@unittest.mock.patch('requests.request')
+def test_send_request_without_connection_pool(
+        requests_request_mock, default_battery_handyman_instance
+):
+    """Tests that the connections are not kept with the disabled connection pool"""
+    requests_request_mock.return_value = unittest.mock.Mock(status_code=200, reason="OK")
+    default_battery_handyman_instance.connection_pool_size = 0
+    with unittest.mock.patch('requests.Session.request') as session_request_mock:
+        default_battery_handyman_instance.send_request(
+            Namespace(is_charging=False, left_in_percents=1)
+        )
+    session_request_mock.assert_not_called()
+    requests_request_mock.assert_called_once_with(
+        default_battery_handyman_instance.request_method,
+        default_battery_handyman_instance.remote_address + "/power/1",
+        timeout=(
+            default_battery_handyman_instance.connect_timeout,
+            default_battery_handyman_instance.read_timeout,
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "check_list, expected_sent_flag_list", [
+        pytest.param(
+            [(0, False, 1, 200), (10, False, 2, 200), (61, False, 3, 200)],
+            [True, False, True],
+            id="repeated_after_timeout",
+        ),
+        pytest.param(
+            [(0, False, 1, 200), (10, True, 2, 200), (20, False, 3, 200)],
+            [True, None, True],
+            id="repeated_after_confirmation",
+        ),
+        pytest.param(
+            [(0, False, 1, 404), (10, False, 2, 200), (20, False, 3, 200)],
+            [True, True, False],
+            id="repeated_after_failure",
+        ),
+        pytest.param(
+            [(0, False, 1, 200), (10, True, 100, 200)],
+            [True, True],
+            id="another_command",
+        ),
+    ]
+)
+@unittest.mock.patch('requests.Session.request')
+def test_send_request_suppresses_duplicates(
+        requests_request_mock, check_list, expected_sent_flag_list,
+        default_battery_handyman_instance,
+):
+    """Tests that the delivered command is not sent again until it is confirmed or expired
+
+    `None` in `expected_sent_flag_list` means that the charging must not be toggled
+    """
+    clock = unittest.mock.Mock(return_value=0)
+    default_battery_handyman_instance.scheduler = sched.scheduler(clock, time.sleep)
+    default_battery_handyman_instance.command_confirm_timeout = 60
+
+    for (check_time, is_charging, left_in_percents, status_code), expected_sent_flag in zip(
+            check_list, expected_sent_flag_list
+    ):
+        clock.return_value = check_time
+        requests_request_mock.reset_mock()
+        requests_request_mock.return_value = unittest.mock.Mock(
+            status_code=status_code, reason="Test",
+        )
+        with (
+                pytest.raises(DoNotToogleChargingException)
+                if expected_sent_flag is None else DoesNotRaise()
+        ):
+            default_battery_handyman_instance.send_request(
+                Namespace(is_charging=is_charging, left_in_percents=left_in_percents)
+            )
+        assert requests_request_mock.called == bool(expected_sent_flag)
+
+
+def prepare_request_line_without_decision_table(battery_handyman_instance, battery_info):
+    """The reference implementation of `prepare_request_line`"""
+    try:
+        return battery_handyman_instance.render_request_line(
+            battery_handyman_instance.extract_request_data(battery_info)
+        )
+    except DoNotToogleChargingException:
+        return None
+
+
 @pytest.mark.parametrize(
     "config_path", [
         pytest.param(CONFIG_PATH_DEFAULT, id="default_config"),
+        pytest.param(os.path.join(CONFIG_DIR, "template_configuration_tasmota.yml"), id="tasmota"),
+    ]
+)
+def test_decision_table_matches_direct_rendering(config_path):
+    """Tests that the decision table gives the same results as the direct rendering"""
+    battery_handyman_instance = BatteryHandyman.from_configuration_file(config_path)
+    for left_in_percents in (0, 1, 39, 40, 41, 50.0, 89, 90, 91, 100, 39.5, 90.5, 101):
+        for is_charging in (False, True):
+            battery_info = BatteryInfo(is_charging=is_charging, left_in_percents=left_in_percents)
+            try:
+                actual_result = battery_handyman_instance.prepare_request_line(battery_info)
+            except DoNotToogleChargingException:
+                actual_result = None
+            assert actual_result == prepare_request_line_without_decision_table(
+                battery_handyman_instance, battery_info
+            ), battery_info
+
+
+def test_decision_table_serves_fractional_percentages():
+    """Tests that the fractional readings away from the limits are taken from the decision table
+     and the ones between the integers around a limit are rendered directly"""
+    battery_handyman_instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    left_in_percents_list = [
+        0.5, 38.25, 39.5, 39.999, 40.001, 50.5, 89.999, 90.0, 90.25, 90.999, 99.5,
+    ]
+    expected_result_mapping = {
+        (is_charging, left_in_percents): prepare_request_line_without_decision_table(
+            battery_handyman_instance, BatteryInfo(is_charging, left_in_percents)
+        )
+        for is_charging in (False, True) for left_in_percents in left_in_percents_list
+    }
+    with unittest.mock.patch.object(
+            battery_handyman_instance, "extract_request_data",
+            wraps=battery_handyman_instance.extract_request_data,
+    ) as extract_request_data_mock:
+        for (is_charging, left_in_percents), expected_result in expected_result_mapping.items():
+            try:
+                actual_result = battery_handyman_instance.prepare_request_line(
+                    BatteryInfo(is_charging, left_in_percents)
+                )
+            except DoNotToogleChargingException:
+                actual_result = None
+            assert actual_result == expected_result, (is_charging, left_in_percents)
+    # Only 39.5, 39.999 while discharging and 90.25, 90.999 while charging are around a limit
+    assert extract_request_data_mock.call_count == 4
+
+
+@pytest.mark.parametrize(
+    "property_name, property_value, battery_info, expected_url_path", [
+        pytest.param(
+            "battery_limit_low", 60, BatteryInfo(is_charging=False, left_in_percents=50),
+            "/power/1", id="battery_limit_low",
+        ),
+        pytest.param(
+            "battery_limit_charged", 60, BatteryInfo(is_charging=True, left_in_percents=70),
+            "/power/0", id="battery_limit_charged",
+        ),
+        pytest.param(
+            "request_template", "/relay/{needs_charging}",
+            BatteryInfo(is_charging=False, left_in_percents=1), "/relay/1", id="request_template",
+        ),
+        pytest.param(
+            "request_data_mapping", {"needs_charging": {True: "on", False: "off"}},
+            BatteryInfo(is_charging=False, left_in_percents=1), "/power/on",
+            id="request_data_mapping",
+        ),
+    ]
+)
+def test_decision_table_is_rebuilt(
+        property_name, property_value, battery_info, expected_url_path,
+        default_battery_handyman_instance,
+):
+    """Tests that the decision table follows the changes of the properties"""
+    # The decision table is built here
+    try:
+        default_battery_handyman_instance.prepare_request_line(battery_info)
+    except DoNotToogleChargingException:
+        pass
+    setattr(default_battery_handyman_instance, property_name, property_value)
+    actual_result = default_battery_handyman_instance.prepare_request_line(battery_info)
+    assert actual_result == default_battery_handyman_instance.remote_address + expected_url_path
+
+
+@pytest.mark.parametrize(
+    "config_path", [
+        pytest.param(CONFIG_PATH_DEFAULT, id="default_config"),
+        pytest.param(CONFIG_PATH_REACTIONS, id="reactions"),
     ]
 )
 def test_battery_handyman_load_and_dump(config_path):
@@ -160,6 +344,140 @@ def test_battery_handyman_load_and_dump(config_path):
         assert dump_content == config_content
 
 
+@pytest.mark.parametrize(
+    "config_path", [
+        pytest.param(CONFIG_PATH_DEFAULT, id="default_config"),
+        pytest.param(os.path.join(CONFIG_DIR, "template_configuration_tasmota.yml"), id="tasmota"),
+        pytest.param(CONFIG_PATH_REACTIONS, id="reactions"),
+    ]
+)
+def test_battery_handyman_attributes_are_in_slots(config_path):
+    """The instance dictionary is not used for the own attributes, see `__slots__`"""
+    battery_handyman_instance = BatteryHandyman.from_configuration_file(config_path)
+    assert vars(battery_handyman_instance) == {}
+
+
+def make_reactions_instance(deliver_request):
+    """Creates the instance with two reactions to the charged battery,
+     `deliver_request` is used by both of them"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_REACTIONS)
+    instance.battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=BatteryInfo(is_charging=True, left_in_percents=95))
+    )
+    instance.deliver_request = unittest.mock.Mock(side_effect=deliver_request)
+    instance.reactions[0].deliver_request = unittest.mock.Mock(side_effect=deliver_request)
+    return instance
+
+
+def test_reactions_are_performed_concurrently():
+    """Tests that every reaction sends its own request while the others are being sent"""
+    barrier = threading.Barrier(2, timeout=THREAD_TIMEOUT)
+
+    def deliver_request(_):
+        # Both requests must be in progress at the same time to pass the barrier
+        barrier.wait()
+        return ResponseStatus(200, "OK")
+
+    instance = make_reactions_instance(deliver_request)
+    reaction = instance.reactions[0]
+    stage_hook = unittest.mock.Mock()
+    instance.add_stage_hook(stage_hook)
+    instance.perform_check()
+    instance.stop()
+
+    instance.deliver_request.assert_called_once_with("http://127.0.0.1/cm?cmnd=Power%200")
+    reaction.deliver_request.assert_called_once_with(
+        "http://127.0.0.2:8080/battery?needs_charging=off"
+    )
+    reaction_call_args_list = [
+        call_args for call_args in stage_hook.call_args_list if call_args[0][1] == "reaction"
+    ]
+    assert len(reaction_call_args_list) == 1
+    assert reaction_call_args_list[0][0][0] is reaction
+    assert stage_hook.call_args_list[-1][0][1] == "check"
+
+
+def test_failed_reaction_does_not_affect_others():
+    """Tests that the exception of a reaction is counted as its failure only"""
+    instance = make_reactions_instance(lambda _: ResponseStatus(200, "OK"))
+    reaction = instance.reactions[0]
+    reaction.deliver_request.side_effect = RuntimeError
+    reaction.record_decision = unittest.mock.Mock()
+    instance.record_decision = unittest.mock.Mock()
+    instance.perform_check()
+    instance.stop()
+
+    instance.record_decision.assert_called_once_with(
+        instance.battery_source.read.return_value, battery_handyman.constants.DECISION_SENT
+    )
+    reaction.record_decision.assert_called_once_with(
+        instance.battery_source.read.return_value, battery_handyman.constants.DECISION_FAILED
+    )
+
+
+def test_reactions_follow_instance():
+    """Tests that the limits and the scheduler of the instance are shared with the reactions"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_REACTIONS)
+    reaction = instance.reactions[0]
+    assert reaction.scheduler is instance.scheduler
+    instance.battery_limit_low = 30
+    instance.battery_limit_charged = 80
+    instance.scheduler = sched.scheduler()
+    assert (reaction.battery_limit_low, reaction.battery_limit_charged) == (30, 80)
+    assert reaction.scheduler is instance.scheduler
+
+
+def test_apply_configuration_replaces_changed_reactions():
+    """Tests that only the changed reactions are replaced, the unchanged ones are kept"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_REACTIONS)
+    reaction = instance.reactions[0]
+    config_dict_mapping = instance.to_config_dict_mapping()
+    remote_request_config_list = config_dict_mapping["remote_request_config"]
+    remote_request_config_list.append(
+        dict(remote_request_config_list[1], remote_address="http://127.0.0.3")
+    )
+    other = BatteryHandyman.from_configuration_file(CONFIG_PATH_REACTIONS)
+    other.init_from_config_dict_mapping(config_dict_mapping)
+    assert instance.apply_configuration(other)
+    assert instance.reactions[0] is reaction
+    assert instance.reactions[1] is other.reactions[1]
+    assert instance.reactions[1].scheduler is instance.scheduler
+
+    remote_request_config_list[1]["request_method"] = "POST"
+    other.init_from_config_dict_mapping(config_dict_mapping)
+    with unittest.mock.patch.object(reaction, "stop") as stop_mock:
+        assert instance.apply_configuration(other)
+    stop_mock.assert_called_once_with()
+    assert instance.reactions[0] is other.reactions[0]
+    assert instance.to_config_dict_mapping() == config_dict_mapping
+
+
+def test_empty_reaction_list_is_invalid():
+    """Tests that at least one reaction is required in the list form too"""
+    with pytest.raises(TypeError):
+        BatteryHandyman(remote_request_config=[])
+
+
+def test_battery_source_is_obtained_by_first_reading():
+    """Tests that the loading of the configuration does not access the battery"""
+    battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=BatteryInfo(True, 50))
+    )
+    with unittest.mock.patch(
+            "battery_handyman.battery_source.get_battery_source", return_value=battery_source
+    ) as get_battery_source_mock:
+        instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+        instance.battery_source_name = battery_handyman.constants.BATTERY_SOURCE_SYSFS
+        get_battery_source_mock.assert_not_called()
+        assert instance.read_battery_info() == (True, 50)
+        instance.read_battery_info()
+    get_battery_source_mock.assert_called_once_with(
+        battery_handyman.constants.BATTERY_SOURCE_SYSFS
+    )
+    with pytest.raises(ValueError):
+        instance.battery_source_name = "absent"
+
+
 @pytest.mark.slow
 @pytest.mark.parametrize(
     "config_path, test_check_interval", [
@@ -0,0 +1,106 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/battery_source.py"""
+import os
+
+import pytest
+
+import battery_handyman.battery_source
+from battery_handyman.battery_source import (
+    PsutilBatterySource,
+    SysfsBatterySource,
+    create_battery_source,
+)
+
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "pread"), reason="sysfs requires os.pread")
+
+
+def make_power_supply_dir(power_supply_dirpath, file_content_mapping):
+    """Creates the sysfs-like directory with the provided attribute files"""
+    for relative_path, content in file_content_mapping.items():
+        filepath = power_supply_dirpath / relative_path
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.write_text(content + "\n")
+
+
+@pytest.mark.parametrize(
+    "file_content_mapping, expected_charging, expected_left_in_percents", [
+        pytest.param(
+            {"BAT0/capacity": "42", "BAT0/status": "Discharging", "AC/online": "1"},
+            True, 42, id="capacity_and_ac",
+        ),
+        pytest.param(
+            {"BAT1/capacity": "42", "BAT0/capacity": "7", "BAT0/status": "Discharging"},
+            False, 7, id="first_battery_and_status",
+        ),
+        pytest.param(
+            {"BAT0/energy_now": "30", "BAT0/energy_full": "40", "BAT0/status": "Full"},
+            True, 75.0, id="energy",
+        ),
+        pytest.param(
+            {"BAT0/capacity": "42", "BAT0/status": "Unknown"}, None, 42, id="unknown_status",
+        ),
+    ]
+)
+def test_sysfs_battery_source(
+        tmp_path, file_content_mapping, expected_charging, expected_left_in_percents
+):
+    """Tests that the sysfs attributes are interpreted like psutil does"""
+    make_power_supply_dir(tmp_path, file_content_mapping)
+    battery_source = SysfsBatterySource(str(tmp_path))
+    try:
+        actual_result = battery_source.read()
+    finally:
+        battery_source.close()
+    assert actual_result.is_charging is expected_charging
+    assert actual_result.left_in_percents == expected_left_in_percents
+
+
+def test_sysfs_battery_source_rereads_opened_files(tmp_path):
+    """Tests that the changed values are read without reopening the files"""
+    make_power_supply_dir(tmp_path, {"BAT0/capacity": "42", "AC0/online": "0"})
+    battery_source = SysfsBatterySource(str(tmp_path))
+    try:
+        assert battery_source.read() == (False, 42)
+        make_power_supply_dir(tmp_path / "BAT0", {"capacity": "43"})
+        # The file is rewritten in place so the opened descriptor sees the new content
+        assert battery_source.read() == (False, 43)
+    finally:
+        battery_source.close()
+
+
+@pytest.mark.parametrize(
+    "file_content_mapping", [
+        pytest.param({"AC/online": "1"}, id="no_battery"),
+        pytest.param({"BAT0/status": "Full"}, id="no_charge_level"),
+    ]
+)
+def test_sysfs_battery_source_not_found(tmp_path, file_content_mapping):
+    """Tests that the absence of the battery is reported on the creation"""
+    make_power_supply_dir(tmp_path, file_content_mapping)
+    with pytest.raises(FileNotFoundError):
+        SysfsBatterySource(str(tmp_path))
+
+
+def test_create_battery_source(monkeypatch):
+    """Tests the creation by name and the fallback of the automatic choice"""
+    def raise_not_found():
+        raise FileNotFoundError
+
+    assert isinstance(create_battery_source("psutil"), PsutilBatterySource)
+    monkeypatch.setattr(battery_handyman.battery_source, "SysfsBatterySource", raise_not_found)
+    assert isinstance(create_battery_source("auto"), PsutilBatterySource)
+    with pytest.raises(ValueError):
+        create_battery_source("absent")
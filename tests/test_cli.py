@@ -19,10 +19,54 @@ import pytest
 import battery_handyman.cli
 
 
+DEFAULT_PARSED_ARGS = {
+    "config_path": "default_configuration.yml",
+    "fleet_path": None,
+    "engine": "sched",
+    "metrics_address": None,
+    "control_socket": None,
+    "log_level": "WARNING",
+    "log_format": "text",
+    "log_file": None,
+    "log_queue": False,
+    "log_rate_limit": 0,
+    "config_cache_path": None,
+    "validate": False,
+}
+
+
+def make_parsed_args(**non_default_parsed_args) -> Namespace:
+    """Creates the expected parsing result that differs from the default one only as provided"""
+    return Namespace(**{**DEFAULT_PARSED_ARGS, **non_default_parsed_args})
+
+
 @pytest.mark.parametrize(
     "cli_args, expected_result", [
-        pytest.param([], Namespace(config_path="default_configuration.yml")),
-        pytest.param(["--config-path", "absent.yml"], Namespace(config_path="absent.yml")),
+        pytest.param([], make_parsed_args()),
+        pytest.param(["--config-path", "absent.yml"], make_parsed_args(config_path="absent.yml")),
+        pytest.param(
+            ["-f", "fleet", "-f", "template_configuration_tasmota.yml"],
+            make_parsed_args(fleet_path=["fleet", "template_configuration_tasmota.yml"]),
+        ),
+        pytest.param(["--engine", "asyncio"], make_parsed_args(engine="asyncio")),
+        pytest.param(["-m", "9101"], make_parsed_args(metrics_address="9101")),
+        pytest.param(["--validate"], make_parsed_args(validate=True)),
+        pytest.param(
+            ["--control-socket", "control.sock"], make_parsed_args(control_socket="control.sock"),
+        ),
+        pytest.param(
+            ["--log-level", "DEBUG", "--log-format", "json", "--log-file", "battery.log"],
+            make_parsed_args(log_level="DEBUG", log_format="json", log_file="battery.log"),
+        ),
+        pytest.param(
+            ["--log-queue", "--log-rate-limit", "5"],
+            make_parsed_args(log_queue=True, log_rate_limit=5),
+        ),
+        pytest.param(["--config-cache-path"], make_parsed_args(config_cache_path="")),
+        pytest.param(
+            ["--config-cache-path", "cache.marshal"],
+            make_parsed_args(config_cache_path="cache.marshal"),
+        ),
     ]
 )
 def test_setup_parser(cli_args, expected_result):
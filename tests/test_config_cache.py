@@ -0,0 +1,160 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/config_cache.py"""
+import datetime
+import os
+import os.path
+import shutil
+import unittest.mock
+
+import pytest
+import yaml
+
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.config_cache import (
+    ConfigurationCache, get_default_cache_filepath, get_file_signature
+)
+from battery_handyman.fleet import BatteryHandymanFleet
+
+
+CONFIG_DIR = "configurations"
+CONFIG_PATH_DEFAULT = os.path.join(CONFIG_DIR, "default_configuration.yml")
+CONFIG_PATH_TASMOTA = os.path.join(CONFIG_DIR, "template_configuration_tasmota.yml")
+
+
+@pytest.fixture(name="config_path")
+def fixture_config_path(tmp_path):
+    """A copy of the default configuration that the tests can change"""
+    config_path = str(tmp_path / "configuration.yml")
+    shutil.copyfile(CONFIG_PATH_DEFAULT, config_path)
+    return config_path
+
+
+def test_configuration_cache_round_trip(tmp_path, config_path):
+    """Tests that the saved entries are read by another cache and the changed file is a miss"""
+    cache_path = str(tmp_path / "cache" / "configuration_cache.marshal")
+    config_dict_mapping = {"check_config": {"check_interval": 5}}
+    configuration_cache = ConfigurationCache(cache_path)
+    signature = get_file_signature(config_path)
+    assert configuration_cache.get(signature) is None
+    configuration_cache.put(signature, config_dict_mapping)
+    configuration_cache.save()
+
+    another_configuration_cache = ConfigurationCache(cache_path)
+    assert len(another_configuration_cache) == 1
+    assert another_configuration_cache.get(signature) == config_dict_mapping
+
+    with open(config_path, mode='a') as config_file:
+        config_file.write("\n")
+    assert another_configuration_cache.get(get_file_signature(config_path)) is None
+
+
+def test_configuration_cache_saves_only_changes(tmp_path):
+    """Tests that the cache without new entries does not write the file"""
+    cache_path = str(tmp_path / "configuration_cache.marshal")
+    ConfigurationCache(cache_path).save()
+    assert not os.path.exists(cache_path)
+
+
+def test_configuration_cache_skips_unsupported_values(tmp_path):
+    """Tests that the values `marshal` does not support are not cached"""
+    configuration_cache = ConfigurationCache(str(tmp_path / "configuration_cache.marshal"))
+    configuration_cache.put(("path", 0, 0), {"check_config": {"date": datetime.date.today()}})
+    assert len(configuration_cache) == 0
+
+
+@pytest.mark.parametrize(
+    "cache_content", [
+        pytest.param(b"", id="empty"),
+        pytest.param(b"not marshal", id="garbage"),
+        pytest.param(None, id="another_version"),
+    ]
+)
+def test_configuration_cache_ignores_invalid_file(tmp_path, cache_content):
+    """Tests that the corrupted or outdated cache file is treated as the empty cache"""
+    cache_path = str(tmp_path / "configuration_cache.marshal")
+    if cache_content is None:
+        configuration_cache = ConfigurationCache(cache_path)
+        configuration_cache.put(("path", 0, 0), {})
+        with unittest.mock.patch.object(
+                ConfigurationCache, "get_header", return_value=(0, (2, 7))
+        ):
+            configuration_cache.save()
+    else:
+        with open(cache_path, mode='wb') as cache_file:
+            cache_file.write(cache_content)
+    assert len(ConfigurationCache(cache_path)) == 0
+
+
+def test_get_default_cache_filepath_respects_xdg(tmp_path):
+    """Tests the location of the default cache file"""
+    with unittest.mock.patch.dict(os.environ, {"XDG_CACHE_HOME": str(tmp_path)}):
+        assert get_default_cache_filepath().startswith(
+            os.path.join(str(tmp_path), "battery_handyman")
+        )
+
+
+@pytest.mark.parametrize(
+    "source_config_path", [
+        pytest.param(CONFIG_PATH_DEFAULT, id="default_config"),
+        pytest.param(CONFIG_PATH_TASMOTA, id="tasmota"),
+    ]
+)
+def test_from_configuration_file_uses_cache(tmp_path, source_config_path):
+    """Tests that the cached configuration is not parsed and gives the same instance"""
+    config_path = str(tmp_path / "configuration.yml")
+    shutil.copyfile(source_config_path, config_path)
+    cache_path = str(tmp_path / "configuration_cache.marshal")
+    configuration_cache = ConfigurationCache(cache_path)
+    parsed_instance = BatteryHandyman.from_configuration_file(config_path, configuration_cache)
+    configuration_cache.save()
+
+    with unittest.mock.patch("yaml.load") as yaml_load_mock:
+        cached_instance = BatteryHandyman.from_configuration_file(
+            config_path, ConfigurationCache(cache_path)
+        )
+    yaml_load_mock.assert_not_called()
+    assert cached_instance.to_config_dict_mapping() == parsed_instance.to_config_dict_mapping()
+
+
+def test_from_configuration_file_caches_tagged_configuration(tmp_path):
+    """Tests the configuration file with the `!BatteryHandyman` tag"""
+    config_path = str(tmp_path / "configuration.yml")
+    BatteryHandyman.from_configuration_file(CONFIG_PATH_TASMOTA).to_configuration_file(config_path)
+    configuration_cache = ConfigurationCache(str(tmp_path / "configuration_cache.marshal"))
+    parsed_instance = BatteryHandyman.from_configuration_file(config_path, configuration_cache)
+    assert (
+        configuration_cache.get(get_file_signature(config_path))
+        == parsed_instance.to_config_dict_mapping()
+    )
+
+
+def test_from_configuration_file_does_not_cache_invalid(tmp_path, config_path):
+    """Tests that the invalid configuration is parsed and reported every time"""
+    with open(config_path, mode='w') as config_file:
+        yaml.safe_dump({"check_config": {"unknown_key": 1}}, config_file)
+    configuration_cache = ConfigurationCache(str(tmp_path / "configuration_cache.marshal"))
+    with pytest.raises(ValueError):
+        BatteryHandyman.from_configuration_file(config_path, configuration_cache)
+    assert len(configuration_cache) == 0
+
+
+def test_fleet_from_configuration_paths_fills_cache(tmp_path):
+    """Tests that the fleet caches every configuration file"""
+    configuration_cache = ConfigurationCache(str(tmp_path / "configuration_cache.marshal"))
+    fleet = BatteryHandymanFleet.from_configuration_paths(
+        [CONFIG_PATH_DEFAULT, CONFIG_PATH_TASMOTA], configuration_cache
+    )
+    assert len(fleet.instances) == 2
+    assert len(configuration_cache) == 2
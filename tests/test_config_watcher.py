@@ -0,0 +1,251 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/config_watcher.py"""
+import os
+import os.path
+import shutil
+import struct
+import threading
+import time
+import unittest.mock
+
+import pytest
+import yaml
+
+import battery_handyman.config_watcher
+import battery_handyman.constants
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.config_watcher import (
+    FakeConfigFileWatcher, InotifyConfigFileWatcher, PollingConfigFileWatcher,
+    load_inotify_functions, parse_inotify_events,
+)
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+# Far beyond the duration of the test
+CHECK_INTERVAL_LONG = 3600
+POLL_INTERVAL_LONG = 3600
+THREAD_TIMEOUT = 5
+
+
+def wait_for(condition):
+    """Waits until `condition()` is true or the time is out"""
+    deadline = time.monotonic() + THREAD_TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def rewrite_configuration(config_path, **battery_limit_config):
+    """Replaces the battery limits in the configuration file the way the editors do it"""
+    with open(config_path) as config_file:
+        config_dict_mapping = yaml.safe_load(config_file).to_config_dict_mapping()
+    config_dict_mapping[battery_handyman.constants.CONFIG_NAME_BATTERY_LIMIT].update(
+        battery_limit_config
+    )
+    temporary_path = config_path + ".tmp"
+    with open(temporary_path, mode='w') as config_file:
+        yaml.safe_dump(config_dict_mapping, config_file)
+    os.replace(temporary_path, config_path)
+
+
+@pytest.fixture(name="config_path")
+def fixture_config_path(tmp_path):
+    """A copy of the default configuration that the tests can change"""
+    config_path = str(tmp_path / "configuration.yml")
+    shutil.copyfile(CONFIG_PATH_DEFAULT, config_path)
+    return config_path
+
+
+def test_fake_config_file_watcher_subscription(config_path):
+    """Tests that only the subscribers of the changed file are called"""
+    watcher = FakeConfigFileWatcher()
+    failing_callback = unittest.mock.Mock(side_effect=RuntimeError)
+    callback = unittest.mock.Mock()
+    other_callback = unittest.mock.Mock()
+    watcher.subscribe(config_path, failing_callback)
+    watcher.subscribe(config_path, callback)
+    watcher.subscribe(CONFIG_PATH_DEFAULT, other_callback)
+    watcher.trigger(config_path)
+    watcher.unsubscribe(config_path, callback)
+    watcher.unsubscribe(config_path, callback)
+    watcher.trigger(config_path)
+
+    assert failing_callback.call_count == 2
+    assert callback.call_count == 1
+    other_callback.assert_not_called()
+
+
+def test_polling_config_file_watcher(config_path):
+    """Tests that a change is reported once and the absent file is reported after it appears"""
+    watcher = PollingConfigFileWatcher(poll_interval=POLL_INTERVAL_LONG)
+    callback = unittest.mock.Mock()
+    watcher.subscribe(config_path, callback)
+    try:
+        watcher.poll()
+        callback.assert_not_called()
+
+        rewrite_configuration(config_path, low=30)
+        watcher.poll()
+        watcher.poll()
+        assert callback.call_count == 1
+
+        os.unlink(config_path)
+        watcher.poll()
+        assert callback.call_count == 1
+        shutil.copyfile(CONFIG_PATH_DEFAULT, config_path)
+        watcher.poll()
+        assert callback.call_count == 2
+    finally:
+        watcher.unsubscribe(config_path, callback)
+
+
+def test_parse_inotify_events():
+    """Tests the parsing of the events with and without the names"""
+    data = (
+        struct.pack("iIII", 1, 0x8, 0, 16) + b"configuration\0\0\0"
+        + struct.pack("iIII", 2, 0x80, 7, 0)
+    )
+    assert parse_inotify_events(data) == [(1, 0x8, b"configuration"), (2, 0x80, b"")]
+
+
+@pytest.mark.skipif(load_inotify_functions() is None, reason="inotify is unavailable")
+def test_inotify_config_file_watcher(config_path):
+    """Tests that the writing and the replacing of the file are reported, other files are not"""
+    watcher = InotifyConfigFileWatcher(load_inotify_functions())
+    callback = unittest.mock.Mock()
+    watcher.subscribe(config_path, callback)
+    try:
+        with open(config_path, mode='a') as config_file:
+            config_file.write("\n")
+        wait_for(lambda: callback.call_count == 1)
+        rewrite_configuration(config_path, low=30)
+        wait_for(lambda: callback.call_count == 2)
+        with open(config_path + ".other", mode='w') as other_file:
+            other_file.write("\n")
+        time.sleep(0.1)
+        assert callback.call_count == 2
+    finally:
+        watcher.unsubscribe(config_path, callback)
+
+
+
+@pytest.mark.skipif(load_inotify_functions() is None, reason="inotify is unavailable")
+def test_inotify_thread_blocks_until_change_or_stop(config_path):
+    """Tests that the idle thread waits without a timeout and the stop wakes it up at once"""
+    watcher = InotifyConfigFileWatcher(load_inotify_functions())
+    callback = unittest.mock.Mock()
+    original_select = battery_handyman.config_watcher.select.select
+    with unittest.mock.patch.object(
+            battery_handyman.config_watcher.select, "select", side_effect=original_select
+    ) as select_mock:
+        watcher.subscribe(config_path, callback)
+        thread = watcher._thread  # pylint: disable=protected-access
+        inotify_descriptor = watcher._inotify_descriptor  # pylint: disable=protected-access
+        try:
+            rewrite_configuration(config_path, low=30)
+            wait_for(lambda: callback.call_count == 1)
+        finally:
+            watcher.stop()
+        thread.join(0.5)
+        assert not thread.is_alive()
+    # The other threads of the process may use `select` too
+    inotify_call_list = [
+        call for call in select_mock.call_args_list if inotify_descriptor in call[0][0]
+    ]
+    assert inotify_call_list
+    for call in inotify_call_list:
+        assert len(call[0]) == 3 and not call[1]
+
+def make_reloadable_instance(config_path):
+    """Creates an instance with the fake watcher, the long check interval
+     and the battery state not leading to the requests"""
+    instance = BatteryHandyman.from_configuration_file(config_path)
+    instance.check_interval = CHECK_INTERVAL_LONG
+    instance.config_file_watcher = FakeConfigFileWatcher()
+    instance.battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=BatteryInfo(is_charging=True, left_in_percents=50))
+    )
+    return instance
+
+
+def test_reload_configuration_applies_changes(config_path):
+    """Tests that only the changed properties are set and the runtime state is kept"""
+    instance = make_reloadable_instance(config_path)
+    scheduler = instance.scheduler
+    rewrite_configuration(config_path, charged=80, low=30)
+    with unittest.mock.patch.object(instance, "request_immediate_check") as check_mock:
+        assert instance.reload_configuration()
+    assert (instance.battery_limit_charged, instance.battery_limit_low) == (80, 30)
+    # The check interval has been changed by the test, not by the configuration file
+    assert instance.check_interval == battery_handyman.constants.CHECK_INTERVAL_IN_SECONDS_DEFAULT
+    assert instance.scheduler is scheduler
+    check_mock.assert_called_once_with()
+
+
+@pytest.mark.parametrize(
+    "config_content", [
+        pytest.param("battery_limit_config: {charged: 200}\n", id="invalid_value"),
+        pytest.param("battery_limit_config: [\n", id="invalid_yaml"),
+        pytest.param("", id="empty"),
+    ]
+)
+def test_reload_configuration_keeps_current_on_invalid(config_path, config_content):
+    """Tests that the invalid configuration is not applied"""
+    instance = make_reloadable_instance(config_path)
+    with open(config_path, mode='w') as config_file:
+        config_file.write(config_content)
+    assert not instance.reload_configuration()
+    assert instance.battery_limit_charged == 90
+
+
+def test_apply_configuration_rolls_back(config_path):
+    """Tests that the already set properties are restored if a property cannot be set"""
+    instance = make_reloadable_instance(config_path)
+    other = BatteryHandyman.from_configuration_file(config_path)
+    other.battery_limit_low = 30
+    other.request_method = "PUT"
+
+    def set_request_method(self, value):
+        raise ValueError(f"{value} is not supported")
+
+    with unittest.mock.patch.object(
+            BatteryHandyman, "request_method",
+            property(lambda self: self._request_method, set_request_method),
+    ):
+        assert not instance.apply_configuration(other)
+    assert instance.battery_limit_low == 40
+    assert instance.request_method == "POST"
+
+
+def test_configuration_change_is_applied_between_checks(config_path):
+    """Tests that the change reported by the watcher is applied by the scheduler thread
+     and is followed by the immediate check"""
+    instance = make_reloadable_instance(config_path)
+    instance.reload_on_change = True
+    instance.config_file_watcher = FakeConfigFileWatcher()
+    scheduler_thread = threading.Thread(target=instance.start)
+    scheduler_thread.start()
+    try:
+        wait_for(lambda: instance.battery_source.read.call_count == 1)
+        rewrite_configuration(config_path, low=30)
+        instance.config_file_watcher.trigger(config_path)
+        wait_for(lambda: instance.battery_source.read.call_count == 2)
+        assert instance.battery_limit_low == 30
+    finally:
+        instance.stop()
+        scheduler_thread.join(THREAD_TIMEOUT)
+    assert not scheduler_thread.is_alive()
+    assert len(instance.scheduler.queue) == 0
@@ -0,0 +1,220 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/control.py"""
+import json
+import os
+import os.path
+import socket
+import stat
+import threading
+import unittest.mock
+
+import pytest
+
+import battery_handyman.control
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.control import ControlServer, send_control_request, set_instance_properties
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_DIR = "configurations"
+CONFIG_PATH_DEFAULT = os.path.join(CONFIG_DIR, "default_configuration.yml")
+CONFIG_PATH_TASMOTA = os.path.join(CONFIG_DIR, "template_configuration_tasmota.yml")
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="Unix domain sockets are unavailable"
+)
+
+
+def rejecting_check_interval_setter(instance, value):
+    """Rejects the changes of `check_interval` of the instances with the configuration
+     of the Tasmota device"""
+    if instance.configuration_filepath == CONFIG_PATH_TASMOTA:
+        raise ValueError(f"The provided check interval ({value}) is rejected")
+    instance._check_interval = value  # pylint: disable=protected-access
+
+
+@pytest.fixture(name="control_server")
+def fixture_control_server(tmp_path):
+    """The started server of two instances, the first one has performed a check"""
+    instance_list = [
+        BatteryHandyman.from_configuration_file(config_path)
+        for config_path in (CONFIG_PATH_DEFAULT, CONFIG_PATH_TASMOTA)
+    ]
+    for instance in instance_list:
+        instance.battery_source = unittest.mock.Mock(
+            read=unittest.mock.Mock(
+                return_value=BatteryInfo(is_charging=True, left_in_percents=50)
+            )
+        )
+        instance.request_immediate_check = unittest.mock.Mock()
+    instance_list[0].perform_check()
+    instance_list[0].stop()
+    control_server = ControlServer(str(tmp_path / "control.sock"), instance_list)
+    control_server.start()
+    yield control_server
+    control_server.stop()
+
+
+def test_status(control_server):
+    """Tests the last check results of the instances"""
+    response = send_control_request(control_server.socket_path, {"command": "status"})
+    assert response["ok"]
+    first_status, second_status = response["result"]
+    assert first_status["last_battery_info"] == {"is_charging": True, "left_in_percents": 50}
+    assert first_status["last_decision"] == "keep"
+    assert first_status["configuration_filepath"] == CONFIG_PATH_DEFAULT
+    assert first_status["properties"]["battery_limit_charged"] == 90
+    assert second_status["last_battery_info"] is None
+    assert second_status["properties"]["check_interval"] == 120
+
+
+def test_set_and_check(control_server):
+    """Tests that the properties of the selected instance are changed and the check follows"""
+    first_instance, second_instance = control_server.instances
+    response = send_control_request(control_server.socket_path, {
+        "command": "set", "instance": 1,
+        "values": {"battery_limit_charged": 80, "check_interval": 30},
+    })
+    assert response == {"ok": True, "result": None}
+    assert (second_instance.battery_limit_charged, second_instance.check_interval) == (80, 30)
+    assert first_instance.battery_limit_charged == 90
+    second_instance.request_immediate_check.assert_called_once_with()
+
+    assert send_control_request(control_server.socket_path, {"command": "check"})["ok"]
+    first_instance.request_immediate_check.assert_called_once_with()
+    assert second_instance.request_immediate_check.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "request_object", [
+        pytest.param({"command": "reboot"}, id="unknown_command"),
+        pytest.param({"command": "status", "instance": 2}, id="unknown_instance"),
+        pytest.param({"command": "set", "values": {"remote_address": "x"}}, id="not_settable"),
+        pytest.param({"command": "set", "values": {"check_interval": "1"}}, id="wrong_type"),
+        pytest.param(
+            {"command": "set", "values": {"battery_limit_low": 30, "battery_limit_charged": 101}},
+            id="invalid_value",
+        ),
+        pytest.param(
+            {"command": "set", "values": {"battery_limit_low": 30, "retry_max_attempts": -1}},
+            id="negative_retry_attempts",
+        ),
+        pytest.param(
+            {"command": "set", "values": {"battery_limit_low": 30, "retry_max_attempts": 2.5}},
+            id="fractional_retry_attempts",
+        ),
+        pytest.param([], id="not_object"),
+    ]
+)
+def test_invalid_request(control_server, request_object):
+    """Tests that the invalid request is reported and changes nothing"""
+    response = send_control_request(control_server.socket_path, request_object)
+    assert not response["ok"]
+    assert response["error"]
+    assert [instance.battery_limit_low for instance in control_server.instances] == [40, 40]
+
+
+def test_set_is_rolled_back_for_all_instances(control_server):
+    """Tests that the value rejected by an instance is not left set in the other ones"""
+    first_instance, second_instance = control_server.instances
+    with unittest.mock.patch.object(
+            BatteryHandyman, "check_interval", property(
+                lambda instance: instance._check_interval,  # pylint: disable=protected-access
+                rejecting_check_interval_setter,
+            )
+    ):
+        response = send_control_request(control_server.socket_path, {
+            "command": "set", "values": {"battery_limit_low": 30, "check_interval": 30},
+        })
+    assert not response["ok"]
+    assert [instance.battery_limit_low for instance in control_server.instances] == [40, 40]
+    assert (first_instance.check_interval, second_instance.check_interval) == (1, 120)
+    first_instance.request_immediate_check.assert_not_called()
+    second_instance.request_immediate_check.assert_not_called()
+
+
+def test_set_is_applied_by_check_thread():
+    """Tests that the properties of the running instance are set by its check thread,
+     so they do not change during a check"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.check_interval = 3600
+    instance.battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=BatteryInfo(is_charging=True, left_in_percents=50))
+    )
+    setter_thread_list = []
+    original_replace_property_values = battery_handyman.control.replace_property_values
+
+    def replace_property_values(*args):
+        setter_thread_list.append(threading.current_thread())
+        return original_replace_property_values(*args)
+
+    check_thread = threading.Thread(target=instance.start, daemon=True)
+    check_thread.start()
+    try:
+        while instance.last_check_time is None:
+            check_thread.join(0.01)
+        with unittest.mock.patch(
+                "battery_handyman.control.replace_property_values", replace_property_values
+        ):
+            set_instance_properties([instance], {"battery_limit_low": 30})
+    finally:
+        instance.stop()
+        check_thread.join(5)
+    assert instance.battery_limit_low == 30
+    assert setter_thread_list == [check_thread]
+
+
+def test_several_requests_per_connection(control_server):
+    """Tests that the connection serves the requests until it is closed, the garbage included"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+        client_socket.connect(control_server.socket_path)
+        client_socket.sendall(b"not json\n" + json.dumps({"command": "metrics"}).encode() + b"\n")
+        with client_socket.makefile(mode='rb') as response_file:
+            first_response = json.loads(response_file.readline())
+            second_response = json.loads(response_file.readline())
+    assert not first_response["ok"]
+    assert "battery_handyman_checks_total" in second_response["result"]
+
+
+def test_socket_file(tmp_path, control_server):
+    """Tests that the socket is private, a running server keeps it and the stale one is replaced"""
+    assert stat.S_IMODE(os.stat(control_server.socket_path).st_mode) == 0o600
+    with pytest.raises(OSError):
+        ControlServer(control_server.socket_path, []).start()
+
+    stale_socket_path = str(tmp_path / "stale.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale_socket:
+        stale_socket.bind(stale_socket_path)
+    another_control_server = ControlServer(stale_socket_path, [])
+    another_control_server.start()
+    another_control_server.stop()
+    assert not os.path.exists(stale_socket_path)
+
+
+def test_main(control_server, capsys):
+    """Tests the CLI client"""
+    battery_handyman.control.main([
+        control_server.socket_path, "set", "battery_limit_low=35", "-i", "0",
+    ])
+    assert control_server.instances[0].battery_limit_low == 35
+    battery_handyman.control.main([control_server.socket_path, "status", "-i", "0"])
+    assert json.loads(capsys.readouterr().out)[0]["properties"]["battery_limit_low"] == 35
+
+    with pytest.raises(SystemExit):
+        battery_handyman.control.main([control_server.socket_path, "set", "-i", "0"])
+    with pytest.raises(SystemExit):
+        battery_handyman.control.main([
+            control_server.socket_path, "set", "battery_limit_low=101",
+        ])
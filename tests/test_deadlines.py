@@ -0,0 +1,143 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/deadlines.py"""
+import os.path
+import time
+
+import pytest
+
+import battery_handyman.metrics
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.deadlines import advance_deadline, align_deadline
+from battery_handyman.simulation import SimulatedBatteryHandyman
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+
+
+@pytest.mark.parametrize(
+    "deadline, interval, now, expected_result", [
+        pytest.param(0, 60, 5, (60, 0), id="in_time"),
+        pytest.param(0, 60, 60, (60, 0), id="exactly_in_time"),
+        pytest.param(0, 60, 70, (60, 0), id="late"),
+        pytest.param(0, 60, 130, (120, 1), id="one_missed"),
+        pytest.param(0, 60, 400, (360, 5), id="several_missed"),
+        pytest.param(10, 0, 20, (10, 0), id="zero_interval"),
+    ]
+)
+def test_advance_deadline(deadline, interval, now, expected_result):
+    """Tests that the deadlines keep their phase and the missed ones are skipped"""
+    assert advance_deadline(deadline, interval, now) == expected_result
+
+
+@pytest.mark.parametrize(
+    "deadline, tick, slack, expected_result", [
+        pytest.param(67, 0, None, 67, id="disabled"),
+        pytest.param(67, 60, None, 120, id="whole_tick"),
+        pytest.param(120, 60, None, 120, id="on_tick"),
+        pytest.param(117, 60, 5, 120, id="within_slack"),
+        pytest.param(67, 60, 5, 67, id="beyond_slack"),
+        pytest.param(117, 60, 0, 117, id="zero_slack"),
+    ]
+)
+def test_align_deadline(deadline, tick, slack, expected_result):
+    """Tests that the deadline is postponed to the tick only within the slack"""
+    assert align_deadline(deadline, tick, slack) == expected_result
+
+
+def make_slow_check_instance(check_duration, **property_mapping):
+    """Creates the instance whose battery reading lasts `check_duration` virtual seconds.
+     The list of the times of the readings is returned too"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.check_interval = 60
+    for name, value in property_mapping.items():
+        setattr(instance, name, value)
+    read_time_list = []
+
+    class SlowBatterySource:  # pylint: disable=too-few-public-methods
+        """Advances the virtual clock on every reading"""
+        @staticmethod
+        def read():
+            read_time_list.append(instance.virtual_clock.time())
+            instance.virtual_clock.sleep(check_duration)
+            return BatteryInfo(is_charging=True, left_in_percents=50)
+
+    instance.battery_source = SlowBatterySource()
+    return instance, read_time_list
+
+
+def run_checks(instance, start_time, end_time):
+    """Runs the check cycle on the virtual clock"""
+    instance.virtual_clock.set_time(start_time)
+    instance.schedule_new_check(initial=True)
+    instance.scheduler.enterabs(end_time, 0, instance.stop)
+    instance.scheduler.run()
+
+
+def test_check_duration_does_not_shift_checks():
+    """Tests that the checks follow the deadlines whatever their duration is"""
+    instance, read_time_list = make_slow_check_instance(5)
+    run_checks(instance, 0, 300)
+    assert read_time_list == [0, 60, 120, 180, 240]
+
+
+def test_missed_checks_are_skipped_and_counted():
+    """Tests that the check lasting longer than the interval is not followed by a burst"""
+    instance, read_time_list = make_slow_check_instance(130)
+    missed_checks_total = battery_handyman.metrics.MISSED_CHECKS_TOTAL
+    label_values = (instance.remote_address, )
+    missed_check_count = missed_checks_total.get(label_values)
+    run_checks(instance, 0, 300)
+    # The checks planned at 60, 180 and 300 are skipped, the ones of 120 and 240 are late
+    assert read_time_list == [0, 130, 260]
+    assert missed_checks_total.get(label_values) - missed_check_count == 3
+
+
+@pytest.mark.parametrize(
+    "check_slack, expected_read_time_list", [
+        pytest.param(None, [7, 120, 180], id="whole_tick"),
+        pytest.param(5, [7, 67, 127, 187], id="beyond_slack"),
+    ]
+)
+def test_checks_are_aligned_to_ticks(check_slack, expected_read_time_list):
+    """Tests that the deadlines are moved to the shared ticks within the slack"""
+    instance, read_time_list = make_slow_check_instance(
+        0, check_tick=60, check_slack=check_slack,
+    )
+    run_checks(instance, 7, 200)
+    assert read_time_list == expected_read_time_list
+
+
+def test_tick_config_round_trip():
+    """Tests that the tick settings are dumped only if they are not default and are validated"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    check_config = instance.to_config_dict_mapping()["check_config"]
+    assert "check_tick" not in check_config and "check_slack" not in check_config
+    instance.check_tick = 60
+    instance.check_slack = 5
+    check_config = instance.to_config_dict_mapping()["check_config"]
+    assert (check_config["check_tick"], check_config["check_slack"]) == (60, 5)
+    for name in ("check_tick", "check_slack"):
+        with pytest.raises(ValueError):
+            setattr(instance, name, -1)
+
+
+def test_records_use_wall_time():
+    """Tests that the monotonic scheduler time is not recorded as the check time"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    assert instance.scheduler.timefunc is time.monotonic
+    before = time.time()
+    instance.record_decision(BatteryInfo(is_charging=True, left_in_percents=50), 0)
+    assert before <= instance.last_check_time <= time.time()
@@ -0,0 +1,135 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/dispatch.py"""
+import os.path
+import threading
+import time
+import unittest.mock
+
+import battery_handyman.constants
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.dispatch import RequestDispatcher
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+THREAD_TIMEOUT = 5
+
+
+def test_request_dispatcher_coalescing():
+    """Tests that the newest task wins and the oldest one is dropped from the full queue"""
+    dispatcher = RequestDispatcher(worker_count=1, queue_size=2)
+    release_event = threading.Event()
+    result_list = []
+    dispatcher.submit("blocker", lambda: release_event.wait(THREAD_TIMEOUT))
+    deadline = time.monotonic() + THREAD_TIMEOUT
+    while len(dispatcher) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    dispatcher.submit("a", lambda: result_list.append("a1"))
+    dispatcher.submit("b", lambda: result_list.append("b1"))
+    dispatcher.submit("a", lambda: result_list.append("a2"))
+    dispatcher.submit("c", lambda: result_list.append("c1"))
+    release_event.set()
+    dispatcher.shutdown()
+
+    assert result_list == ["b1", "c1"]
+
+
+def test_request_dispatcher_drop_callback():
+    """Tests that the drop callback is called for the replaced and the dropped tasks only"""
+    dispatcher = RequestDispatcher(worker_count=1, queue_size=2)
+    release_event = threading.Event()
+    result_list = []
+    dispatcher.submit("blocker", lambda: release_event.wait(THREAD_TIMEOUT))
+    deadline = time.monotonic() + THREAD_TIMEOUT
+    while len(dispatcher) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    dispatcher.submit("a", lambda: result_list.append("a1"), lambda: result_list.append("-a1"))
+    dispatcher.submit("a", lambda: result_list.append("a2"), lambda: result_list.append("-a2"))
+    dispatcher.submit(
+        "b", lambda: result_list.append("b1"), unittest.mock.Mock(side_effect=OSError)
+    )
+    dispatcher.submit("c", lambda: result_list.append("c1"), lambda: result_list.append("-c1"))
+    release_event.set()
+    dispatcher.shutdown()
+
+    assert result_list == ["-a1", "-a2", "b1", "c1"]
+
+
+def test_request_dispatcher_failed_task():
+    """Tests that a failed task does not stop the worker"""
+    dispatcher = RequestDispatcher(worker_count=1)
+    result_list = []
+    dispatcher.submit("a", unittest.mock.Mock(side_effect=RuntimeError))
+    dispatcher.submit("b", lambda: result_list.append("b"))
+    dispatcher.shutdown()
+    assert result_list == ["b"]
+
+
+def test_pool_dispatch_mode_does_not_block_check():
+    """Tests that the check with a hung remote device finishes immediately"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.dispatch_mode = battery_handyman.constants.DISPATCH_MODE_POOL
+    release_event = threading.Event()
+    instance.deliver_request = unittest.mock.Mock(
+        side_effect=lambda ready_request_line: release_event.wait(THREAD_TIMEOUT) and (200, "OK")
+    )
+    battery_info = BatteryInfo(is_charging=True, left_in_percents=95)
+    dispatcher = RequestDispatcher(worker_count=1)
+    with unittest.mock.patch("battery_handyman.dispatch.REQUEST_DISPATCHER", dispatcher):
+        assert instance.send_request(battery_info) == (
+            battery_handyman.constants.DECISION_DISPATCHED
+        )
+        assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_DUPLICATE
+        release_event.set()
+        dispatcher.shutdown()
+    instance.deliver_request.assert_called_once()
+
+    # The finished request can be dispatched again
+    dispatcher = RequestDispatcher(worker_count=1)
+    with unittest.mock.patch("battery_handyman.dispatch.REQUEST_DISPATCHER", dispatcher):
+        assert instance.send_request(battery_info) == (
+            battery_handyman.constants.DECISION_DISPATCHED
+        )
+        dispatcher.shutdown()
+    assert instance.deliver_request.call_count == 2
+
+
+def test_dropped_request_can_be_dispatched_again():
+    """Tests that the request dropped from the full queue is not reported as the duplicate"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.dispatch_mode = battery_handyman.constants.DISPATCH_MODE_POOL
+    instance.deliver_request = unittest.mock.Mock(return_value=(200, "OK"))
+    battery_info = BatteryInfo(is_charging=True, left_in_percents=95)
+    dispatcher = RequestDispatcher(worker_count=1, queue_size=1)
+    release_event = threading.Event()
+    dispatcher.submit("blocker", lambda: release_event.wait(THREAD_TIMEOUT))
+    deadline = time.monotonic() + THREAD_TIMEOUT
+    while len(dispatcher) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    with unittest.mock.patch("battery_handyman.dispatch.REQUEST_DISPATCHER", dispatcher):
+        assert instance.send_request(battery_info) == (
+            battery_handyman.constants.DECISION_DISPATCHED
+        )
+        # Drops the request of the instance from the full queue
+        dispatcher.submit("other", lambda: None)
+        assert instance.send_request(battery_info) == (
+            battery_handyman.constants.DECISION_DISPATCHED
+        )
+        release_event.set()
+        dispatcher.shutdown()
+    instance.deliver_request.assert_called_once()
@@ -0,0 +1,161 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/filters.py"""
+import os.path
+
+import pytest
+
+import battery_handyman.constants
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.filters import (
+    BatteryFilterChain, DwellBatteryFilter, EwmaBatteryFilter, MedianBatteryFilter,
+    create_battery_filter,
+)
+from battery_handyman.simulation import SimulatedBatteryHandyman, TraceSample
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+
+
+def apply_all(battery_filter, percent_list, is_charging=False, sample_interval=60):
+    """Returns the filtered percentages of the readings taken every `sample_interval` seconds"""
+    return [
+        battery_filter.apply(
+            index * sample_interval, BatteryInfo(is_charging, left_in_percents)
+        ).left_in_percents
+        for index, left_in_percents in enumerate(percent_list)
+    ]
+
+
+def get_zone(battery_info):
+    """The zones of the default battery limits"""
+    if battery_info.left_in_percents < 40:
+        return -1
+    return 1 if battery_info.left_in_percents > 90 else 0
+
+
+def test_median_battery_filter():
+    """Tests that the spikes are dropped and the result is one of the read values"""
+    battery_filter = MedianBatteryFilter(3)
+    assert apply_all(battery_filter, [50, 20, 49, 48, 90, 47, 47]) == [50, 20, 49, 48, 49, 48, 47]
+    battery_filter.reset()
+    assert apply_all(battery_filter, [30]) == [30]
+
+
+def test_ewma_battery_filter():
+    """Tests that the first reading is taken as is and the next ones are averaged"""
+    battery_filter = EwmaBatteryFilter(0.5)
+    assert apply_all(battery_filter, [40, 44, 36, 36]) == [40, 42, 39, 37.5]
+    battery_filter.reset()
+    assert apply_all(battery_filter, [10]) == [10]
+
+
+def test_dwell_battery_filter():
+    """Tests that the new zone is accepted only after it has lasted for the dwell time
+     and the charging state is never delayed"""
+    battery_filter = DwellBatteryFilter(120, get_zone)
+    assert apply_all(battery_filter, [41, 39, 41, 39, 39, 39, 38, 41]) == [
+        41, 41, 41, 41, 41, 39, 38, 38,
+    ]
+    assert battery_filter.apply(600, BatteryInfo(True, 39)) == BatteryInfo(True, 39)
+
+
+def test_create_battery_filter():
+    """Tests that only the enabled filters are created in the median, EWMA, dwell order"""
+    defaults = (
+        battery_handyman.constants.BATTERY_FILTER_MEDIAN_SIZE_DEFAULT,
+        battery_handyman.constants.BATTERY_FILTER_EWMA_ALPHA_DEFAULT,
+        battery_handyman.constants.BATTERY_FILTER_MIN_DWELL_TIME_IN_SECONDS_DEFAULT,
+    )
+    assert create_battery_filter(*defaults, get_zone) is None
+    assert isinstance(create_battery_filter(1, 0.5, 0, get_zone), EwmaBatteryFilter)
+    battery_filter = create_battery_filter(5, 0.5, 60, get_zone)
+    assert isinstance(battery_filter, BatteryFilterChain)
+    assert [type(item) for item in battery_filter.battery_filter_list] == [
+        MedianBatteryFilter, EwmaBatteryFilter, DwellBatteryFilter,
+    ]
+
+
+@pytest.mark.parametrize(
+    "property_name, value", [
+        pytest.param("filter_median_size", 0, id="median_size_zero"),
+        pytest.param("filter_median_size", 2.5, id="median_size_float"),
+        pytest.param("filter_ewma_alpha", 0, id="ewma_alpha_zero"),
+        pytest.param("filter_ewma_alpha", 1.5, id="ewma_alpha_above_one"),
+        pytest.param("filter_min_dwell_time", -1, id="min_dwell_time_negative"),
+    ]
+)
+def test_filter_property_validation(property_name, value):
+    """Tests that the invalid filter settings are rejected"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    with pytest.raises(ValueError):
+        setattr(instance, property_name, value)
+
+
+def test_filter_config_round_trip():
+    """Tests that the filter section is dumped only with the not default settings"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    assert battery_handyman.constants.CONFIG_NAME_BATTERY_FILTER not in (
+        instance.to_config_dict_mapping()
+    )
+    instance.filter_ewma_alpha = 0.25
+    instance.filter_min_dwell_time = 300
+    assert instance.to_config_dict_mapping()[
+        battery_handyman.constants.CONFIG_NAME_BATTERY_FILTER
+    ] == {"ewma_alpha": 0.25, "min_dwell_time": 300}
+
+    another_instance = BatteryHandyman.__new__(BatteryHandyman)
+    another_instance.init_from_config_dict_mapping(instance.to_config_dict_mapping())
+    assert another_instance.to_config_dict_mapping() == instance.to_config_dict_mapping()
+
+
+def make_noisy_trace(sample_count, sample_interval=60):
+    """The discharging battery whose gauge bounces around the low limit"""
+    return [
+        TraceSample(index * sample_interval, BatteryInfo(False, 39 if index % 2 else 42))
+        for index in range(sample_count)
+    ]
+
+
+@pytest.mark.parametrize(
+    "property_name, value, expected_request_count", [
+        pytest.param(None, None, 30, id="unfiltered"),
+        pytest.param("filter_ewma_alpha", 0.2, 0, id="ewma"),
+        pytest.param("filter_min_dwell_time", 300, 0, id="dwell"),
+    ]
+)
+def test_filters_cut_command_churn(property_name, value, expected_request_count):
+    """Tests that the noisy readings around the limit do not toggle the charging"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.check_interval = 60
+    if property_name is not None:
+        setattr(instance, property_name, value)
+    assert len(instance.simulate(make_noisy_trace(61))) == expected_request_count
+
+
+def test_dwell_time_lets_lasting_change_through():
+    """Tests that the percentage staying below the limit is acted on after the dwell time"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.check_interval = 60
+    instance.filter_min_dwell_time = 300
+    trace = [
+        TraceSample(0, BatteryInfo(False, 41)),
+        TraceSample(600, BatteryInfo(False, 39)),
+        TraceSample(1200, BatteryInfo(False, 39)),
+    ]
+
+    delivered_request_list = instance.simulate(trace)
+
+    assert delivered_request_list[0] == (900, instance.remote_address + "/power/1")
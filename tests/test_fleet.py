@@ -0,0 +1,90 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/fleet.py"""
+import os.path
+import unittest.mock
+
+import pytest
+
+from battery_handyman.fleet import BatteryHandymanFleet, collect_configuration_filepaths
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_DIR = "configurations"
+CONFIG_PATH_DEFAULT = os.path.join(CONFIG_DIR, "default_configuration.yml")
+CONFIG_PATH_TASMOTA = os.path.join(CONFIG_DIR, "template_configuration_tasmota.yml")
+
+
+def test_collect_configuration_filepaths(tmp_path):
+    """Tests that the directories are expanded and the files are kept as is"""
+    for filename in ("b.yml", "a.yaml", "notes.txt"):
+        (tmp_path / filename).write_text("")
+    (tmp_path / "nested.yml").mkdir()
+
+    actual_result = collect_configuration_filepaths([CONFIG_PATH_DEFAULT, str(tmp_path)])
+    assert actual_result == [
+        CONFIG_PATH_DEFAULT, str(tmp_path / "a.yaml"), str(tmp_path / "b.yml"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "broken_config_content", [
+        pytest.param("", id="empty_config"),
+        pytest.param("!BatteryHandyman\ncheck_config: {}\n", id="no_reaction_config"),
+        pytest.param("!BatteryHandyman\n  - [\n", id="invalid_yaml"),
+    ]
+)
+def test_from_configuration_paths_skips_invalid(tmp_path, broken_config_content):
+    """Tests that an invalid configuration does not prevent the others from loading"""
+    broken_config_path = tmp_path / "broken.yml"
+    broken_config_path.write_text(broken_config_content)
+
+    fleet = BatteryHandymanFleet.from_configuration_paths(
+        [CONFIG_PATH_DEFAULT, str(broken_config_path), CONFIG_PATH_TASMOTA]
+    )
+    assert len(fleet.instances) == 2
+    assert fleet.instances[0].scheduler is fleet.instances[1].scheduler
+
+
+def test_from_configuration_paths_without_valid_configs(tmp_path):
+    """Tests that an empty fleet is not created"""
+    with pytest.raises(ValueError):
+        BatteryHandymanFleet.from_configuration_paths([str(tmp_path)])
+
+
+def test_fleet_isolates_failures():
+    """Tests that the failed check does not affect the checks of the other instances"""
+    fleet = BatteryHandymanFleet.from_configuration_paths(
+        [CONFIG_PATH_DEFAULT, CONFIG_PATH_TASMOTA]
+    )
+    for instance in fleet.instances:
+        instance.battery_source = unittest.mock.Mock(read=unittest.mock.Mock(
+            return_value=BatteryInfo(is_charging=False, left_in_percents=1)
+        ))
+    failing_instance, healthy_instance = fleet.instances
+    failing_instance.send_request = unittest.mock.Mock(side_effect=RuntimeError)
+    healthy_instance.send_request = unittest.mock.Mock()
+
+    try:
+        fleet.start(blocking=False)
+        failing_instance.send_request.assert_called_once()
+        healthy_instance.send_request.assert_called_once()
+        # Both instances keep their check cycles
+        assert len(fleet.instances[0].scheduler.queue) == 2
+
+        failing_instance.stop()
+        assert len(fleet.instances[0].scheduler.queue) == 1
+    finally:
+        fleet.stop()
+    assert fleet.instances[0].scheduler.empty()
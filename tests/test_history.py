@@ -0,0 +1,168 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/history.py"""
+import os.path
+import unittest.mock
+
+import pytest
+
+import battery_handyman.constants
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.history import HistoryRecord, HistoryRecorder, main
+from battery_handyman.simulation import load_trace
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+
+
+def fill_history(history_recorder, count):
+    """Appends `count` records with the timestamps 0, 10, 20, ..."""
+    for index in range(count):
+        history_recorder.append(
+            index * 10.0, index, bool(index % 2), battery_handyman.constants.DECISION_KEEP
+        )
+
+
+def test_history_recorder_wraps_and_survives_reopening(tmp_path):
+    """Tests that the oldest records are overwritten and the history is kept after reopening"""
+    history_path = str(tmp_path / "history.bin")
+    with HistoryRecorder(history_path, capacity=4) as history_recorder:
+        fill_history(history_recorder, 6)
+        assert len(history_recorder) == 4
+
+    with HistoryRecorder(history_path, capacity=100) as history_recorder:
+        assert history_recorder.capacity == 4
+        assert list(history_recorder.read_range()) == [
+            HistoryRecord(20.0, 2, False, battery_handyman.constants.DECISION_KEEP),
+            HistoryRecord(30.0, 3, True, battery_handyman.constants.DECISION_KEEP),
+            HistoryRecord(40.0, 4, False, battery_handyman.constants.DECISION_KEEP),
+            HistoryRecord(50.0, 5, True, battery_handyman.constants.DECISION_KEEP),
+        ]
+
+
+@pytest.mark.parametrize(
+    "start,end,expected_timestamp_list", [
+        pytest.param(None, None, [30.0, 40.0, 50.0, 60.0, 70.0], id="everything"),
+        pytest.param(40.0, 60.0, [40.0, 50.0, 60.0], id="inclusive_bounds"),
+        pytest.param(41.0, 59.0, [50.0], id="between_records"),
+        pytest.param(None, 35.0, [30.0], id="only_end"),
+        pytest.param(65.0, None, [70.0], id="only_start"),
+        pytest.param(100.0, None, [], id="after_everything"),
+    ]
+)
+def test_history_recorder_read_range(tmp_path, start, end, expected_timestamp_list):
+    """Tests the range queries on the wrapped ring buffer"""
+    with HistoryRecorder(str(tmp_path / "history.bin"), capacity=5) as history_recorder:
+        fill_history(history_recorder, 8)
+        actual_timestamp_list = [
+            history_record.timestamp for history_record in history_recorder.read_range(start, end)
+        ]
+    assert actual_timestamp_list == expected_timestamp_list
+
+
+def test_history_recorder_keeps_unknown_charging_state(tmp_path):
+    """Tests that the charging state the source cannot tell is stored as unknown"""
+    with HistoryRecorder(str(tmp_path / "history.bin"), capacity=4) as history_recorder:
+        history_recorder.append(10.0, 50, None, battery_handyman.constants.DECISION_KEEP)
+        history_recorder.append(20.0, 51, True, battery_handyman.constants.DECISION_KEEP)
+        assert [
+            history_record.is_charging for history_record in history_recorder.read_range()
+        ] == [None, True]
+
+
+def test_history_recorder_rejects_foreign_file(tmp_path):
+    """Tests that a file of another format is not overwritten"""
+    foreign_path = tmp_path / "foreign.bin"
+    foreign_path.write_bytes(b"not a battery history" * 10)
+    with pytest.raises(ValueError):
+        HistoryRecorder(str(foreign_path))
+    assert foreign_path.read_bytes() == b"not a battery history" * 10
+
+
+def test_battery_handyman_records_history(tmp_path):
+    """Tests that every check is recorded with its outcome"""
+    history_path = str(tmp_path / "history.bin")
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.history_path = history_path
+    instance.battery_source = unittest.mock.Mock(read=unittest.mock.Mock(side_effect=[
+        BatteryInfo(is_charging=True, left_in_percents=50),
+        BatteryInfo(is_charging=True, left_in_percents=95),
+    ]))
+    with unittest.mock.patch.object(instance, "deliver_request", return_value=(200, "OK")):
+        instance.perform_check()
+        instance.perform_check()
+    instance.stop()
+
+    with HistoryRecorder(history_path, read_only=True) as history_recorder:
+        assert [
+            (history_record.left_in_percents, history_record.decision)
+            for history_record in history_recorder.read_range()
+        ] == [
+            (50, battery_handyman.constants.DECISION_KEEP),
+            (95, battery_handyman.constants.DECISION_SENT),
+        ]
+    assert instance.to_config_dict_mapping()["check_config"]["history_path"] == history_path
+
+
+
+def test_history_records_raw_readings(tmp_path):
+    """Tests that the history keeps the readings before the filters
+     while the decisions are made on the filtered ones"""
+    history_path = str(tmp_path / "history.bin")
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.history_path = history_path
+    instance.filter_ewma_alpha = 0.5
+    instance.battery_source = unittest.mock.Mock(read=unittest.mock.Mock(side_effect=[
+        BatteryInfo(is_charging=True, left_in_percents=50),
+        BatteryInfo(is_charging=True, left_in_percents=70),
+    ]))
+    instance.perform_check()
+    instance.perform_check()
+    assert instance.last_battery_info.left_in_percents == 60
+    instance.stop()
+
+    with HistoryRecorder(history_path, read_only=True) as history_recorder:
+        assert [
+            history_record.left_in_percents for history_record in history_recorder.read_range()
+        ] == [50, 70]
+
+def test_failed_record_does_not_stop_checks(tmp_path, caplog):
+    """Tests that the check is completed when its record cannot be written"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.history_path = str(tmp_path / "history.bin")
+    instance.battery_source = unittest.mock.Mock(read=unittest.mock.Mock(side_effect=[
+        BatteryInfo(is_charging=None, left_in_percents=50),
+        BatteryInfo(is_charging=True, left_in_percents=50),
+    ]))
+    instance.perform_check()
+    with unittest.mock.patch.object(
+            instance.history_recorder, "append", side_effect=OSError("No space left on device")
+    ):
+        instance.perform_check()
+    assert instance.last_decision == battery_handyman.constants.DECISION_KEEP
+    assert "The check is not recorded" in caplog.text
+    instance.stop()
+
+
+def test_main(tmp_path, capsys):
+    """Tests that the printed history is a valid trace for the simulation"""
+    history_path = str(tmp_path / "history.bin")
+    with HistoryRecorder(history_path, capacity=10) as history_recorder:
+        fill_history(history_recorder, 3)
+
+    main([history_path, "--start", "10"])
+    trace_path = tmp_path / "trace.csv"
+    trace_path.write_text(capsys.readouterr().out)
+    assert [trace_sample.timestamp for trace_sample in load_trace(str(trace_path))] == [10.0, 20.0]
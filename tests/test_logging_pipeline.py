@@ -0,0 +1,179 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/logging_pipeline.py"""
+import json
+import logging
+import os.path
+import queue
+import sys
+import unittest.mock
+
+import pytest
+
+import battery_handyman.constants
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.logging_pipeline import (
+    JsonLinesFormatter, QueueingHandler, RateLimitFilter, TextFormatter, setup_logging,
+)
+from battery_handyman.util import BatteryInfo, ResponseStatus, make_log_event
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+
+
+def make_record(msg, *args, level=logging.INFO, exc_info=None, **extra):
+    """Creates the record the way `logger.log` does it"""
+    record = logging.LogRecord(
+        "battery_handyman.test", level, __file__, 1, msg, args, exc_info
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+def get_exc_info():
+    """Returns the information of a raised exception"""
+    try:
+        raise RuntimeError("The failure")
+    except RuntimeError:
+        return sys.exc_info()
+
+
+def test_rate_limit_filter():
+    """Tests that only `limit` same messages pass per period
+     and the next passed one reports the suppressed ones"""
+    now = [0.0]
+    rate_limit_filter = RateLimitFilter(2, period=60, timefunc=lambda: now[0])
+    passed_list = [
+        rate_limit_filter.filter(make_record("Charging must be %s", value))
+        for value in ("enabled", "disabled", "enabled", "disabled")
+    ]
+    assert passed_list == [True, True, False, False]
+    assert rate_limit_filter.filter(make_record("Other message"))
+
+    now[0] = 60.0
+    record = make_record("Charging must be %s", "enabled")
+    assert rate_limit_filter.filter(record)
+    assert record.suppressed_count == 2
+    record = make_record("Charging must be %s", "enabled")
+    assert rate_limit_filter.filter(record)
+    assert not hasattr(record, "suppressed_count")
+    with pytest.raises(ValueError):
+        RateLimitFilter(0)
+
+
+def test_text_formatter_reports_suppressed():
+    """Tests that the number of the suppressed records is appended to the message"""
+    formatter = TextFormatter("%(levelname)s %(message)s")
+    assert formatter.format(make_record("Check")) == "INFO Check"
+    assert formatter.format(make_record("Check", suppressed_count=3)) == (
+        "INFO Check (3 similar messages were suppressed)"
+    )
+
+
+def test_json_lines_formatter():
+    """Tests that the event, its data and the exception are rendered as one JSON line"""
+    record = make_record(
+        "Sending %s request to %s", "POST", "http://127.0.0.1", level=logging.ERROR,
+        exc_info=get_exc_info(), suppressed_count=2,
+        **make_log_event(battery_handyman.constants.LOG_EVENT_REQUEST, attempt=1),
+    )
+    line = JsonLinesFormatter().format(record)
+    assert "\n" not in line
+    entry = json.loads(line)
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "battery_handyman.test"
+    assert entry["message"] == "Sending POST request to http://127.0.0.1"
+    assert entry["event"] == "request"
+    assert entry["data"] == {"attempt": 1}
+    assert entry["suppressed"] == 2
+    assert "RuntimeError: The failure" in entry["exception"]
+    assert "T" in entry["time"]
+
+    assert set(json.loads(JsonLinesFormatter().format(make_record("Check")))) == {
+        "time", "level", "logger", "message",
+    }
+
+
+def test_queueing_handler_prepares_copy():
+    """Tests that the queued record has the rendered message and traceback
+     and the original record is unchanged"""
+    record_queue = queue.SimpleQueue()
+    handler = QueueingHandler(record_queue)
+    record = make_record("Sending %s", "POST", exc_info=get_exc_info())
+    handler.handle(record)
+    queued_record = record_queue.get_nowait()
+
+    assert queued_record is not record
+    assert (queued_record.msg, queued_record.args) == ("Sending POST", None)
+    assert queued_record.exc_info is None
+    assert "RuntimeError: The failure" in queued_record.exc_text
+    assert (record.msg, record.args) == ("Sending %s", ("POST", ))
+    assert record.exc_info is not None
+
+
+@pytest.mark.parametrize("is_queued", [False, True])
+def test_setup_logging_writes_json_lines(tmp_path, is_queued):
+    """Tests that the records are written to the file, the repetitive ones are suppressed
+     and `close` restores the root logger"""
+    log_path = str(tmp_path / "battery_handyman.log")
+    root_logger = logging.getLogger()
+    handler_list, level = list(root_logger.handlers), root_logger.level
+    logging_pipeline = setup_logging(
+        "INFO", battery_handyman.constants.LOG_FORMAT_JSON, log_path,
+        is_queued=is_queued, rate_limit=1,
+    )
+    try:
+        test_logger = logging.getLogger("battery_handyman.test")
+        for _ in range(3):
+            test_logger.info(battery_handyman.constants.MSG_CHARGING_MUST_NOT_TO_BE_TOOGLED)
+        test_logger.debug("Not written")
+        test_logger.warning("Written")
+    finally:
+        logging_pipeline.close()
+    assert root_logger.handlers == handler_list
+    assert root_logger.level == level
+
+    with open(log_path, encoding="utf-8") as log_file:
+        message_list = [json.loads(line)["message"] for line in log_file]
+    assert message_list == [
+        battery_handyman.constants.MSG_CHARGING_MUST_NOT_TO_BE_TOOGLED, "Written",
+    ]
+
+
+def test_setup_logging_rejects_unknown_format():
+    """Tests that nothing is installed for the unknown format"""
+    handler_list = list(logging.getLogger().handlers)
+    with pytest.raises(ValueError):
+        setup_logging(log_format="xml")
+    assert logging.getLogger().handlers == handler_list
+
+
+def test_check_logs_structured_events(caplog):
+    """Tests that the request, the response and the decision carry the structured events"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.deliver_request = unittest.mock.Mock(return_value=ResponseStatus(200, "OK"))
+    battery_info = BatteryInfo(is_charging=True, left_in_percents=95)
+    with caplog.at_level(logging.DEBUG, logger="battery_handyman.battery_handyman_class"):
+        decision = instance.send_request(battery_info)
+        instance.record_decision(battery_info, decision)
+
+    event_mapping = {
+        record.event: record.event_data for record in caplog.records if hasattr(record, "event")
+    }
+    assert event_mapping[battery_handyman.constants.LOG_EVENT_REQUEST]["attempt"] == 0
+    assert event_mapping[battery_handyman.constants.LOG_EVENT_RESPONSE]["status_code"] == 200
+    assert event_mapping[battery_handyman.constants.LOG_EVENT_DECISION] == {
+        "remote_address": instance.remote_address, "decision": "sent",
+        "left_in_percents": 95, "is_charging": True,
+    }
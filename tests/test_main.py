@@ -15,11 +15,13 @@
 import os
 import multiprocessing
 import subprocess
-import time
+import sys
 
 import pytest
 
 import battery_handyman
+import battery_handyman.constants
+from battery_handyman.simulation import VirtualClock
 
 
 @pytest.mark.slow
@@ -43,7 +45,8 @@ def test_main_using_import(cli_args, no_error_is_expected):
     )
     try:
         app_process.start()
-        time.sleep(3)
+        # An early failure ends the waiting at once
+        app_process.join(timeout=3)
         assert app_process.is_alive() == no_error_is_expected, \
             "The exit code of the process -- " + str(app_process.exitcode)
     finally:
@@ -69,9 +72,12 @@ def test_main_using_import(cli_args, no_error_is_expected):
 def test_main_using_import_in_testing_mode(cli_args):
     """Other tests in this module does not affect the coverage of the main"""
     path_to_dir_with_main_module = os.path.dirname(battery_handyman.__file__)
+    virtual_clock = VirtualClock()
     battery_handyman.main(
-        cli_args, path_to_dir_with_main_module=path_to_dir_with_main_module, testing=True
+        cli_args, path_to_dir_with_main_module=path_to_dir_with_main_module, testing=True,
+        sleep=virtual_clock.sleep,
     )
+    assert virtual_clock.time() == battery_handyman.constants.TESTING_RUN_DURATION_IN_SECONDS
 
 
 @pytest.mark.slow
@@ -97,8 +103,10 @@ def test_main_using_subprocess(cli_args):
         stdout=subprocess.PIPE, stderr=subprocess.PIPE,
         creationflags=bh_process_creationflags
     )
-    time.sleep(2.5)
-    return_code = bh_process.poll()
+    try:
+        return_code = bh_process.wait(timeout=2.5)
+    except subprocess.TimeoutExpired:
+        return_code = None
     if return_code is None:
         # Expected behavior, no error has occurred
         bh_process.terminate()
@@ -109,3 +117,54 @@ def test_main_using_subprocess(cli_args):
     print("Stderr:", bh_process.stderr.read().decode("utf-8"), sep="\n")
     # assert return_code == 0
     raise AssertionError("The process has finished too early")
+
+
+@pytest.mark.parametrize(
+    "cli_args, expected_absent_module_list", [
+        pytest.param(["--help"], ["requests", "psutil", "yaml", "asyncio"], id="help"),
+        pytest.param(["--validate"], ["requests", "psutil", "asyncio"], id="validate"),
+        pytest.param(
+            ["--validate", "--engine", "asyncio"], ["requests", "psutil"], id="validate_asyncio"
+        ),
+    ]
+)
+def test_main_does_not_import_heavy_modules(cli_args, expected_absent_module_list):
+    """The CLI paths exiting without the checks must start fast"""
+    code = (
+        "import sys, runpy\n"
+        f"sys.argv = ['battery_handyman/__main__.py'] + {cli_args!r}\n"
+        "try:\n"
+        "    runpy.run_module('battery_handyman', run_name='__main__')\n"
+        "except SystemExit as exception:\n"
+        "    assert not exception.code\n"
+        "print(' '.join(sorted(sys.modules)))\n"
+    )
+    completed_process = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(battery_handyman.__file__)),
+        stdout=subprocess.PIPE, check=True,
+    )
+    imported_module_set = set(completed_process.stdout.decode("utf-8").split())
+    assert "battery_handyman.main" in imported_module_set
+    for module_name in expected_absent_module_list:
+        assert module_name not in imported_module_set
+
+
+@pytest.mark.parametrize(
+    "cli_args, expected_cache_filename_list", [
+        pytest.param([], [], id="no_cache_by_default"),
+        pytest.param(["--config-cache-path", "cache.marshal"], ["cache.marshal"], id="cache_path"),
+    ]
+)
+def test_validate_writes_cache_only_if_asked(
+        tmp_path, monkeypatch, capsys, cli_args, expected_cache_filename_list
+):
+    """The configuration cache is opt-in, the user cache directory is not touched by default"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "user_cache"))
+    monkeypatch.chdir(tmp_path)
+    battery_handyman.main(
+        ["--validate"] + cli_args,
+        path_to_dir_with_main_module=os.path.dirname(battery_handyman.__file__),
+    )
+    assert capsys.readouterr().out == "The configuration is valid\n"
+    assert sorted(os.listdir(tmp_path)) == expected_cache_filename_list
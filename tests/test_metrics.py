@@ -0,0 +1,127 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/metrics.py"""
+import os.path
+import unittest.mock
+import urllib.error
+import urllib.request
+
+import pytest
+
+import battery_handyman.metrics
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.metrics import (
+    Counter, Histogram, MetricsRegistry, parse_address, start_metrics_server
+)
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+
+
+def test_registry_render():
+    """Tests the text format of the counters and the cumulative histogram buckets"""
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("test_total", "Test counter", ("controller", )))
+    histogram = registry.register(Histogram("test_seconds", "Test histogram", buckets=[0.1, 1]))
+    counter.inc(("http://a\"b", ))
+    counter.inc(("http://a\"b", ), amount=2)
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+
+    assert registry.render() == "\n".join([
+        "# HELP test_total Test counter",
+        "# TYPE test_total counter",
+        "test_total{controller=\"http://a\\\"b\"} 3",
+        "# HELP test_seconds Test histogram",
+        "# TYPE test_seconds histogram",
+        "test_seconds_bucket{le=\"0.1\"} 2",
+        "test_seconds_bucket{le=\"1\"} 3",
+        "test_seconds_bucket{le=\"+Inf\"} 4",
+        "test_seconds_sum 3.65",
+        "test_seconds_count 4",
+    ]) + "\n"
+    with pytest.raises(ValueError):
+        registry.register(Counter("test_total", "Duplicate"))
+
+
+@pytest.mark.parametrize(
+    "address,expected_result", [
+        pytest.param("9101", ("127.0.0.1", 9101), id="port"),
+        pytest.param("0.0.0.0:9101", ("0.0.0.0", 9101), id="host_and_port"),
+        pytest.param("[::1]:9101", ("::1", 9101), id="ipv6"),
+    ]
+)
+def test_parse_address(address, expected_result):
+    """Tests the parsing of the metrics address"""
+    assert parse_address(address) == expected_result
+
+
+def test_check_metrics():
+    """Tests that the check updates the metrics of its stages"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.remote_address = "http://metrics.test"
+    instance.battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=BatteryInfo(is_charging=True, left_in_percents=95))
+    )
+    controller_label_values = ("http://metrics.test", )
+    checks_total = battery_handyman.metrics.CHECKS_TOTAL.get(controller_label_values)
+    sent_total = battery_handyman.metrics.DECISIONS_TOTAL.get(("http://metrics.test", "sent"))
+    failed_total = battery_handyman.metrics.DECISIONS_TOTAL.get(("http://metrics.test", "failed"))
+    responses_total = battery_handyman.metrics.RESPONSES_TOTAL.get(("http://metrics.test", "200"))
+    connection_errors_total = battery_handyman.metrics.CONNECTION_ERRORS_TOTAL.get(
+        controller_label_values
+    )
+    request_count = battery_handyman.metrics.REQUEST_DURATION.get_count(controller_label_values)
+
+    with unittest.mock.patch.object(
+            instance, "deliver_request", side_effect=[(200, "OK"), None]
+    ):
+        instance.perform_check()
+        instance.perform_check()
+    instance.stop()
+
+    assert battery_handyman.metrics.CHECKS_TOTAL.get(controller_label_values) == checks_total + 2
+    assert battery_handyman.metrics.DECISIONS_TOTAL.get(
+        ("http://metrics.test", "sent")
+    ) == sent_total + 1
+    assert battery_handyman.metrics.DECISIONS_TOTAL.get(
+        ("http://metrics.test", "failed")
+    ) == failed_total + 1
+    assert battery_handyman.metrics.RESPONSES_TOTAL.get(
+        ("http://metrics.test", "200")
+    ) == responses_total + 1
+    assert battery_handyman.metrics.CONNECTION_ERRORS_TOTAL.get(
+        controller_label_values
+    ) == connection_errors_total + 1
+    assert battery_handyman.metrics.REQUEST_DURATION.get_count(
+        controller_label_values
+    ) == request_count + 2
+
+
+def test_metrics_server():
+    """Tests the exposition endpoint"""
+    registry = MetricsRegistry()
+    registry.register(Counter("test_total", "Test counter")).inc()
+    server = start_metrics_server("127.0.0.1", 0, registry)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(base_url + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode() == registry.render()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(base_url + "/other")
+    finally:
+        server.shutdown()
+        server.server_close()
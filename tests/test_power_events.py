@@ -0,0 +1,233 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/power_events.py"""
+import os.path
+import socket
+import threading
+import time
+import unittest.mock
+
+import pytest
+
+import battery_handyman.power_events
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.power_events import (
+    FakePowerEventSource, UeventPowerEventSource, is_power_supply_uevent,
+)
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+# Far beyond the duration of the test
+CHECK_INTERVAL_LONG = 3600
+THREAD_TIMEOUT = 5
+POWER_SUPPLY_UEVENT = b"change@/power_supply/AC\0SUBSYSTEM=power_supply\0"
+
+
+@pytest.mark.parametrize(
+    "message,expected_result", [
+        pytest.param(
+            b"change@/devices/LNXSYSTM:00/ACPI0003:00/power_supply/AC\0ACTION=change\0"
+            b"SUBSYSTEM=power_supply\0POWER_SUPPLY_ONLINE=1\0",
+            True, id="power_supply"
+        ),
+        pytest.param(
+            b"add@/devices/virtual/net/lo\0ACTION=add\0SUBSYSTEM=net\0",
+            False, id="other_subsystem"
+        ),
+        pytest.param(b"SUBSYSTEM=power_supply", False, id="no_header"),
+        pytest.param(b"", False, id="empty"),
+    ]
+)
+def test_is_power_supply_uevent(message, expected_result):
+    """Tests the filtering of the kernel uevents"""
+    assert is_power_supply_uevent(message) == expected_result
+
+
+def test_fake_power_event_source_subscription():
+    """Tests that only the subscribed callbacks are called and a failure does not stop others"""
+    source = FakePowerEventSource()
+    failing_callback = unittest.mock.Mock(side_effect=RuntimeError)
+    callback = unittest.mock.Mock()
+    source.subscribe(failing_callback)
+    source.subscribe(callback)
+    source.trigger()
+    source.unsubscribe(callback)
+    source.unsubscribe(callback)
+    source.trigger()
+
+    assert failing_callback.call_count == 2
+    assert callback.call_count == 1
+
+
+class FakeNetlinkSocket:
+    """The socket receiving the datagrams sent to `peer_socket`"""
+    def __init__(self, *args):
+        self._socket, self.peer_socket = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.received_message_list = []
+
+    def bind(self, address):
+        """Accepts any address"""
+
+    def fileno(self):
+        """The descriptor waited on by `select`"""
+        return self._socket.fileno()
+
+    def recv(self, size):
+        """Returns the sent datagram"""
+        message = self._socket.recv(size)
+        self.received_message_list.append(message)
+        return message
+
+    def close(self):
+        """Closes both ends"""
+        self._socket.close()
+        self.peer_socket.close()
+
+
+@pytest.mark.skipif(
+    not hasattr(battery_handyman.power_events.socket, "AF_NETLINK"), reason="Linux only"
+)
+def test_unsubscribe_during_notification():
+    """Tests that the last unsubscription does not wait for the thread
+     that is waiting for the lock held by the unsubscription"""
+    fake_socket = FakeNetlinkSocket()
+    source = UeventPowerEventSource()
+    callback = unittest.mock.Mock()
+    with unittest.mock.patch.object(
+            battery_handyman.power_events.socket, "socket", return_value=fake_socket
+    ):
+        source.subscribe(callback)
+    original_stop = source.stop
+
+    def stop_receiving_event():
+        # The thread receives the event and calls `notify` while the lock is held
+        fake_socket.peer_socket.send(POWER_SUPPLY_UEVENT)
+        time.sleep(0.05)
+        original_stop()
+
+    source.stop = stop_receiving_event
+    unsubscribe_thread = threading.Thread(
+        target=source.unsubscribe, args=(callback, ), daemon=True
+    )
+    unsubscribe_thread.start()
+    unsubscribe_thread.join(THREAD_TIMEOUT)
+
+    assert not unsubscribe_thread.is_alive()
+    assert fake_socket.received_message_list == [POWER_SUPPLY_UEVENT]
+    callback.assert_not_called()
+
+
+@pytest.mark.skipif(
+    not hasattr(battery_handyman.power_events.socket, "AF_NETLINK"), reason="Linux only"
+)
+def test_uevent_thread_blocks_until_event_or_stop():
+    """Tests that the idle thread waits without a timeout and the stop wakes it up at once"""
+    fake_socket = FakeNetlinkSocket()
+    source = UeventPowerEventSource()
+    callback = unittest.mock.Mock()
+    original_select = battery_handyman.power_events.select.select
+    with unittest.mock.patch.object(
+            battery_handyman.power_events.socket, "socket", return_value=fake_socket
+    ), unittest.mock.patch.object(
+            battery_handyman.power_events.select, "select", side_effect=original_select
+    ) as select_mock:
+        source.subscribe(callback)
+        fake_socket.peer_socket.send(POWER_SUPPLY_UEVENT)
+        wait_for(lambda: callback.call_count == 1)
+        unsubscribe_start_time = time.monotonic()
+        source.unsubscribe(callback)
+    assert time.monotonic() - unsubscribe_start_time < 0.5
+    # The other threads of the process may use `select` too
+    uevent_call_list = [
+        call for call in select_mock.call_args_list if fake_socket in call[0][0]
+    ]
+    assert len(uevent_call_list) == 2
+    for call in uevent_call_list:
+        assert len(call[0]) == 3 and not call[1]
+
+
+def make_event_driven_instance():
+    """Creates an instance with the fake power event source and the long check interval"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.check_interval = CHECK_INTERVAL_LONG
+    instance.power_event_source = FakePowerEventSource()
+    instance.battery_source = unittest.mock.Mock(
+        read=unittest.mock.Mock(return_value=BatteryInfo(is_charging=True, left_in_percents=50))
+    )
+    return instance
+
+
+def wait_for(condition):
+    """Waits until `condition()` is true or the time is out"""
+    deadline = time.monotonic() + THREAD_TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_power_event_triggers_immediate_check():
+    """Tests that the power event interrupts the waiting for the next periodic check"""
+    instance = make_event_driven_instance()
+    scheduler_thread = threading.Thread(target=instance.start)
+    scheduler_thread.start()
+    try:
+        wait_for(lambda: instance.battery_source.read.call_count == 1)
+        instance.power_event_source.trigger()
+        wait_for(lambda: instance.battery_source.read.call_count == 2)
+        instance.power_event_source.trigger()
+        wait_for(lambda: instance.battery_source.read.call_count == 3)
+    finally:
+        instance.stop()
+        scheduler_thread.join(THREAD_TIMEOUT)
+    assert not scheduler_thread.is_alive()
+    assert len(instance.scheduler.queue) == 0
+
+
+def test_power_event_during_check():
+    """Tests that the event received during the check leads to exactly one more check"""
+    instance = make_event_driven_instance()
+    battery_info = instance.battery_source.read.return_value
+
+    def read_and_receive_event():
+        if instance.battery_source.read.call_count == 1:
+            instance.request_immediate_check()
+        return battery_info
+
+    instance.battery_source.read.side_effect = read_and_receive_event
+    instance.start(blocking=False)
+    assert instance.battery_source.read.call_count == 2
+    instance.scheduler.run(blocking=False)
+    assert instance.battery_source.read.call_count == 2
+    instance.stop()
+
+
+def test_stop_unsubscribes():
+    """Tests that the stopped instance does not react to the events"""
+    instance = make_event_driven_instance()
+    instance.start(blocking=False)
+    instance.stop()
+    instance.power_event_source.trigger()
+    assert len(instance.scheduler.queue) == 0
+
+
+def test_power_events_unsupported_platform():
+    """Tests the fallback to the periodic checks only"""
+    with unittest.mock.patch(
+            "battery_handyman.power_events.get_power_event_source", return_value=None
+    ):
+        instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+        instance.power_events = True
+    assert instance.power_event_source is None
+    assert instance.to_config_dict_mapping()["check_config"]["power_events"] is True
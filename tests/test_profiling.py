@@ -0,0 +1,138 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/profiling.py and the stage hooks"""
+import logging
+import os.path
+import threading
+import unittest.mock
+
+import pytest
+
+import battery_handyman.constants
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.dispatch import RequestDispatcher
+from battery_handyman.profiling import StageProfiler
+from battery_handyman.util import BatteryInfo
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+CONFIG_PATH_REACTIONS = os.path.join("configurations", "template_configuration_reactions.yml")
+
+
+def make_instance(left_in_percents):
+    """Creates an instance reading the constant battery state"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.battery_source = unittest.mock.Mock(read=unittest.mock.Mock(
+        return_value=BatteryInfo(is_charging=True, left_in_percents=left_in_percents)
+    ))
+    instance.deliver_request = unittest.mock.Mock(return_value=(200, "OK"))
+    return instance
+
+
+@pytest.mark.parametrize(
+    "left_in_percents,expected_stage_list", [
+        pytest.param(50, ["read", "prepare", "record", "check"], id="no_request"),
+        pytest.param(95, ["read", "prepare", "deliver", "record", "check"], id="request"),
+    ]
+)
+def test_stage_hooks(left_in_percents, expected_stage_list):
+    """Tests that the reached stages are reported in their order"""
+    instance = make_instance(left_in_percents)
+    stage_hook = unittest.mock.Mock()
+    instance.add_stage_hook(stage_hook)
+    instance.perform_check()
+    instance.remove_stage_hook(stage_hook)
+    instance.perform_check()
+    instance.stop()
+
+    assert [call_args[0][1] for call_args in stage_hook.call_args_list] == expected_stage_list
+    assert all(call_args[0][0] is instance for call_args in stage_hook.call_args_list)
+    assert all(call_args[0][2] >= 0 for call_args in stage_hook.call_args_list)
+
+
+def test_profile_stages(caplog):
+    """Tests the built-in profiler enabled like by `check_config`"""
+    instance = make_instance(95)
+    assert instance.stage_profiler is None
+    instance.profile_stages = True
+    with caplog.at_level(logging.INFO, logger="battery_handyman.profiling"):
+        instance.perform_check()
+        instance.perform_check()
+    instance.stop()
+
+    stage_profiler = instance.stage_profiler
+    assert isinstance(stage_profiler, StageProfiler)
+    assert stage_profiler.statistics_mapping["check"].count == 2
+    assert stage_profiler.format_summary().startswith("read: count 2")
+    assert sum("Check stages of" in message for message in caplog.messages) == 2
+    assert instance.to_config_dict_mapping()["check_config"]["profile_stages"] is True
+
+    instance.profile_stages = False
+    assert instance.stage_profiler is None
+
+
+def test_profile_stages_of_reactions():
+    """Tests that the reactions are told apart by their remote devices"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_REACTIONS)
+    instance.battery_source = unittest.mock.Mock(read=unittest.mock.Mock(
+        return_value=BatteryInfo(is_charging=True, left_in_percents=50)
+    ))
+    instance.profile_stages = True
+    instance.perform_check()
+    instance.stop()
+
+    assert instance.stage_profiler.statistics_mapping["reaction http://127.0.0.2:8080"].count == 1
+
+
+def test_stages_of_worker_threads_are_not_attached_to_next_check(caplog):
+    """Tests that the delivery by the worker thread is logged on its own
+     instead of being counted in the next check"""
+    instance = make_instance(95)
+    instance.dispatch_mode = battery_handyman.constants.DISPATCH_MODE_POOL
+    instance.profile_stages = True
+    dispatcher = RequestDispatcher(worker_count=1)
+    with caplog.at_level(logging.INFO, logger="battery_handyman.profiling"):
+        with unittest.mock.patch("battery_handyman.dispatch.REQUEST_DISPATCHER", dispatcher):
+            instance.perform_check()
+            dispatcher.shutdown()
+        instance.battery_source.read.return_value = BatteryInfo(
+            is_charging=True, left_in_percents=50
+        )
+        instance.perform_check()
+    instance.stop()
+
+    check_message_list = [
+        message for message in caplog.messages if message.startswith("Check stages of")
+    ]
+    assert len(check_message_list) == 2
+    assert all("deliver" not in message for message in check_message_list)
+    assert any("outside of its check: deliver" in message for message in caplog.messages)
+    assert instance.stage_profiler.statistics_mapping["deliver"].count == 1
+
+
+def test_stage_profiler_is_thread_safe():
+    """Tests that the statistics of the stages reported concurrently are not lost"""
+    stage_profiler = StageProfiler()
+    instance = unittest.mock.Mock(remote_address="http://127.0.0.1")
+
+    def report_stages():
+        for _ in range(1000):
+            stage_profiler(instance, battery_handyman.constants.STAGE_DELIVER, 0.001)
+
+    thread_list = [threading.Thread(target=report_stages) for _ in range(4)]
+    for thread in thread_list:
+        thread.start()
+    for thread in thread_list:
+        thread.join()
+    assert stage_profiler.statistics_mapping["deliver"].count == 4000
@@ -0,0 +1,239 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/retry.py"""
+import os.path
+import sched
+import unittest.mock
+
+import pytest
+import requests.exceptions
+
+import battery_handyman.constants
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.retry import (
+    CircuitBreaker, get_retry_delay, is_status_code_retryable, parse_retry_after
+)
+from battery_handyman.simulation import VirtualClock
+from battery_handyman.util import BatteryInfo, ResponseStatus
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+
+
+@pytest.mark.parametrize(
+    "value,expected_result", [
+        pytest.param("120", 120.0, id="seconds"),
+        pytest.param("Thu, 01 Jan 1970 00:01:40 GMT", 40.0, id="http_date"),
+        pytest.param("Thu, 01 Jan 1970 00:00:10 GMT", 0.0, id="past_http_date"),
+        pytest.param("soon", None, id="malformed"),
+        pytest.param(None, None, id="absent"),
+    ]
+)
+def test_parse_retry_after(value, expected_result):
+    """Tests both forms of the Retry-After header"""
+    assert parse_retry_after(value, now=60.0) == expected_result
+
+
+@pytest.mark.parametrize(
+    "status_code,expected_result", [
+        pytest.param(429, True, id="too_many_requests"),
+        pytest.param(503, True, id="service_unavailable"),
+        pytest.param(404, False, id="not_found"),
+    ]
+)
+def test_is_status_code_retryable(status_code, expected_result):
+    """Tests the selection of the retryable statuses"""
+    assert is_status_code_retryable(status_code) == expected_result
+
+
+@pytest.mark.parametrize(
+    "attempt,retry_after,expected_result", [
+        pytest.param(0, None, 0.5, id="first"),
+        pytest.param(3, None, 4.0, id="exponential"),
+        pytest.param(10, None, 30.0, id="max_delay"),
+        pytest.param(0, 20.0, 20.0, id="retry_after"),
+    ]
+)
+def test_get_retry_delay(attempt, retry_after, expected_result):
+    """Tests the backoff with the jitter fixed at the half of the range"""
+    assert get_retry_delay(attempt, 1, 60, retry_after, random_func=lambda: 0.5) == expected_result
+
+
+def test_circuit_breaker():
+    """Tests the transitions between the closed, the open and the half-open states"""
+    clock = VirtualClock()
+    circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, timefunc=clock.time)
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == battery_handyman.constants.CIRCUIT_CLOSED
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == battery_handyman.constants.CIRCUIT_OPEN
+    assert not circuit_breaker.allow_request()
+
+    clock.sleep(30)
+    assert circuit_breaker.allow_request()
+    assert not circuit_breaker.allow_request()
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == battery_handyman.constants.CIRCUIT_OPEN
+
+    clock.sleep(30)
+    assert circuit_breaker.allow_request()
+    circuit_breaker.record_success()
+    assert circuit_breaker.state == battery_handyman.constants.CIRCUIT_CLOSED
+    assert circuit_breaker.allow_request()
+
+
+@pytest.mark.parametrize(
+    "property_name, value", [
+        pytest.param("retry_max_attempts", -1, id="max_attempts_negative"),
+        pytest.param("retry_max_attempts", 2.5, id="max_attempts_fractional"),
+        pytest.param("retry_base_delay", -1, id="base_delay_negative"),
+        pytest.param("retry_max_delay", -0.5, id="max_delay_negative"),
+        pytest.param("circuit_breaker_threshold", -1, id="threshold_negative"),
+        pytest.param("circuit_breaker_threshold", 2.5, id="threshold_fractional"),
+        pytest.param("circuit_breaker_reset_timeout", -30, id="reset_timeout_negative"),
+    ]
+)
+def test_retry_property_validation(property_name, value):
+    """Tests that the invalid retry and circuit breaker settings are rejected"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    previous_value = getattr(instance, property_name)
+    with pytest.raises(ValueError):
+        setattr(instance, property_name, value)
+    assert getattr(instance, property_name) == previous_value
+
+
+def make_retrying_instance(response_status_list):
+    """Creates an instance with the retries run by the scheduler on the virtual clock"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.retry_max_attempts = 2
+    clock = VirtualClock()
+    instance.scheduler = sched.scheduler(clock.time, clock.sleep)
+    instance.deliver_request = unittest.mock.Mock(side_effect=response_status_list)
+    return instance
+
+
+def test_retry_until_success():
+    """Tests that the failed request is retried by the scheduler and not by the checks"""
+    instance = make_retrying_instance([
+        None, ResponseStatus(503, "Service Unavailable", 100.0), ResponseStatus(200, "OK"),
+    ])
+    battery_info = BatteryInfo(is_charging=True, left_in_percents=95)
+    assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_FAILED
+    assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_DUPLICATE
+
+    instance.scheduler.run()
+    assert instance.deliver_request.call_count == 3
+    # The delay after the second attempt is the requested one
+    assert instance.scheduler.timefunc() >= 100.0
+
+
+def test_retry_is_cancelled_when_not_needed():
+    """Tests that the pending retry is dropped if the charging must be unchanged now"""
+    instance = make_retrying_instance([None])
+    instance.send_request(BatteryInfo(is_charging=True, left_in_percents=95))
+    with pytest.raises(battery_handyman.util.DoNotToogleChargingException):
+        instance.send_request(BatteryInfo(is_charging=True, left_in_percents=50))
+    assert instance.scheduler.empty()
+
+
+def test_retry_not_for_client_errors():
+    """Tests that the request rejected by the remote device is not retried"""
+    instance = make_retrying_instance([ResponseStatus(404, "Not Found")])
+    instance.send_request(BatteryInfo(is_charging=True, left_in_percents=95))
+    assert instance.scheduler.empty()
+
+
+def test_circuit_breaker_blocks_requests():
+    """Tests that the open circuit of the remote device stops the requests of the checks"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.remote_address = "http://circuit.test"
+    instance.circuit_breaker_threshold = 2
+    instance.deliver_request = unittest.mock.Mock(return_value=None)
+    battery_info = BatteryInfo(is_charging=True, left_in_percents=95)
+
+    decision_list = [instance.send_request(battery_info) for _ in range(3)]
+    assert decision_list == [
+        battery_handyman.constants.DECISION_FAILED,
+        battery_handyman.constants.DECISION_FAILED,
+        battery_handyman.constants.DECISION_BLOCKED,
+    ]
+    assert instance.deliver_request.call_count == 2
+
+
+def test_circuit_breaker_probe_rejected_by_remote_device():
+    """Tests that the probe answered by the error not worth retrying closes the circuit"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.remote_address = "http://probe.test"
+    instance.circuit_breaker_threshold = 1
+    instance.circuit_breaker_reset_timeout = 30
+    instance.deliver_request = unittest.mock.Mock(side_effect=[
+        ResponseStatus(503, "Service Unavailable"), ResponseStatus(404, "Not Found"),
+        ResponseStatus(200, "OK"),
+    ])
+    battery_info = BatteryInfo(is_charging=True, left_in_percents=95)
+    clock = VirtualClock()
+    circuit_breaker = CircuitBreaker(1, 30, timefunc=clock.time)
+    with unittest.mock.patch.dict(
+            "battery_handyman.retry._circuit_breaker_mapping",
+            {"http://probe.test": circuit_breaker},
+    ):
+        assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_FAILED
+        assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_BLOCKED
+        clock.sleep(30)
+        assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_FAILED
+        assert circuit_breaker.state == battery_handyman.constants.CIRCUIT_CLOSED
+        clock.sleep(30)
+        assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_SENT
+    assert instance.deliver_request.call_count == 3
+
+
+def test_circuit_breaker_probe_raising_unexpected_exception():
+    """Tests that the probe ended by an unexpected exception opens the circuit again
+     instead of holding it half-open"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.remote_address = "http://raising-probe.test"
+    instance.circuit_breaker_threshold = 1
+    instance.circuit_breaker_reset_timeout = 30
+    instance.deliver_request = unittest.mock.Mock(side_effect=[
+        None, requests.exceptions.InvalidURL("The URL is invalid"), ResponseStatus(200, "OK"),
+    ])
+    battery_info = BatteryInfo(is_charging=True, left_in_percents=95)
+    clock = VirtualClock()
+    circuit_breaker = CircuitBreaker(1, 30, timefunc=clock.time)
+    with unittest.mock.patch.dict(
+            "battery_handyman.retry._circuit_breaker_mapping",
+            {"http://raising-probe.test": circuit_breaker},
+    ):
+        assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_FAILED
+        clock.sleep(30)
+        with pytest.raises(requests.exceptions.InvalidURL):
+            instance.send_request(battery_info)
+        assert circuit_breaker.state == battery_handyman.constants.CIRCUIT_OPEN
+        clock.sleep(30)
+        assert instance.send_request(battery_info) == battery_handyman.constants.DECISION_SENT
+    assert instance.deliver_request.call_count == 3
+
+
+def test_circuit_breaker_not_reported_probe_expires():
+    """Tests that the probe whose result is never reported does not hold the circuit"""
+    clock = VirtualClock()
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, timefunc=clock.time)
+    circuit_breaker.record_failure()
+    clock.sleep(30)
+    assert circuit_breaker.allow_request()
+    assert not circuit_breaker.allow_request()
+    clock.sleep(29)
+    assert not circuit_breaker.allow_request()
+    clock.sleep(1)
+    assert circuit_breaker.allow_request()
@@ -0,0 +1,115 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/session_pool.py"""
+import time
+import unittest.mock
+
+import pytest
+
+from battery_handyman.session_pool import SessionPool
+
+
+REMOTE_ADDRESS = "http://127.0.0.1:80"
+ANOTHER_REMOTE_ADDRESS = "http://127.0.0.2:80"
+
+
+@pytest.fixture(name="clock")
+def clock_fixture():
+    """A controllable replacement of `time.monotonic`"""
+    return unittest.mock.Mock(return_value=0.0)
+
+
+@pytest.fixture(name="session_pool")
+def session_pool_fixture(clock):
+    """The empty pool using `clock`, its sessions are evicted only by the test"""
+    session_pool = SessionPool(timefunc=clock, evicts_in_background=False)
+    yield session_pool
+    session_pool.close()
+
+
+def test_acquire_session_is_shared_per_remote_address(session_pool):
+    """Tests that the same remote address gets the same session"""
+    session = session_pool.acquire_session(REMOTE_ADDRESS, 1, 60)
+    assert session_pool.acquire_session(REMOTE_ADDRESS, 1, 60) is session
+    assert session_pool.acquire_session(ANOTHER_REMOTE_ADDRESS, 1, 60) is not session
+    assert len(session_pool) == 2
+
+
+def test_acquire_session_applies_pool_size(session_pool):
+    """Tests that the pool size limits the kept connections"""
+    session = session_pool.acquire_session(REMOTE_ADDRESS, 3, 60)
+    adapter = session.get_adapter(REMOTE_ADDRESS)
+    assert adapter._pool_maxsize == 3  # pylint: disable=protected-access
+
+
+@pytest.mark.parametrize(
+    "elapsed_time, is_evicted, expected_next_eviction_delay", [
+        pytest.param(30, False, 30, id="active"),
+        pytest.param(61, True, None, id="idle"),
+    ]
+)
+def test_idle_session_eviction(
+        session_pool, clock, elapsed_time, is_evicted, expected_next_eviction_delay
+):
+    """Tests that only the sessions idle longer than their timeout are closed"""
+    session = session_pool.acquire_session(REMOTE_ADDRESS, 1, 60)
+    session_pool.release_session(REMOTE_ADDRESS, session)
+    clock.return_value = float(elapsed_time)
+    with unittest.mock.patch.object(session, "close") as session_close_mock:
+        assert session_pool.evict_idle() == expected_next_eviction_delay
+    assert session_close_mock.called == is_evicted
+    assert len(session_pool) == (0 if is_evicted else 1)
+
+
+def test_session_in_use_is_not_evicted(session_pool, clock):
+    """Tests that the session sending a request is not closed however long it takes"""
+    session = session_pool.acquire_session(REMOTE_ADDRESS, 1, 60)
+    clock.return_value = 100.0
+    with unittest.mock.patch.object(session, "close") as session_close_mock:
+        assert session_pool.evict_idle() is None
+    session_close_mock.assert_not_called()
+    session_pool.release_session(REMOTE_ADDRESS, session)
+    assert session_pool.evict_idle() == 60
+    assert session_pool.acquire_session(REMOTE_ADDRESS, 1, 60) is session
+
+
+@unittest.mock.patch('requests.Session.request')
+def test_request_updates_last_usage(session_request_mock, session_pool, clock):
+    """Tests that a long request does not make its session idle"""
+    def long_request(*_args, **_kwargs):
+        clock.return_value = 100.0
+
+    session_request_mock.side_effect = long_request
+    session_pool.request(REMOTE_ADDRESS, 1, 60, "POST", REMOTE_ADDRESS + "/power/1")
+    session_request_mock.assert_called_once_with("POST", REMOTE_ADDRESS + "/power/1")
+
+    clock.return_value = 150.0
+    assert session_pool.evict_idle() == 10
+    assert len(session_pool) == 1
+
+
+def test_idle_session_is_evicted_without_access():
+    """Tests that the idle session is closed by the pool thread, not by the next request"""
+    session_pool = SessionPool()
+    try:
+        session = session_pool.acquire_session(REMOTE_ADDRESS, 1, 0.05)
+        with unittest.mock.patch.object(session, "close") as session_close_mock:
+            session_pool.release_session(REMOTE_ADDRESS, session)
+            deadline = time.monotonic() + 2
+            while session_close_mock.call_count == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        session_close_mock.assert_called_once_with()
+        assert len(session_pool) == 0
+    finally:
+        session_pool.close()
@@ -0,0 +1,195 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/simulation.py"""
+import os.path
+
+import pytest
+
+import battery_handyman.constants
+import battery_handyman.simulation
+from battery_handyman.simulation import (
+    ReplayBatterySource,
+    SimulatedBatteryHandyman,
+    TraceSample,
+    VirtualClock,
+    load_trace,
+    save_trace,
+)
+from battery_handyman.util import BatteryInfo, ResponseStatus
+
+
+CONFIG_DIR = "configurations"
+CONFIG_PATH_DEFAULT = os.path.join(CONFIG_DIR, "default_configuration.yml")
+
+SECONDS_IN_WEEK = 7 * 24 * 60 * 60
+
+
+def make_sawtooth_trace(duration, sample_interval):
+    """The battery is discharged below 40% and charged above 90% again and again
+
+    The charger reacts to the limits of the default configuration
+    after the sample is recorded like a controlled one does
+    """
+    trace = []
+    is_charging, left_in_percents = False, 100
+    for timestamp in range(0, duration + 1, sample_interval):
+        trace.append(TraceSample(timestamp, BatteryInfo(is_charging, left_in_percents)))
+        if not is_charging and left_in_percents < 40:
+            is_charging = True
+        elif is_charging and left_in_percents > 90:
+            is_charging = False
+        left_in_percents += 1 if is_charging else -1
+    return trace
+
+
+def test_virtual_clock():
+    """Tests that the clock moves only forward and only by sleeping"""
+    clock = VirtualClock(10)
+    clock.sleep(5)
+    clock.sleep(-1)
+    assert clock.time() == 15
+    clock.set_time(100)
+    assert clock.time() == 100
+
+
+@pytest.mark.parametrize(
+    "clock_time, expected_left_in_percents", [
+        pytest.param(-5, 100, id="before_trace"),
+        pytest.param(0, 100, id="first_sample"),
+        pytest.param(59.9, 100, id="between_samples"),
+        pytest.param(60, 99, id="second_sample"),
+        pytest.param(10 ** 9, 98, id="after_trace"),
+    ]
+)
+def test_replay_battery_source(clock_time, expected_left_in_percents):
+    """Tests that the latest recorded sample is returned"""
+    trace = make_sawtooth_trace(120, 60)
+    battery_source = ReplayBatterySource(trace, VirtualClock(clock_time))
+    assert battery_source.read().left_in_percents == expected_left_in_percents
+
+
+def test_trace_save_and_load(tmp_path):
+    """Tests that the saved trace is loaded unchanged"""
+    trace = make_sawtooth_trace(3600, 60) + [TraceSample(3601.5, BatteryInfo(True, 42.5))]
+    trace_path = str(tmp_path / "trace.csv")
+    save_trace(trace_path, trace)
+    assert load_trace(trace_path) == trace
+
+
+def test_simulate_week():
+    """Tests that a week is replayed without waiting
+
+    The last sample is not checked since the simulation ends at its timestamp
+    """
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.check_interval = 60
+    trace = make_sawtooth_trace(SECONDS_IN_WEEK, 60)
+    expected_request_count = sum(
+        1 for _, battery_info in trace[:-1]
+        if battery_info.left_in_percents < 40 and not battery_info.is_charging
+        or battery_info.left_in_percents > 90 and battery_info.is_charging
+    )
+
+    delivered_request_list = instance.simulate(trace)
+
+    assert instance.virtual_clock.time() == SECONDS_IN_WEEK
+    assert len(delivered_request_list) == expected_request_count > 100
+    assert delivered_request_list[0] == (61 * 60, instance.remote_address + "/power/1")
+    assert delivered_request_list[1] == (113 * 60, instance.remote_address + "/power/0")
+
+
+def test_simulated_delivery_returns_response_status():
+    """Tests that the recorded request is answered like the real delivery does it"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    response_status = instance.deliver_request(instance.remote_address + "/power/1")
+    assert isinstance(response_status, ResponseStatus)
+    assert response_status.status_code == 200
+    assert instance.delivered_request_list == [(0.0, instance.remote_address + "/power/1")]
+
+
+def test_simulate_suppresses_duplicates():
+    """Tests that the duplicate suppression is evaluated on the virtual clock"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    # The charger never reacts
+    trace = [TraceSample(0, BatteryInfo(False, 10)), TraceSample(3600, BatteryInfo(False, 5))]
+
+    assert len(instance.simulate(trace)) == 3600
+    instance.command_confirm_timeout = 600
+    assert len(instance.simulate(trace)) == 6
+
+
+def test_simulate_reactions():
+    """Tests that the requests of all the reactions are recorded on the virtual clock"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(
+        os.path.join(CONFIG_DIR, "template_configuration_reactions.yml")
+    )
+    trace = [TraceSample(60, BatteryInfo(False, 10)), TraceSample(120, BatteryInfo(False, 10))]
+
+    assert sorted(instance.simulate(trace)) == [
+        (60, "http://127.0.0.1/cm?cmnd=Power%201"),
+        (60, "http://127.0.0.2:8080/battery?needs_charging=on"),
+    ]
+
+
+
+def make_pool_dispatch_instance():
+    """Creates the instance passing its requests to the worker threads"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.dispatch_mode = battery_handyman.constants.DISPATCH_MODE_POOL
+    return instance
+
+
+def make_batching_instance():
+    """Creates the instance sending its commands by the batches"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.request_template = "/Power1%20{needs_charging}"
+    instance.batch_template = "/cm?cmnd=Backlog%20{commands}"
+    instance.batch_window = 0.5
+    return instance
+
+
+@pytest.mark.parametrize(
+    "make_instance, expected_first_request", [
+        pytest.param(
+            make_pool_dispatch_instance, (61 * 60, "http://127.0.0.1:80/power/1"), id="pool",
+        ),
+        pytest.param(
+            make_batching_instance,
+            (61 * 60 + 0.5, "http://127.0.0.1:80/cm?cmnd=Backlog%20Power1%201"), id="batch",
+        ),
+    ]
+)
+def test_simulate_is_deterministic(make_instance, expected_first_request):
+    """Tests that the dispatched and the batched requests are sent on the virtual clock
+     so the same trace gives the same requests"""
+    trace = make_sawtooth_trace(24 * 60 * 60, 60)
+    instance = make_instance()
+    instance.check_interval = 60
+
+    delivered_request_list = list(instance.simulate(trace))
+
+    assert delivered_request_list[0] == expected_first_request
+    assert len(delivered_request_list) > 10
+    assert instance.simulate(trace) == delivered_request_list
+    another_instance = make_instance()
+    another_instance.check_interval = 60
+    assert another_instance.simulate(trace) == delivered_request_list
+
+def test_main(tmp_path, capsys):
+    """Tests the CLI of the simulation"""
+    trace_path = str(tmp_path / "trace.csv")
+    save_trace(trace_path, make_sawtooth_trace(7200, 60))
+    # The check interval of the default configuration is 1 second
+    battery_handyman.simulation.main([CONFIG_PATH_DEFAULT, trace_path, "--duration", "3661"])
+    assert capsys.readouterr().out == "3660.000 POST http://127.0.0.1:80/power/1\nRequests: 1\n"
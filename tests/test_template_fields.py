@@ -0,0 +1,174 @@
+#    Copyright [2021] [Nikolay Veld]
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+"""The tests for battery_handyman/template_fields.py"""
+import os.path
+import unittest.mock
+
+import pytest
+
+import battery_handyman.constants
+import battery_handyman.template_fields
+from battery_handyman.battery_handyman_class import BatteryHandyman
+from battery_handyman.simulation import SimulatedBatteryHandyman, TraceSample
+from battery_handyman.template_fields import get_template_field_list, register_template_field
+from battery_handyman.util import BatteryInfo, DoNotToogleChargingException
+
+
+CONFIG_PATH_DEFAULT = os.path.join("configurations", "default_configuration.yml")
+
+
+@pytest.fixture(name="template_field_mapping")
+def fixture_template_field_mapping(monkeypatch):
+    """The copy of the registry the registrations of the test are made in"""
+    template_field_mapping = dict(battery_handyman.template_fields.TEMPLATE_FIELD_MAPPING)
+    monkeypatch.setattr(
+        battery_handyman.template_fields, "TEMPLATE_FIELD_MAPPING", template_field_mapping
+    )
+    return template_field_mapping
+
+
+def test_built_in_template_fields():
+    """Tests that all the valid keys are registered"""
+    assert list(battery_handyman.template_fields.TEMPLATE_FIELD_MAPPING) == (
+        battery_handyman.constants.REQUEST_DATA_VALID_KEY_LIST
+    )
+
+
+@pytest.mark.parametrize(
+    "request_template, battery_info, expected_url_path", [
+        pytest.param(
+            "/power/{needs_charging}?level={left_in_percents}",
+            BatteryInfo(is_charging=False, left_in_percents=39), "/power/1?level=39",
+            id="integer_percentage",
+        ),
+        pytest.param(
+            "/power/{needs_charging}?level={left_in_percents:.0f}",
+            BatteryInfo(is_charging=True, left_in_percents=91.6), "/power/0?level=92",
+            id="format_spec",
+        ),
+        pytest.param(
+            "/battery?level={left_in_percents}&plugged={is_charging}",
+            BatteryInfo(is_charging=True, left_in_percents=50), "/battery?level=50&plugged=yes",
+            id="without_needs_charging",
+        ),
+    ]
+)
+def test_battery_fields_are_rendered(request_template, battery_info, expected_url_path):
+    """Tests that the battery state fields are rendered and mapped"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.request_template = request_template
+    instance.request_data_mapping = {
+        **instance.request_data_mapping, "is_charging": {True: "yes", False: "no"},
+    }
+    assert instance.prepare_request_line(battery_info) == (
+        instance.remote_address + expected_url_path
+    )
+
+
+def get_request_line_or_exception(prepare, battery_info):
+    """Returns the request line or the type of the raised exception"""
+    try:
+        return prepare(battery_info)
+    except DoNotToogleChargingException as exception_instance:
+        return type(exception_instance)
+
+
+@pytest.mark.parametrize(
+    "battery_info, expected_url_path", [
+        pytest.param(
+            BatteryInfo(is_charging=False, left_in_percents=50.0), "/battery?l=50.0&c=False",
+            id="float_reading",
+        ),
+        pytest.param(
+            BatteryInfo(is_charging=True, left_in_percents=95), "/battery?l=95&c=True",
+            id="integer_reading",
+        ),
+        pytest.param(
+            BatteryInfo(is_charging=None, left_in_percents=50), None, id="unknown_charging",
+        ),
+    ]
+)
+def test_prepared_request_line_equals_direct_render(battery_info, expected_url_path):
+    """Tests that the readings are rendered the same with or without the decision table.
+     The unknown charging state sends nothing"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.request_template = "/battery?l={left_in_percents}&c={is_charging}"
+    request_line = get_request_line_or_exception(instance.prepare_request_line, battery_info)
+    assert request_line == get_request_line_or_exception(
+        lambda battery_info: instance.render_request_line(
+            instance.extract_request_data(battery_info)
+        ),
+        battery_info,
+    )
+    if expected_url_path is None:
+        assert request_line is DoNotToogleChargingException
+    else:
+        assert request_line == instance.remote_address + expected_url_path
+
+def test_needs_charging_keeps_charging_unchanged():
+    """Tests that the other fields do not make the request sent between the limits"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.request_template = "/power/{needs_charging}?level={left_in_percents}"
+    with pytest.raises(DoNotToogleChargingException):
+        instance.prepare_request_line(BatteryInfo(is_charging=False, left_in_percents=50))
+
+
+def test_only_referenced_fields_are_computed(template_field_mapping):
+    """Tests that the registered field is computed only for the template referencing it"""
+    compute = unittest.mock.Mock(return_value="42")
+    register_template_field("outlet", compute)
+    assert template_field_mapping["outlet"].compute is compute
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    battery_info = BatteryInfo(is_charging=False, left_in_percents=39)
+
+    instance.prepare_request_line(battery_info)
+    compute.assert_not_called()
+
+    instance.request_template = "/power/{needs_charging}?outlet={outlet}"
+    assert instance.prepare_request_line(battery_info) == (
+        instance.remote_address + "/power/1?outlet=42"
+    )
+    compute.assert_called_once_with(instance, battery_info)
+    with pytest.raises(ValueError):
+        register_template_field("outlet", compute)
+
+
+def test_unknown_template_fields_are_rejected():
+    """Tests that the template with the unknown placeholder is not accepted"""
+    instance = BatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    with pytest.raises(ValueError, match="unknown_field"):
+        instance.request_template = "/power/{needs_charging}?x={unknown_field}"
+    with pytest.raises(ValueError):
+        get_template_field_list(["needs_charging", "unknown_field"])
+
+
+def test_seconds_left_uses_charge_rate():
+    """Tests that the seconds left are estimated by the readings of the checks
+     without the adaptive check interval"""
+    instance = SimulatedBatteryHandyman.from_configuration_file(CONFIG_PATH_DEFAULT)
+    instance.check_interval = 60
+    instance.request_template = "/battery?seconds_left={seconds_left}"
+    assert not instance.adaptive_check_interval
+    trace = [
+        TraceSample(0, BatteryInfo(False, 50)),
+        TraceSample(60, BatteryInfo(False, 49)),
+        TraceSample(120, BatteryInfo(False, 48)),
+    ]
+
+    delivered_request_list = instance.simulate(trace, duration=180)
+
+    assert [ready_request_line for _, ready_request_line in delivered_request_list] == [
+        instance.remote_address + f"/battery?seconds_left={seconds_left}"
+        for seconds_left in (-1, 2940, 2880)
+    ]
@@ -60,6 +60,11 @@ def test_get_battery_info_with_mock(
     "request_template, expected_result", [
         pytest.param("/power/{needs_charging}", ["needs_charging"]),
         pytest.param("/cm?cmnd=Power%20{needs_charging}", ["needs_charging"]),
+        pytest.param(
+            "/power/{needs_charging}?level={left_in_percents:.0f}&{{x}}={needs_charging!s}",
+            ["needs_charging", "left_in_percents"], id="format_spec_and_escape",
+        ),
+        pytest.param("/battery?x={unknown_field}", ["unknown_field"], id="unknown_field"),
     ]
 )
 def test_parse_request_data_key_list(request_template, expected_result):